@@ -1,8 +1,192 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.template.response import TemplateResponse
 
-from .models import User, Category, Ad, Response
+from .bulk import accept_responses, delete_ads, delete_responses, recategorize_ads
+from .models import User, Category, Ad, AdImage, Response
+from .pagination import EstimatedCountPaginator
+from .search import get_search_backend
 
-admin.site.register(User)
-admin.site.register(Category)
-admin.site.register(Ad)
-admin.site.register(Response)
+# Сколько совпадений полнотекстового поиска показывать в списке объявлений
+AD_SEARCH_LIMIT = 500
+
+
+def prefix_range(field, term):
+    """Поиск по началу строки диапазоном: в отличие от LIKE/UPPER использует обычный B-tree индекс"""
+    return Q(**{f'{field}__gte': term, f'{field}__lt': f'{term}\uffff'})
+
+
+class DeferringChangeList(ChangeList):
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer(*self.model_admin.list_defer) if self.model_admin.list_defer else queryset
+
+
+class ScalableAdminMixin:
+    """
+    Списки для больших таблиц: без COUNT(*) всей таблицы и второго COUNT(*) при
+    фильтрах, без тяжёлых колонок в выборке и с массовым удалением запросами DELETE.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    # Поля, ненужные в списке (тексты объявлений и т. п.)
+    list_defer = ()
+    # Функция удаления выборки, возвращающая число удалённых строк
+    bulk_delete = None
+
+    def get_changelist(self, request, **kwargs):
+        return DeferringChangeList
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if self.bulk_delete and 'delete_selected' in actions:
+            actions['delete_selected'] = (
+                type(self).delete_selected, 'delete_selected', actions['delete_selected'][2],
+            )
+        return actions
+
+    def log_bulk_deletion(self, request, deleted):
+        """
+        Одна сводная запись журнала админки на массовое удаление. Запись на каждый
+        объект потребовала бы прочитать всю выборку, а удаление идёт без её загрузки.
+        """
+        opts = self.model._meta
+        LogEntry.objects.create(
+            user_id=request.user.pk,
+            content_type=ContentType.objects.get_for_model(self.model, for_concrete_model=False),
+            object_repr=f'{opts.verbose_name_plural}: {deleted}'[:200],
+            action_flag=DELETION,
+            change_message=f'Массовое удаление: {deleted}',
+        )
+
+    @staticmethod
+    def delete_selected(modeladmin, request, queryset):
+        """
+        Замена стандартного действия: подтверждение показывает только число строк,
+        а удаление идёт пачками запросов с подзапросом вместо сбора и удаления объектов по одному.
+        """
+        opts = modeladmin.model._meta
+        if request.POST.get('post'):
+            with transaction.atomic():
+                deleted = modeladmin.bulk_delete(queryset)
+                modeladmin.log_bulk_deletion(request, deleted)
+            modeladmin.message_user(request, f'Удалено: {deleted}', messages.SUCCESS)
+            return None
+        select_across = request.POST.get('select_across') == '1'
+        return TemplateResponse(request, 'admin/callboard/bulk_delete_confirmation.html', {
+            **modeladmin.admin_site.each_context(request),
+            'title': 'Подтверждение удаления',
+            'opts': opts,
+            'count': queryset.count(),
+            'select_across': select_across,
+            'selected': [] if select_across else request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(User)
+class UserAdmin(ScalableAdminMixin, BaseUserAdmin):
+    list_display = ('username', 'email', 'is_staff', 'is_active', 'date_joined')
+    list_filter = ('is_staff', 'is_active', 'groups')
+    # Нужны для autocomplete; сам поиск — get_search_results
+    search_fields = ('username', 'email')
+    ordering = ('username',)
+    sortable_by = ('username', 'email')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        # Диапазон по lower(username) и lower(email) идёт по функциональным индексам (User.Meta.indexes)
+        term = term.lower()
+        queryset = queryset.alias(username_ci=Lower('username'), email_ci=Lower('email'))
+        return queryset.filter(prefix_range('username_ci', term) | prefix_range('email_ci', term)), False
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'name', 'ad_count')
+    readonly_fields = ('ad_count',)
+
+
+@admin.register(Ad)
+class AdAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('title', 'author', 'category', 'created_at')
+    list_select_related = ('author', 'category')
+    list_filter = ('category',)
+    list_defer = ('content', 'content_html', 'content_text')
+    # Сортировка только по колонке, для которой есть индекс
+    sortable_by = ('created_at',)
+    ordering = ('-created_at', '-id')
+    search_fields = ('title',)
+    search_help_text = 'Полнотекстовый поиск по заголовку и тексту'
+    autocomplete_fields = ('author',)
+    readonly_fields = ('cover', 'created_at', 'updated_at')
+    bulk_delete = staticmethod(delete_ads)
+
+    def get_search_results(self, request, queryset, search_term):
+        backend = get_search_backend()
+        if not backend or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        hits = backend.search(search_term, limit=AD_SEARCH_LIMIT)
+        return queryset.filter(pk__in=[hit.ad_id for hit in hits]), False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if not self.has_change_permission(request):
+            return actions
+        # По действию на категорию: категорий немного, а промежуточная форма не нужна.
+        # Админка запрашивает действия несколько раз за запрос — категории читаются один раз
+        if not hasattr(request, '_callboard_categories'):
+            request._callboard_categories = list(Category.objects.all())
+        for category in request._callboard_categories:
+            name = f'move_to_category_{category.pk}'
+            actions[name] = (self._move_action(category), name, f'Перенести в категорию «{category}»')
+        return actions
+
+    @staticmethod
+    def _move_action(category):
+        def action(modeladmin, request, queryset):
+            moved = recategorize_ads(queryset, category)
+            modeladmin.message_user(request, f'Перенесено в «{category}»: {moved}', messages.SUCCESS)
+        return action
+
+
+@admin.register(Response)
+class ResponseAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'ad_title', 'author', 'created_at', 'is_accepted', 'is_read')
+    list_select_related = ('ad', 'author')
+    list_defer = ('content', 'ad__content', 'ad__content_html', 'ad__content_text', 'ad__excerpt')
+    list_filter = ('is_accepted', 'is_read')
+    sortable_by = ('created_at',)
+    ordering = ('-created_at', '-id')
+    autocomplete_fields = ('ad', 'author')
+    actions = ('accept',)
+    bulk_delete = staticmethod(delete_responses)
+
+    @admin.display(description='Объявление')
+    def ad_title(self, obj):
+        return obj.ad.title
+
+    @admin.action(permissions=['change'], description='Принять выбранные отклики')
+    def accept(self, request, queryset):
+        accepted = accept_responses(queryset)
+        self.message_user(request, f'Принято откликов: {accepted}', messages.SUCCESS)
+
+
+@admin.register(AdImage)
+class AdImageAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('file', 'format', 'width', 'height', 'size', 'created_at', 'processed_at')
+    list_defer = ('variants',)
+    ordering = ('-id',)
+    raw_id_fields = ('uploaded_by',)
+    readonly_fields = ('sha256', 'file', 'format', 'width', 'height', 'size', 'variants', 'processed_at')
@@ -0,0 +1,281 @@
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.paginator import InvalidPage
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, conditional_page
+
+from .bulk import accept_responses, shift_counters
+from .forms import AdForm
+from .models import Ad, Category, Response, User
+from .notifications import notify_responses_created
+from .pagination import CursorPaginator
+from .routers import pin_to_primary
+
+# JSON API. Строки читаются через values() и сразу превращаются в словари —
+# экземпляры моделей не создаются. Поле ресурса: имя в JSON → (путь для values(), преобразование).
+CATEGORY_TITLES = dict(Category.CATEGORY_CHOICES)
+
+AD_FIELDS = {
+    'id': ('id', None),
+    'title': ('title', None),
+    'excerpt': ('excerpt', None),
+    # Очищенный HTML; тяжёлое поле, отдаётся только по ?fields=
+    'content': ('content_html', None),
+    'category': ('category__name', None),
+    'author': ('author__username', None),
+    'is_urgent': ('is_urgent', None),
+    'cover': ('cover', lambda name: default_storage.url(name) if name else None),
+    'created_at': ('created_at', None),
+    'updated_at': ('updated_at', None),
+}
+AD_DEFAULT_FIELDS = [name for name in AD_FIELDS if name != 'content']
+
+RESPONSE_FIELDS = {
+    'id': ('id', None),
+    'ad': ('ad_id', None),
+    'ad_title': ('ad__title', None),
+    'author': ('author__username', None),
+    'content': ('content', None),
+    'created_at': ('created_at', None),
+    'is_accepted': ('is_accepted', None),
+    'is_read': ('is_read', None),
+}
+RESPONSE_DEFAULT_FIELDS = [name for name in RESPONSE_FIELDS if name != 'content']
+
+CATEGORY_FIELDS = {
+    'id': ('id', None),
+    'name': ('name', None),
+    'title': ('name', CATEGORY_TITLES.get),
+    'ad_count': ('ad_count', None),
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def select_fields(request, fields, default):
+    """Имена полей из ?fields=a,b,c; без параметра — поля по умолчанию"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in fields]
+    if unknown or not names:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}' if unknown else 'Пустой список полей')
+    return names
+
+
+def value_paths(names, fields, *required):
+    return list(dict.fromkeys([*required, *(fields[name][0] for name in names)]))
+
+
+def serialize(rows, names, fields):
+    columns = [(name, *fields[name]) for name in names]
+    return [
+        {name: convert(row[path]) if convert else row[path] for name, path, convert in columns}
+        for row in rows
+    ]
+
+
+def cursor_page(request, queryset, names, fields):
+    """Страница по курсору (created_at, id) с сериализованными строками"""
+    try:
+        limit = int(request.GET.get('limit') or settings.CALLBOARD_API_PAGE_SIZE)
+    except ValueError:
+        raise ApiError('limit должен быть целым числом')
+    limit = min(max(limit, 1), settings.CALLBOARD_API_MAX_PAGE_SIZE)
+    paginator = CursorPaginator(queryset.values(*value_paths(names, fields, 'id', 'created_at')), limit)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidPage as e:
+        raise ApiError(str(e))
+    return {
+        'results': serialize(page.object_list, names, fields),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+class ApiView(View):
+    """Ошибки и отказы в доступе — JSON с кодом статуса, без редиректов на форму входа"""
+    login_required = False
+    # Права, которые проверяются для небезопасных методов
+    permission_required = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method not in ('GET', 'HEAD', 'OPTIONS') or self.login_required:
+                self.check_access(request)
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e), **e.extra}, status=e.status)
+
+    def check_access(self, request):
+        if not request.user.is_authenticated:
+            raise ApiError('Требуется вход', status=401)
+        if not request.user.has_perms(self.permission_required):
+            raise ApiError('Недостаточно прав', status=403)
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        raise ApiError('Метод не поддерживается', status=405)
+
+    @staticmethod
+    def json_body(request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            raise ApiError('Тело запроса должно быть JSON')
+        if not isinstance(data, dict):
+            raise ApiError('Ожидался JSON-объект')
+        return data
+
+
+# Валидаторы условных GET считаются до выборки строк
+def ads_etag(request, *args, **kwargs):
+    state = {
+        **Ad.objects.aggregate(last_modified=Max('updated_at')),
+        **Category.objects.aggregate(total=Sum('ad_count')),
+    }
+    last_modified = state['last_modified'].timestamp() if state['last_modified'] else 0
+    return f'api-ads-{state["total"]}-{last_modified}'
+
+
+def ad_etag(request, pk):
+    updated_at = Ad.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return f'api-ad-{pk}-{updated_at.timestamp()}' if updated_at else None
+
+
+@method_decorator(condition(etag_func=ads_etag), name='get')
+class AdCollection(ApiView):
+    """GET — лента объявлений по курсору; POST — публикация (право can_publish)"""
+    replica_reads = True
+    permission_required = ('callboard.can_publish',)
+
+    def get(self, request):
+        names = select_fields(request, AD_FIELDS, AD_DEFAULT_FIELDS)
+        queryset = Ad.objects.all()
+        if category := request.GET.get('category'):
+            queryset = queryset.filter(category__name=category)
+        return JsonResponse(cursor_page(request, queryset, names, AD_FIELDS))
+
+    def post(self, request):
+        data = self.json_body(request)
+        is_urgent = bool(data.get('is_urgent'))
+        if is_urgent and not request.user.has_perm('callboard.can_mark_urgent'):
+            raise ApiError('Недостаточно прав, чтобы отметить объявление срочным', status=403)
+        category_id = Category.objects.filter(name=data.get('category')).values_list('pk', flat=True).first()
+        form = AdForm(data={'title': data.get('title'), 'content': data.get('content'), 'category': category_id})
+        if not form.is_valid():
+            raise ApiError('Объявление не прошло проверку', errors=form.errors)
+        form.instance.author = request.user
+        form.instance.is_urgent = is_urgent
+        ad = form.save()
+        pin_to_primary(request)
+        row = Ad.objects.filter(pk=ad.pk).values(*value_paths(AD_FIELDS, AD_FIELDS)).get()
+        return JsonResponse(serialize([row], list(AD_FIELDS), AD_FIELDS)[0], status=201)
+
+
+@method_decorator(condition(etag_func=ad_etag), name='get')
+class AdItem(ApiView):
+    replica_reads = True
+
+    def get(self, request, pk):
+        names = select_fields(request, AD_FIELDS, AD_DEFAULT_FIELDS)
+        row = Ad.objects.filter(pk=pk).values(*value_paths(names, AD_FIELDS)).first()
+        if row is None:
+            raise ApiError('Объявление не найдено', status=404)
+        return JsonResponse(serialize([row], names, AD_FIELDS)[0])
+
+
+@method_decorator(conditional_page, name='get')
+class CategoryCollection(ApiView):
+    replica_reads = True
+
+    def get(self, request):
+        names = select_fields(request, CATEGORY_FIELDS, CATEGORY_FIELDS)
+        rows = Category.objects.order_by('name').values(*value_paths(names, CATEGORY_FIELDS))
+        return JsonResponse({'results': serialize(rows, names, CATEGORY_FIELDS)})
+
+
+# Отклики приватны: ETag по содержимому ответа, кэшировать только в браузере
+@method_decorator([cache_control(private=True), conditional_page], name='get')
+class ResponseCollection(ApiView):
+    """Входящие отклики на объявления пользователя (как ResponseList)"""
+    login_required = True
+    permission_required = ('callboard.view_response',)
+
+    def get(self, request):
+        names = select_fields(request, RESPONSE_FIELDS, RESPONSE_DEFAULT_FIELDS)
+        queryset = Response.objects.filter(ad__author=request.user)
+        if ad := request.GET.get('ad'):
+            if not ad.isdigit():
+                raise ApiError('ad должен быть id объявления')
+            queryset = queryset.filter(ad_id=ad)
+        return JsonResponse(cursor_page(request, queryset, names, RESPONSE_FIELDS))
+
+
+class ResponseBulkCreate(ApiView):
+    """
+    {"responses": [{"ad": id, "content": "..."}, ...]} — все отклики создаются
+    в одной транзакции: либо все, либо ни одного.
+    """
+
+    def post(self, request):
+        items = self.json_body(request).get('responses')
+        if not isinstance(items, list) or not items:
+            raise ApiError('Ожидался непустой список responses')
+        if len(items) > settings.CALLBOARD_API_BULK_LIMIT:
+            raise ApiError(f'Не больше {settings.CALLBOARD_API_BULK_LIMIT} откликов за запрос')
+        errors = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get('ad'), int) \
+                    or not isinstance(item.get('content'), str) or not item['content'].strip():
+                errors[index] = 'Нужны ad (id объявления) и непустой content'
+        ads = Ad.objects.select_related('author').only(
+            'title', 'author__username', 'author__email',
+        ).in_bulk({item['ad'] for index, item in enumerate(items) if index not in errors})
+        for index, item in enumerate(items):
+            if index not in errors and item['ad'] not in ads:
+                errors[index] = 'Объявление не найдено'
+        if errors:
+            raise ApiError('Отклики не прошли проверку', errors=errors)
+
+        responses = [Response(ad=ads[item['ad']], author=request.user, content=item['content']) for item in items]
+        with transaction.atomic():
+            Response.objects.bulk_create(responses)
+            # bulk_create не вызывает post_save: счётчики непрочитанных — одним UPDATE
+            shift_counters(User, 'unread_response_count', Counter(response.ad.author_id for response in responses))
+            notify_responses_created(responses)
+        pin_to_primary(request)
+        return JsonResponse({'results': [
+            {'id': response.pk, 'ad': response.ad_id, 'created_at': response.created_at} for response in responses
+        ]}, status=201)
+
+
+class ResponseBulkAccept(ApiView):
+    """{"ids": [...]} — принимает отклики на объявления пользователя одним UPDATE"""
+
+    def post(self, request):
+        ids = self.json_body(request).get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            raise ApiError('Ожидался непустой список ids')
+        if len(ids) > settings.CALLBOARD_API_BULK_LIMIT:
+            raise ApiError(f'Не больше {settings.CALLBOARD_API_BULK_LIMIT} откликов за запрос')
+        owned = Response.objects.filter(pk__in=ids, ad__author=request.user)
+        found = set(owned.values_list('pk', flat=True))
+        accepted = accept_responses(owned)
+        pin_to_primary(request)
+        return JsonResponse({'accepted': accepted, 'not_found': [pk for pk in ids if pk not in found]})
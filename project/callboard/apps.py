@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CallboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'callboard'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        # Просмотры, которые никогда не дойдут до базы, — ошибка конфигурации, а не потери
+        if not settings.DEBUG and checks.process_local_views_cache():
+            raise ImproperlyConfigured(
+                f'CALLBOARD_VIEWS_CACHE={settings.CALLBOARD_VIEWS_CACHE!r} локален для процесса: '
+                f'нужен общий кэш или task_always_eager у Celery'
+            )
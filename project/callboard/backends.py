@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db.models import F, Q
+
+from .models import User
+
+
+def role_cache():
+    return caches[settings.CALLBOARD_ROLE_CACHE]
+
+
+def _role_key(user, kind):
+    # Версия ролей хранится в строке пользователя: после её увеличения старые записи
+    # не совпадают ни в одном процессе, даже если кэш у каждого процесса свой.
+    # Права суперпользователя другие, поэтому признак тоже в ключе
+    return f'roles:{user.pk}:{user.role_version}:{int(user.is_superuser)}:{kind}'
+
+
+def _load_groups(user):
+    return frozenset(Group.objects.filter(user=user).values_list('name', flat=True))
+
+
+def _load_permissions(user):
+    # Суперпользователю, как и в ModelBackend, — все права; остальным собственные
+    # права и права групп одним запросом
+    if user.is_superuser:
+        permissions = Permission.objects.all()
+    else:
+        permissions = Permission.objects.filter(Q(user=user) | Q(group__user=user))
+    rows = permissions.values_list('content_type__app_label', 'codename').order_by().distinct()
+    return frozenset(f'{app_label}.{codename}' for app_label, codename in rows)
+
+
+LOADERS = {'groups': _load_groups, 'permissions': _load_permissions}
+
+
+def get_roles(user, kind):
+    """Группы или права пользователя: из атрибута пользователя, затем из кэша, и только потом из базы"""
+    roles = user.__dict__.setdefault('_role_cache', {})
+    if kind not in roles:
+        key = _role_key(user, kind)
+        value = role_cache().get(key)
+        if value is None:
+            value = LOADERS[kind](user)
+            role_cache().set(key, value, settings.ROLE_CACHE_TIMEOUT)
+        roles[kind] = value
+    return roles[kind]
+
+
+def user_groups(user):
+    if not user.is_authenticated:
+        return frozenset()
+    return get_roles(user, 'groups')
+
+
+GROUP_IDS_KEY = 'roles:group-ids'
+
+
+def group_id(name):
+    """
+    id группы по имени из кэша ролей: регистрация не обращается к базе. Группы нет —
+    Group.DoesNotExist. Сохранение и удаление групп сбрасывают запись (forget_group_ids);
+    в кэше другого процесса она живёт не дольше ROLE_CACHE_TIMEOUT.
+    """
+    ids = role_cache().get(GROUP_IDS_KEY) or {}
+    if name not in ids:
+        ids = {**ids, name: Group.objects.values_list('pk', flat=True).get(name=name)}
+        role_cache().set(GROUP_IDS_KEY, ids, settings.ROLE_CACHE_TIMEOUT)
+    return ids[name]
+
+
+def forget_group_ids():
+    role_cache().delete(GROUP_IDS_KEY)
+
+
+def forget_roles(user_ids):
+    User.objects.filter(pk__in=user_ids).update(role_version=F('role_version') + 1)
+
+
+def forget_all_roles():
+    # Права групп меняются редко — сбрасываем роли всем одним UPDATE
+    User.objects.update(role_version=F('role_version') + 1)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт набор прав из кэша ролей. Пишет тот же _perm_cache
+    на объекте пользователя, поэтому остальные наследники ModelBackend (allauth)
+    не пересчитывают права повторно.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = set(get_roles(user_obj, 'permissions'))
+        return user_obj._perm_cache
@@ -0,0 +1,471 @@
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Ad, Category, NewsletterSubscription, Response, User
+from .search import get_search_backend
+from .tasks import send_newsletter
+
+SCENARIOS = ('ad_list', 'ad_list_page_50', 'ad_detail', 'response_list', 'response_create', 'send_newsletter')
+
+WORDS = (
+    'рейд гильдия танк хил урон подземелье квест награда броня зелье кузнец кожа '
+    'заклинание маг торговец аукцион золото добыча босс группа вечером ищем нужен '
+    'опытный голосовой чат расписание неделя сундук руна меч щит посох лук стрелы'
+).split()
+
+
+class HtmlGenerator:
+    """Разметка, похожая на то, что сохраняет CKEditor"""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def sentence(self, low=6, high=16):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def paragraph(self):
+        parts = [self.sentence() for _ in range(self.random.randint(1, 4))]
+        if self.random.random() < 0.3:
+            parts[0] = f'<strong>{parts[0]}</strong>'
+        if self.random.random() < 0.2:
+            parts.append(f'<a href="https://example.com/{self.random.choice(WORDS)}">{self.random.choice(WORDS)}</a>')
+        return '<p>' + ' '.join(parts) + '</p>'
+
+    def document(self):
+        blocks = [self.paragraph() for _ in range(self.random.randint(1, 6))]
+        if self.random.random() < 0.4:
+            items = ''.join(f'<li>{self.sentence(2, 5)}</li>' for _ in range(self.random.randint(2, 5)))
+            blocks.insert(self.random.randrange(len(blocks) + 1), f'<ul>{items}</ul>')
+        if self.random.random() < 0.2:
+            blocks.append(f'<p><img alt="" src="/media/uploads/{self.random.randint(1, 999)}.jpg" '
+                          f'style="height:300px; width:400px" /></p>')
+        return '\n'.join(blocks)
+
+
+def generate_board_data(users, ads, responses, batch_size=1000, seed=0, log=None):
+    """Создаёт синтетических пользователей, объявления и отклики через bulk_create"""
+    rnd = random.Random(seed)
+    html = HtmlGenerator(seed)
+    log = log or (lambda message: None)
+
+    for name, _ in Category.CATEGORY_CHOICES:
+        Category.objects.get_or_create(name=name)
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+
+    # Хеш пароля считаем один раз — PBKDF2 на каждого пользователя занял бы минуты
+    password = make_password('benchmark')
+    prefix = f'bench{int(time.time())}'
+    for start in range(0, users, batch_size):
+        batch = [
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=password)
+            for i in range(start, min(start + batch_size, users))
+        ]
+        created = User.objects.bulk_create(batch)
+        NewsletterSubscription.objects.bulk_create(
+            [NewsletterSubscription(user=user, subscribed=rnd.random() < 0.7) for user in created]
+        )
+        log(f'Пользователи: {start + len(batch)}')
+    user_ids = list(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+
+    backend = get_search_backend()
+    for start in range(0, ads, batch_size):
+        batch = []
+        for _ in range(min(batch_size, ads - start)):
+            ad = Ad(title=html.sentence(2, 6)[:200], content=html.document(),
+                    category_id=rnd.choice(category_ids), author_id=rnd.choice(user_ids))
+            ad.render_content()
+            batch.append(ad)
+        with transaction.atomic():
+            created = Ad.objects.bulk_create(batch)
+            if backend:
+                backend.index(created)
+        log(f'Объявления: {start + len(batch)}')
+
+    ad_ids = list(Ad.objects.values_list('pk', flat=True).order_by('-pk')[:ads])
+    for start in range(0, responses, batch_size):
+        batch = [
+            Response(ad_id=rnd.choice(ad_ids), author_id=rnd.choice(user_ids),
+                     content=html.sentence(), is_accepted=rnd.random() < 0.1, is_read=rnd.random() < 0.5)
+            for _ in range(min(batch_size, responses - start))
+        ]
+        Response.objects.bulk_create(batch)
+        log(f'Отклики: {start + len(batch)}')
+    return user_ids
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(action, iterations, warmup=1):
+    """Прогоняет action: латентность по итерациям, запросы и пиковая память — отдельным прогоном"""
+    for _ in range(warmup):
+        action()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        action()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            action()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p90_ms': round(_percentile(timings, 90), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': len(queries.captured_queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def _expect(response, *statuses):
+    if response.status_code not in statuses:
+        raise RuntimeError(f'{response.request["PATH_INFO"]}: HTTP {response.status_code}')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+def run_benchmarks(iterations=50, scenarios=None, seed=0):
+    """Замеряет горячие пути доски, возвращает словарь, готовый к выводу в JSON"""
+    from project.celery import app as celery_app
+
+    rnd = random.Random(seed)
+    if not Ad.objects.exists():
+        raise RuntimeError('Нет объявлений — сначала запустите generate_board_data')
+
+    author = User.objects.annotate(n=Count('ads')).order_by('-n').first()
+    author.user_permissions.add(Permission.objects.get(codename='view_response'))
+    responder = User.objects.exclude(pk=author.pk).first() or author
+    ad_ids = list(Ad.objects.values_list('pk', flat=True).order_by('-pk')[:2000])
+    author_ad_id = author.ads.values_list('pk', flat=True).first()
+
+    anonymous = Client()
+    author_client = Client()
+    author_client.force_login(author)
+    responder_client = Client()
+    responder_client.force_login(responder)
+
+    def ad_list():
+        _expect(anonymous.get(reverse('ads')), 200)
+
+    def ad_list_deep():
+        _expect(anonymous.get(reverse('ads'), {'page': 50}), 200, 404)
+
+    def ad_detail():
+        _expect(anonymous.get(reverse('ad_detail', args=[rnd.choice(ad_ids)])), 200)
+
+    def response_list():
+        _expect(author_client.get(reverse('response_list')), 200)
+
+    def response_create():
+        _expect(responder_client.post(reverse('response_create', args=[author_ad_id]),
+                                      {'content': 'Отклик из бенчмарка'}), 302)
+
+    def newsletter():
+        send_newsletter('Бенчмарк', HtmlGenerator(seed).document())
+
+    available = dict(zip(SCENARIOS, (ad_list, ad_list_deep, ad_detail, response_list, response_create, newsletter)))
+    results = {}
+    eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        for name in scenarios or available:
+            # Рассылка на порядки дороже страницы — ограничиваем число прогонов
+            runs = min(iterations, 5) if name == 'send_newsletter' else iterations
+            results[name] = measure(available[name], runs)
+    finally:
+        celery_app.conf.task_always_eager = eager
+
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'database': connection.vendor,
+        'dataset': {
+            'users': User.objects.count(),
+            'ads': Ad.objects.count(),
+            'responses': Response.objects.count(),
+            'subscribers': NewsletterSubscription.objects.filter(subscribed=True).count(),
+        },
+        'results': results,
+    }
+
+
+
+INTERFACES = ('wsgi', 'asgi')
+
+
+def _wsgi_environ(path, query_string=''):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def _asgi_scope(path, query_string=''):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+
+
+def _wsgi_load(paths, concurrency):
+    handler = WSGIHandler()
+
+    def request(path):
+        status = []
+        started = time.perf_counter()
+        body = handler(_wsgi_environ(path), lambda code, headers: status.append(int(code.split()[0])))
+        b''.join(body)
+        body.close()
+        return status[0], (time.perf_counter() - started) * 1000, threading.active_count()
+
+    # Один поток на одновременный запрос — так работает потоковый WSGI-сервер
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(request, paths))
+
+
+async def _asgi_load(paths, concurrency):
+    handler = ASGIHandler()
+    limit = asyncio.Semaphore(concurrency)
+    disconnected = asyncio.Event()
+
+    async def request(path):
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Клиент не отключается: ASGIHandler отменит ожидание после ответа
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        async with limit:
+            started = time.perf_counter()
+            await handler(_asgi_scope(path), receive, send)
+            return status[0], (time.perf_counter() - started) * 1000, threading.active_count()
+
+    return await asyncio.gather(*(request(path) for path in paths))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+def run_load_test(interface, paths, requests=200, concurrency=20):
+    """
+    Нагрузочный прогон внутри процесса: requests запросов по кругу к paths,
+    не больше concurrency одновременно, через WSGIHandler в пуле потоков или
+    через ASGIHandler в одном цикле событий.
+    """
+    targets = [paths[i % len(paths)] for i in range(requests)]
+    # Как и тестовый клиент, не закрываем соединения с базой между запросами
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    started = time.perf_counter()
+    try:
+        if interface == 'wsgi':
+            results = _wsgi_load(targets, concurrency)
+        else:
+            # async_to_sync оставляет синхронные части (ORM) в текущем потоке
+            results = async_to_sync(_asgi_load)(targets, concurrency)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    elapsed = time.perf_counter() - started
+
+    timings = [ms for _, ms, _ in results]
+    return {
+        'interface': interface,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for status, _, _ in results if status >= 400),
+        'throughput_rps': round(requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p90_ms': round(_percentile(timings, 90), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'max_threads': max(threads for _, _, threads in results),
+    }
+
+
+STARTUP_TARGETS = ('wsgi', 'asgi', 'celery')
+
+# Выполняется в новом интерпретаторе: импорт точки входа и первый запрос (для Celery —
+# загрузка модулей задач, после которой воркер готов брать задачи). Вспомогательные
+# модули проекта не импортируются, чтобы не исказить замер.
+STARTUP_PROBE = r'''
+import json, resource, sys, time
+
+started = time.perf_counter()
+
+
+def peak_rss_kb():
+    # ru_maxrss в Linux наследует пик родителя, запустившего процесс; VmHWM — нет
+    try:
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+target, path = sys.argv[1], sys.argv[2]
+
+def host():
+    from django.conf import settings
+    hosts = [h.lstrip('.') for h in settings.ALLOWED_HOSTS if h.strip('.*')]
+    return hosts[0] if hosts else 'localhost'
+
+if target == 'celery':
+    from project.celery import app
+    imported = time.perf_counter()
+    app.loader.import_default_modules()
+    app.finalize(auto=True)
+    status = 200 if 'callboard.tasks.deliver_outbox' in app.tasks else 500
+elif target == 'wsgi':
+    import io
+    from project.wsgi import application
+    imported = time.perf_counter()
+    status = []
+    body = application({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': host(), 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }, lambda code, headers: status.append(int(code.split()[0])))
+    b''.join(body)
+    body.close()
+    status = status[0]
+else:
+    import asyncio
+    from project.asgi import application
+    imported = time.perf_counter()
+    status = []
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Клиент не отключается: ASGIHandler отменит ожидание после ответа
+        await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    asyncio.run(application({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': [(b'host', host().encode())],
+        'client': ('127.0.0.1', 50000), 'server': (host(), 80),
+    }, receive, send))
+    status = status[0]
+
+ready = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (ready - imported) * 1000,
+    'max_rss_kb': peak_rss_kb(),
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def run_startup_benchmark(targets=None, runs=5, path='/', env=None):
+    """
+    Холодный старт: каждый прогон — новый процесс. Для каждой точки входа — медианы
+    времени импорта, первого ответа и всего процесса (с запуском интерпретатора),
+    пиковый RSS и число загруженных модулей. env дополняет окружение процессов,
+    например {'DJANGO_ENV': 'production', 'DJANGO_PROCESS': 'worker'}.
+    """
+    environ = {**os.environ, **(env or {})}
+    results = {}
+    for target in targets or STARTUP_TARGETS:
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-c', STARTUP_PROBE, target, path],
+                cwd=settings.BASE_DIR, env=environ, capture_output=True, text=True,
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            if completed.returncode:
+                raise RuntimeError(f'{target}: {completed.stderr.strip()[-2000:]}')
+            sample = json.loads(completed.stdout.strip().splitlines()[-1])
+            samples.append({**sample, 'process_ms': elapsed})
+        results[target] = {
+            'runs': runs,
+            'status': samples[-1]['status'],
+            **{
+                f'{key}_p50': round(statistics.median(sample[key] for sample in samples), 1)
+                for key in ('import_ms', 'first_response_ms', 'process_ms')
+            },
+            'max_rss_kb': max(sample['max_rss_kb'] for sample in samples),
+            'modules': samples[-1]['modules'],
+        }
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'profile': environ.get('DJANGO_ENV', 'development'),
+        'process': environ.get('DJANGO_PROCESS', 'web'),
+        'path': path,
+        'results': results,
+    }
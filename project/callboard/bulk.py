@@ -0,0 +1,139 @@
+from django.db import connections, transaction
+from django.db.models import CASCADE, DO_NOTHING, SET_NULL, Case, Count, F, ProtectedError, Value, When
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Ad, Category, Response, User
+from .notifications import notify_responses_accepted
+from .search import get_search_backend
+
+# Массовые операции для админки: фиксированное число запросов на любую выборку.
+# Сигналы post_save/post_delete здесь не срабатывают, поэтому денормализованные
+# счётчики и поисковый индекс поправляются явно.
+
+# Удаление идёт пачками по столько строк выборки (диапазонами pk)
+DELETE_BATCH_SIZE = 1000
+
+
+def shift_counters(model, field, deltas):
+    """Сдвигает счётчик у нескольких строк одним UPDATE: deltas — {pk: изменение}"""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+    shift = Case(*(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()), default=Value(0))
+    model.objects.filter(pk__in=deltas).update(**{field: Greatest(F(field) + shift, Value(0))})
+
+
+def _unread_by_ad_author(responses):
+    rows = responses.filter(is_read=False).order_by().values('ad__author_id').annotate(n=Count('pk'))
+    return {row['ad__author_id']: -row['n'] for row in rows}
+
+
+def pk_batches(queryset, size=None):
+    """
+    Делит выборку на пачки диапазонами pk: граница пачки — один запрос, id в память
+    не читаются. Пачку можно удалить до того, как запрошена следующая.
+    """
+    size = size or DELETE_BATCH_SIZE
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    low = None
+    while True:
+        rest = pks if low is None else pks.filter(pk__gt=low)
+        high = next(iter(rest[size - 1:size]), None)
+        batch = queryset if low is None else queryset.filter(pk__gt=low)
+        yield batch if high is None else batch.filter(pk__lte=high)
+        if high is None:
+            return
+        low = high
+
+
+def _delete_selected(queryset):
+    """DELETE ... WHERE pk IN (подзапрос выборки): без сборщика каскада и сигналов"""
+    model = queryset.model
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    sql, params = queryset.order_by().values('pk').query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({sql})', params)
+        return cursor.rowcount
+
+
+def delete_cascade(queryset):
+    """
+    Удаляет выборку с каскадом по тем же связям, что и сборщик Django (включая
+    таблицы many-to-many), но запросами с подзапросом, без загрузки объектов и сигналов.
+    CASCADE удаляет зависимые строки так же, SET_NULL обнуляет ссылку одним UPDATE,
+    DO_NOTHING пропускается; остальные on_delete (PROTECT, RESTRICT, SET_DEFAULT…)
+    останавливают удаление, если зависимые строки есть. Зависимые строки удаляются
+    раньше самой выборки, поэтому её фильтр не должен опираться на них.
+    Возвращает число удалённых строк выборки.
+    """
+    selected = queryset.order_by().values('pk')
+    for relation in get_candidate_relations_to_delete(queryset.model._meta):
+        field = relation.field
+        dependants = relation.related_model._base_manager.using(queryset.db).filter(**{f'{field.name}__in': selected})
+        if field.remote_field.on_delete is CASCADE:
+            delete_cascade(dependants)
+        elif field.remote_field.on_delete is SET_NULL:
+            dependants.update(**{field.name: None})
+        elif field.remote_field.on_delete is not DO_NOTHING and dependants.exists():
+            raise ProtectedError(
+                f'Нельзя удалить {queryset.model._meta.verbose_name_plural}: '
+                f'на них ссылается {relation.related_model._meta.label}.{field.name}',
+                dependants,
+            )
+    return _delete_selected(queryset)
+
+
+def delete_ads(queryset):
+    """Удаляет объявления со всеми зависимыми строками; возвращает число удалённых объявлений"""
+    backend = get_search_backend()
+    deleted = 0
+    with transaction.atomic():
+        for ads in pk_batches(queryset):
+            by_category = ads.order_by().values('category_id').annotate(n=Count('pk'))
+            shift_counters(Category, 'ad_count', {row['category_id']: -row['n'] for row in by_category})
+            responses = Response.objects.filter(ad__in=ads.order_by().values('pk'))
+            shift_counters(User, 'unread_response_count', _unread_by_ad_author(responses))
+            if backend:
+                backend.remove_selected(ads)
+            deleted += delete_cascade(ads)
+    return deleted
+
+
+def recategorize_ads(queryset, category):
+    """Переносит объявления в category; updated_at сбрасывает кэш их фрагментов"""
+    with transaction.atomic():
+        ad_ids = list(queryset.exclude(category=category).order_by().values_list('pk', flat=True))
+        if not ad_ids:
+            return 0
+        ads = Ad.objects.filter(pk__in=ad_ids)
+        deltas = {row['category_id']: -row['n'] for row in ads.order_by().values('category_id').annotate(n=Count('pk'))}
+        moved = ads.update(category=category, updated_at=timezone.now())
+        deltas[category.pk] = moved
+        shift_counters(Category, 'ad_count', deltas)
+    return moved
+
+
+def accept_responses(queryset):
+    """Принимает отклики одним UPDATE и ставит уведомления в outbox одной вставкой"""
+    with transaction.atomic():
+        responses = list(
+            queryset.filter(is_accepted=False).order_by()
+            .select_related('ad', 'author').only('ad', 'author', 'ad__title', 'ad__author', 'author__email')
+        )
+        if not responses:
+            return 0
+        Response.objects.filter(pk__in=[response.pk for response in responses]).update(is_accepted=True)
+        notify_responses_accepted(responses)
+    return len(responses)
+
+
+def delete_responses(queryset):
+    deleted = 0
+    with transaction.atomic():
+        for responses in pk_batches(queryset):
+            shift_counters(User, 'unread_response_count', _unread_by_ad_author(responses))
+            deleted += delete_cascade(responses)
+    return deleted
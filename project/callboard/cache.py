@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import caches
+
+STATS = ('hits', 'misses')
+
+
+def fragment_cache():
+    return caches[settings.CALLBOARD_FRAGMENT_CACHE]
+
+
+def fragment_key(name, obj):
+    """
+    Ключ фрагмента включает updated_at объекта: после правки объявления
+    старый ключ больше не запрашивается и просто вытесняется по таймауту.
+    """
+    version = obj.updated_at.timestamp() if obj.updated_at else 0
+    return f'fragment:{name}:{obj._meta.label_lower}:{obj.pk}:{version}'
+
+
+def _record(stat):
+    cache = fragment_cache()
+    key = f'fragment-stats:{stat}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик вытеснили между add и incr — статистика не критична
+        pass
+
+
+def get_or_render(name, obj, render):
+    cache = fragment_cache()
+    key = fragment_key(name, obj)
+    content = cache.get(key)
+    if content is None:
+        _record('misses')
+        content = render()
+        cache.set(key, content)
+    else:
+        _record('hits')
+    return content
+
+
+def fragment_stats():
+    values = fragment_cache().get_many([f'fragment-stats:{stat}' for stat in STATS])
+    stats = {stat: values.get(f'fragment-stats:{stat}', 0) for stat in STATS}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_fragment_stats():
+    fragment_cache().delete_many([f'fragment-stats:{stat}' for stat in STATS])
@@ -0,0 +1,32 @@
+from celery import current_app
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Кэши, содержимое которых видит только процесс, который в них записал
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def process_local_views_cache():
+    """
+    Просмотры копятся в CALLBOARD_VIEWS_CACHE, а в базу их переносит задача Celery.
+    Если кэш у каждого процесса свой, воркер их не увидит — кроме режима
+    task_always_eager, когда задачи выполняются в том же процессе.
+    """
+    backend = settings.CACHES[settings.CALLBOARD_VIEWS_CACHE]['BACKEND']
+    return backend in PROCESS_LOCAL_CACHES and not current_app.conf.task_always_eager
+
+
+@register(Tags.caches)
+def check_views_cache(app_configs, **kwargs):
+    if not process_local_views_cache():
+        return []
+    return [Warning(
+        f'Кэш просмотров {settings.CALLBOARD_VIEWS_CACHE!r} локален для процесса: '
+        f'flush_ad_views в воркере Celery не увидит просмотров из веб-процессов.',
+        hint='Укажите общий кэш (Redis, Memcached) или включите task_always_eager у Celery. '
+             'Без DEBUG такой процесс не запустится.',
+        id='callboard.W001',
+    )]
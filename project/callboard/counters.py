@@ -0,0 +1,218 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .bulk import shift_counters
+from .models import Ad, AdViewDay
+
+logger = logging.getLogger('callboard.counters')
+
+# Просмотры объявлений копятся в памяти процесса, пачками уходят в общий кэш,
+# а оттуда раз в AD_VIEWS_FLUSH_SECONDS одной транзакцией пишутся в базу.
+# Потери допустимы: пачка, не дошедшая до кэша (рестарт процесса) или вытесненная
+# из него, просто не учитывается.
+
+FLUSHED_KEY = 'views:flushed'
+LOCK_KEY = 'views:flush-lock'
+
+
+def views_cache():
+    return caches[settings.CALLBOARD_VIEWS_CACHE]
+
+
+def current_bucket(now=None):
+    """Номер окна сброса: пачки окна пишутся в базу после его закрытия"""
+    return int((time.time() if now is None else now) // settings.AD_VIEWS_FLUSH_SECONDS)
+
+
+def _batches_key(bucket):
+    return f'views:{bucket}:batches'
+
+
+def _batch_key(bucket, number):
+    return f'views:{bucket}:batch:{number}'
+
+
+def _bucket_day(bucket):
+    started = datetime.fromtimestamp(bucket * settings.AD_VIEWS_FLUSH_SECONDS, tz=dt_timezone.utc)
+    return timezone.localdate(started)
+
+
+class ViewCounter:
+    """
+    Счётчик просмотров в памяти процесса; отдаёт накопленное пачкой.
+    Пачку, которую не добрал ни один запрос, отправляет фоновый поток после
+    AD_VIEWS_PUSH_SECONDS простоя, остаток — flush() при выходе процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._hits = 0
+        self._since = time.monotonic()
+        self._flusher = None
+        # Пустая пачка в кэш не уходит: процессы без просмотров при выходе ничего не делают
+        atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def add(self, ad_id):
+        """Учитывает просмотр; возвращает пачку {ad_id: просмотры}, если её пора отправить"""
+        with self._lock:
+            self._pending[ad_id] += 1
+            self._hits += 1
+            if self._flusher is None:
+                self._start_flusher()
+            if self._hits < settings.AD_VIEWS_PUSH_SIZE \
+                    and time.monotonic() - self._since < settings.AD_VIEWS_PUSH_SECONDS:
+                return None
+            return self._take()
+
+    def drain(self):
+        with self._lock:
+            return self._take()
+
+    def drain_idle(self):
+        """Пачка, пролежавшая в памяти не меньше AD_VIEWS_PUSH_SECONDS, иначе пустая"""
+        with self._lock:
+            if time.monotonic() - self._since < settings.AD_VIEWS_PUSH_SECONDS:
+                return {}
+            return self._take()
+
+    def flush(self):
+        push_views(self.drain())
+
+    def _take(self):
+        batch = dict(self._pending)
+        self._pending, self._hits, self._since = Counter(), 0, time.monotonic()
+        return batch
+
+    def _start_flusher(self):
+        # Поток запускается при первом просмотре: процессы без просмотров (воркер,
+        # команды управления) его не держат
+        self._flusher = threading.Thread(target=self._flush_idle, name='view-counter', daemon=True)
+        self._flusher.start()
+
+    def _after_fork(self):
+        # Потоки родителя в дочернем процессе не работают, а его просмотры отправит родитель
+        self._lock = threading.Lock()
+        self._pending, self._hits, self._since = Counter(), 0, time.monotonic()
+        self._flusher = None
+
+    def _flush_idle(self):
+        while True:
+            time.sleep(settings.AD_VIEWS_PUSH_SECONDS)
+            try:
+                push_views(self.drain_idle())
+            except Exception:
+                logger.exception('Не удалось отправить просмотры в кэш')
+
+
+view_counter = ViewCounter()
+
+
+def push_views(batch, now=None):
+    """Кладёт пачку в кэш: два обращения к кэшу на пачку, а не на каждый просмотр"""
+    if not batch:
+        return
+    cache = views_cache()
+    bucket = current_bucket(now)
+    timeout = settings.AD_VIEWS_FLUSH_SECONDS * settings.AD_VIEWS_MAX_LAG
+    cache.add(_batches_key(bucket), 0, timeout)
+    try:
+        number = cache.incr(_batches_key(bucket))
+    except ValueError:
+        # Ключ вытеснили между add и incr — пачка теряется
+        return
+    cache.set(_batch_key(bucket, number), batch, timeout)
+
+
+def record_view(ad_id):
+    push_views(view_counter.add(ad_id))
+
+
+async def arecord_view(ad_id):
+    if batch := view_counter.add(ad_id):
+        # Обращения к кэшу не должны блокировать цикл событий ASGI
+        await sync_to_async(push_views)(batch)
+
+
+def _collect(bucket):
+    cache = views_cache()
+    count = cache.get(_batches_key(bucket)) or 0
+    keys = [_batch_key(bucket, number) for number in range(1, count + 1)]
+    totals = Counter()
+    for batch in cache.get_many(keys).values():
+        totals.update(batch)
+    cache.delete_many([*keys, _batches_key(bucket)])
+    return totals
+
+
+def collect_views(now=None):
+    """
+    Забирает из кэша пачки всех закрытых окон: {день: Counter(ad_id → просмотры)}.
+    None — сброс уже идёт в другом воркере.
+    """
+    cache = views_cache()
+    if not cache.add(LOCK_KEY, 1, settings.AD_VIEWS_FLUSH_SECONDS):
+        return None
+    try:
+        current = current_bucket(now)
+        first = current - settings.AD_VIEWS_MAX_LAG
+        flushed = cache.get(FLUSHED_KEY)
+        if flushed is not None:
+            first = max(first, flushed + 1)
+        by_day = defaultdict(Counter)
+        for bucket in range(first, current):
+            by_day[_bucket_day(bucket)].update(_collect(bucket))
+        cache.set(FLUSHED_KEY, current - 1, timeout=None)
+        return {day: views for day, views in by_day.items() if views}
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def save_views(by_day):
+    """Пишет собранные просмотры: дневные строки, Ad.views и Ad.weekly_views затронутых объявлений"""
+    totals = Counter()
+    for views in by_day.values():
+        totals.update(views)
+    with transaction.atomic():
+        # Объявление могли удалить, пока его просмотры лежали в кэше
+        existing_ads = set(Ad.objects.filter(pk__in=totals).values_list('pk', flat=True))
+        for day, views in by_day.items():
+            rows = {row.ad_id: row for row in AdViewDay.objects.filter(day=day, ad_id__in=existing_ads.intersection(views))}
+            for ad_id, row in rows.items():
+                row.views += views[ad_id]
+            AdViewDay.objects.bulk_update(rows.values(), ['views'])
+            AdViewDay.objects.bulk_create([
+                AdViewDay(ad_id=ad_id, day=day, views=count)
+                for ad_id, count in views.items() if ad_id in existing_ads and ad_id not in rows
+            ])
+        shift_counters(Ad, 'views', {ad_id: totals[ad_id] for ad_id in existing_ads})
+        refresh_weekly_views(Ad.objects.filter(pk__in=existing_ads))
+    return sum(totals[ad_id] for ad_id in existing_ads)
+
+
+def popular_since():
+    return timezone.localdate() - timedelta(days=settings.AD_POPULAR_DAYS - 1)
+
+
+def refresh_weekly_views(queryset):
+    week = (
+        AdViewDay.objects.filter(ad=OuterRef('pk'), day__gte=popular_since())
+        .order_by().values('ad').annotate(total=Sum('views')).values('total')
+    )
+    # update(), а не save(): updated_at и кэш фрагментов от просмотров не меняются
+    return queryset.update(weekly_views=Coalesce(Subquery(week), 0))
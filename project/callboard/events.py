@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('callboard.events')
+
+
+class EventHub:
+    """
+    Подписчики событий в пределах процесса. Каждое SSE-соединение — это очередь
+    asyncio в цикле событий ASGI-сервера: открытое соединение не держит ни поток,
+    ни соединение с базой. Публикация идёт через backend, который решает, как
+    событие дойдёт до хабов остальных процессов.
+    """
+
+    def __init__(self, backend_class, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.backend = backend_class(self)
+
+    def publish(self, user_id, event):
+        """Вызывается из синхронного кода, в том числе не из потока цикла событий"""
+        self.backend.publish(user_id, event)
+
+    def dispatch(self, user_id, event):
+        """Доставка подписчикам этого процесса; backend вызывает её для каждого события"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать — пропущенное он увидит, обновив страницу
+            pass
+
+    def subscribe(self, user_id):
+        self.backend.start()
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[user_id].add(entry)
+        return Subscription(self, user_id, entry)
+
+    def unsubscribe(self, user_id, entry):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(entry)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class Subscription:
+
+    def __init__(self, hub, user_id, entry):
+        self.hub = hub
+        self.user_id = user_id
+        self.entry = entry
+
+    async def get(self, timeout=None):
+        """Следующее событие или None, если за timeout секунд ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self.entry[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self.user_id, self.entry)
+
+
+class LocalEventBackend:
+    """События не покидают процесс — для разработки и одного процесса ASGI-сервера"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, user_id, event):
+        self.hub.dispatch(user_id, event)
+
+
+class RedisEventBackend:
+    """
+    Рассылка между процессами через Redis pub/sub. Каждый процесс держит один
+    поток-слушатель на все свои соединения. Требует пакет redis.
+    """
+    prefix = 'callboard:events:'
+    # Пауза перед переподключением растёт вдвое после каждой неудачи
+    reconnect_delay = 1
+    max_reconnect_delay = 30
+
+    def __init__(self, hub):
+        import redis
+
+        self.hub = hub
+        self.client = redis.Redis.from_url(settings.CALLBOARD_EVENT_REDIS_URL)
+        self._listener = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='callboard-events', daemon=True)
+                self._listener.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self):
+        """
+        Слушатель не должен умирать: при обрыве связи с Redis он переподключается,
+        иначе процесс молча перестал бы доставлять события. Пропущенные за время
+        обрыва события клиенты увидят, обновив страницу.
+        """
+        delay = self.reconnect_delay
+        while not self._stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{self.prefix}*')
+                delay = self.reconnect_delay
+                for message in pubsub.listen():
+                    self._dispatch(message)
+                    if self._stopped.is_set():
+                        return
+            except Exception:
+                if self._stopped.is_set():
+                    return
+                logger.warning('Потеряно соединение с Redis, переподключение через %s с', delay, exc_info=True)
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, message):
+        try:
+            user_id = int(message['channel'].decode().removeprefix(self.prefix))
+            event = json.loads(message['data'])
+        except (KeyError, ValueError, AttributeError):
+            logger.warning('Некорректное сообщение в канале событий: %r', message)
+            return
+        self.hub.dispatch(user_id, event)
+
+    def publish(self, user_id, event):
+        self.client.publish(f'{self.prefix}{user_id}', json.dumps(event, ensure_ascii=False))
+
+
+@lru_cache(maxsize=None)
+def get_hub():
+    return EventHub(import_string(settings.CALLBOARD_EVENT_BACKEND), settings.CALLBOARD_EVENT_QUEUE_SIZE)
+
+
+def publish_on_commit(user_id, event):
+    """Событие уходит подписчикам только после фиксации транзакции, которая его породила"""
+    transaction.on_commit(lambda: get_hub().publish(user_id, event), robust=True)
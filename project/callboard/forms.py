@@ -1,6 +1,6 @@
 from allauth.account.forms import SignupForm
-from django.contrib.auth.models import Group
 from django import forms
+from .backends import group_id
 from .models import Ad, NewsletterSubscription
 from ckeditor.widgets import CKEditorWidget
 from .models import Response
@@ -10,8 +10,7 @@ class BasicSignupForm(SignupForm):
 
     def save(self, request):
         user = super(BasicSignupForm, self).save(request)
-        basic_group = Group.objects.get(name='basic')
-        basic_group.user_set.add(user)
+        user.groups.add(group_id('basic'))
         return user
 
 
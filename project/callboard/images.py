@@ -0,0 +1,147 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import IntegrityError, transaction
+
+from .models import AD_IMAGE_DIR, AdImage
+
+# Форматы, которые принимаются от CKEditor, и расширения оригиналов
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+VARIANT_FORMAT = 'WEBP'
+
+
+class ImageSizeLimitHandler(FileUploadHandler):
+    """
+    Обрывает загрузку, как только файл превысил AD_IMAGE_MAX_SIZE, не дочитывая тело
+    запроса. Должен стоять первым в request.upload_handlers.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.AD_IMAGE_MAX_SIZE:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def original_name(sha256, image_format):
+    return f'{AD_IMAGE_DIR}/{sha256[:2]}/{sha256}.{FORMATS[image_format]}'
+
+
+def variant_name(sha256, label):
+    return f'{AD_IMAGE_DIR}/{sha256[:2]}/{sha256}-{label}.{FORMATS[VARIANT_FORMAT]}'
+
+
+def hash_upload(upload):
+    """sha256 содержимого; большой файл уже лежит на диске и читается кусками"""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks(settings.AD_IMAGE_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inspect_upload(upload):
+    """Формат и размеры по заголовку файла — без декодирования всей картинки"""
+    from PIL import Image
+
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise ValidationError('Файл не является изображением')
+    finally:
+        upload.seek(0)
+    if image_format not in FORMATS:
+        raise ValidationError(f'Формат {image_format} не поддерживается')
+    if width * height > settings.AD_IMAGE_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение изображения')
+    return image_format, width, height
+
+
+def store_upload(upload, user):
+    """
+    Сохраняет загрузку под именем из её sha256 и возвращает (AdImage, created).
+    Повторная загрузка того же файла не пишет на диск ничего нового.
+    """
+    if upload.size > settings.AD_IMAGE_MAX_SIZE:
+        raise ValidationError('Файл слишком большой')
+    sha256 = hash_upload(upload)
+    image = AdImage.objects.filter(sha256=sha256).first()
+    if image is not None:
+        return image, False
+
+    image_format, width, height = inspect_upload(upload)
+    name = original_name(sha256, image_format)
+    if not default_storage.exists(name):
+        # Временный файл загрузки перемещается, а не копируется через память
+        saved = default_storage.save(name, upload)
+        if saved != name:
+            # Тот же файл параллельно сохранил другой запрос — копия не нужна
+            default_storage.delete(saved)
+    try:
+        with transaction.atomic():
+            image = AdImage.objects.create(
+                sha256=sha256, file=name, format=image_format, width=width, height=height,
+                size=upload.size, uploaded_by=user,
+            )
+    except IntegrityError:
+        return AdImage.objects.get(sha256=sha256), False
+
+    from .tasks import process_ad_image
+    transaction.on_commit(lambda: process_ad_image.delay(image.pk), robust=True)
+    return image, True
+
+
+def _encode(image):
+    buffer = BytesIO()
+    image.save(buffer, VARIANT_FORMAT, quality=settings.AD_IMAGE_QUALITY, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def make_variants(image):
+    """
+    Уменьшенные копии для srcset (по AD_IMAGE_WIDTHS, но не шире оригинала)
+    и квадратная миниатюра для ленты. Уже записанные файлы не перезаписываются.
+    """
+    from PIL import Image, ImageOps
+
+    with default_storage.open(image.file.name, 'rb') as file, Image.open(file) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе, если оригинал намного больше нужного
+        largest = max(settings.AD_IMAGE_WIDTHS)
+        source.draft('RGB', (largest, source.height * largest // source.width))
+        source = ImageOps.exif_transpose(source)
+        source = source.convert('RGBA' if source.has_transparency_data else 'RGB')
+
+    widths = [width for width in settings.AD_IMAGE_WIDTHS if width < source.width]
+    if source.width <= max(settings.AD_IMAGE_WIDTHS):
+        widths.append(source.width)
+
+    variants = {}
+    for width in widths:
+        resized = source.copy()
+        resized.thumbnail((width, source.height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        variants[str(width)] = [*resized.size, variant_name(image.sha256, width)]
+        _save_variant(variants[str(width)][2], resized)
+
+    thumb = ImageOps.fit(source, settings.AD_IMAGE_THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    variants['thumb'] = [*thumb.size, variant_name(image.sha256, 'thumb')]
+    _save_variant(variants['thumb'][2], thumb)
+    return variants
+
+
+def _save_variant(name, image):
+    if not default_storage.exists(name):
+        default_storage.save(name, _encode(image))
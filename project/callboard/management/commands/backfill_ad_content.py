@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from callboard.models import Ad
+from callboard.search import get_search_backend
+from callboard.tasks import chunked
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает очищенный HTML, текст и анонс для существующих объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--only-missing', action='store_true',
+                            help='Обрабатывать только объявления без content_html')
+
+    def handle(self, *args, batch_size, only_missing, **options):
+        queryset = Ad.objects.only('pk', 'title', 'content').order_by('pk')
+        if only_missing:
+            queryset = queryset.filter(content_html='')
+        backend = get_search_backend()
+        total = 0
+        for batch in chunked(queryset.iterator(chunk_size=batch_size), batch_size):
+            for ad in batch:
+                ad.render_content()
+            # bulk_update не меняет updated_at: пересчёт не считается правкой объявления
+            with transaction.atomic():
+                Ad.objects.bulk_update(batch, ['content_html', 'content_text', 'excerpt', 'cover'])
+                if backend:
+                    backend.index(batch)
+            total += len(batch)
+            self.stdout.write(f'Обработано: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, объявлений: {total}'))
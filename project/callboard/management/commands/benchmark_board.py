@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from callboard.benchmark import SCENARIOS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет латентность, число SQL-запросов и пиковую память горячих путей доски. '
+        'Запускать на отдельной базе, наполненной generate_board_data: сценарии создают отклики.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Можно указать несколько раз, по умолчанию — все сценарии')
+        parser.add_argument('--output', '-o', help='Файл для JSON-отчёта, по умолчанию stdout')
+        parser.add_argument('--baseline', help='Предыдущий JSON-отчёт для сравнения p50/p90 и запросов')
+
+    def handle(self, *args, iterations, scenarios, output, baseline, **options):
+        report = run_benchmarks(iterations=iterations, scenarios=scenarios)
+        if baseline:
+            with open(baseline, encoding='utf-8') as stream:
+                report['baseline'] = self.compare(json.load(stream)['results'], report['results'])
+
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                stream.write(data)
+        else:
+            self.stdout.write(data)
+
+    @staticmethod
+    def compare(before, after):
+        comparison = {}
+        for name, result in after.items():
+            if name not in before:
+                continue
+            comparison[name] = {
+                key: round(result[key] / before[name][key], 3) if before[name][key] else None
+                for key in ('p50_ms', 'p90_ms', 'queries', 'peak_memory_kb')
+            }
+        return comparison
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from callboard.benchmark import STARTUP_TARGETS, run_startup_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет холодный старт: импорт project.wsgi, project.asgi и приложения Celery '
+        'в новом процессе, время до первого ответа, пиковую память и число модулей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', choices=STARTUP_TARGETS, dest='targets',
+                            help='Можно указать несколько раз, по умолчанию — все')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/', help='Адрес первого запроса')
+        parser.add_argument('--profile', choices=('development', 'production'),
+                            help='DJANGO_ENV процессов, по умолчанию — как у текущего')
+        parser.add_argument('--process', choices=('web', 'worker'),
+                            help='DJANGO_PROCESS процессов (для production)')
+
+    def handle(self, *args, targets, runs, path, profile, process, **options):
+        env = {}
+        if profile:
+            env['DJANGO_ENV'] = profile
+        if process:
+            env['DJANGO_PROCESS'] = process
+        report = run_startup_benchmark(targets, runs=runs, path=path, env=env)
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from callboard.transfer import EXPORT_FIELDS, FORMATS, detect_format, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает категории, объявления или отклики в JSONL/CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORT_FIELDS)
+        parser.add_argument('--output', '-o', default='-', help='Файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, kind, output, format, batch_size, **options):
+        fmt = detect_format(output, format)
+        rows = export_rows(kind, batch_size)
+        if output == '-':
+            count = write_rows(rows, self.stdout, fmt, kind)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write_rows(rows, stream, fmt, kind)
+        self.stderr.write(f'Выгружено: {count}')
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from callboard.cache import fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша фрагментов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики после вывода')
+
+    def handle(self, *args, reset, **options):
+        self.stdout.write(json.dumps(fragment_stats()))
+        if reset:
+            reset_fragment_stats()
@@ -0,0 +1,24 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from callboard.benchmark import generate_board_data
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими пользователями, объявлениями и откликами для бенчмарков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ads', type=int, default=10000)
+        parser.add_argument('--responses', type=int, default=30000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, users, ads, responses, batch_size, seed, **options):
+        generate_board_data(users, ads, responses, batch_size=batch_size, seed=seed, log=self.stderr.write)
+        # bulk_create обходит сигналы — пересчитываем денормализованные счётчики
+        call_command('recount_category_ads', stdout=self.stdout)
+        call_command('recount_unread_responses', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {users}, объявлений {ads}, откликов {responses}'
+        ))
@@ -0,0 +1,60 @@
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from callboard.search import get_search_backend
+from callboard.tasks import chunked
+from callboard.transfer import (
+    BUILDERS, EXPORT_FIELDS, FORMATS, LookupMaps, detect_format, insert_objects, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = 'Загружает категории, объявления или отклики из JSONL/CSV пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORT_FIELDS)
+        parser.add_argument('input', help='Файл с данными, "-" — stdin')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--ignore-conflicts', action='store_true',
+                            help='Пропускать строки с уже существующими id')
+
+    def handle(self, *args, kind, input, format, batch_size, ignore_conflicts, **options):
+        fmt = detect_format(input, format)
+        if input == '-':
+            imported, skipped = self.load(kind, sys.stdin, fmt, batch_size, ignore_conflicts)
+        else:
+            with open(input, encoding='utf-8', newline='') as stream:
+                imported, skipped = self.load(kind, stream, fmt, batch_size, ignore_conflicts)
+
+        # bulk_create обходит сигналы: денормализованные счётчики пересчитываем одним проходом
+        if kind == 'ads':
+            call_command('recount_category_ads', stdout=self.stdout)
+        elif kind == 'responses':
+            call_command('recount_unread_responses', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Загружено: {imported}, пропущено: {skipped}'))
+
+    def load(self, kind, stream, fmt, batch_size, ignore_conflicts):
+        model = EXPORT_FIELDS[kind][0]
+        build = BUILDERS[kind]
+        lookups = LookupMaps()
+        backend = get_search_backend() if kind == 'ads' else None
+        imported = skipped = 0
+        for rows in chunked(read_rows(stream, fmt), batch_size):
+            objects = [obj for obj in (build(row, lookups) for row in rows) if obj is not None]
+            with transaction.atomic():
+                inserted = insert_objects(model, objects, ignore_conflicts=ignore_conflicts)
+                if backend:
+                    backend.index(inserted)
+            skipped += len(rows) - len(inserted)
+            imported += len(inserted)
+            self.stderr.write(f'{kind}: {imported}')
+        # Строки вставлены с явными id — сдвигаем последовательности (PostgreSQL)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                cursor.execute(sql)
+        return imported, skipped
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from callboard.benchmark import INTERFACES, run_load_test
+from callboard.models import Ad
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон страниц доски через WSGI и ASGI обработчики внутри процесса: '
+        'пропускная способность, латентность и число потоков при одинаковой конкурентности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', action='append', choices=INTERFACES, dest='interfaces',
+                            help='Можно указать несколько раз, по умолчанию — оба')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='По умолчанию — лента и несколько объявлений')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, interfaces, paths, requests, concurrency, **options):
+        if not paths:
+            ad_ids = Ad.objects.values_list('pk', flat=True).order_by('-pk')[:20]
+            paths = ['/ads/'] + [f'/ads/{pk}/' for pk in ad_ids]
+        report = {
+            interface: run_load_test(interface, paths, requests=requests, concurrency=concurrency)
+            for interface in interfaces or INTERFACES
+        }
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
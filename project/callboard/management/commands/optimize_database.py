@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Обновляет статистику планировщика SQLite и переносит журнал WAL в основной файл базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--analyze', action='store_true',
+                            help='Полный ANALYZE вместо PRAGMA optimize (дольше, но пересчитывает всё)')
+        parser.add_argument('--checkpoint', default='TRUNCATE', choices=('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'),
+                            help='Режим wal_checkpoint')
+
+    def handle(self, *args, database, analyze, checkpoint, **options):
+        connection = connections[database]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+
+        with connection.cursor() as cursor:
+            if analyze:
+                cursor.execute('ANALYZE')
+                self.stdout.write('ANALYZE выполнен')
+            else:
+                # Анализирует только таблицы, статистика которых устарела
+                cursor.execute('PRAGMA optimize')
+                self.stdout.write('PRAGMA optimize выполнен')
+
+            cursor.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+            busy, wal_pages, checkpointed = cursor.fetchone()
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            page_count = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            freelist = cursor.fetchone()[0]
+
+        if busy:
+            self.stderr.write('Контрольная точка выполнена не полностью: база занята другим соединением')
+        self.stdout.write(
+            f'journal_mode={journal_mode}, страниц WAL: {wal_pages}, перенесено: {checkpointed}, '
+            f'страниц в базе: {page_count}, свободных: {freelist}'
+        )
+        self.stdout.write(self.style.SUCCESS('Обслуживание базы завершено'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from callboard.models import Ad
+from callboard.search import get_search_backend
+from callboard.tasks import chunked
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stderr.write('Для этой базы данных поисковый индекс не поддерживается')
+            return
+        with transaction.atomic():
+            backend.clear()
+        ads = Ad.objects.only('pk', 'title', 'content_text').order_by().iterator(chunk_size=batch_size)
+        total = 0
+        for batch in chunked(ads, batch_size):
+            with transaction.atomic():
+                backend.index(batch)
+            total += len(batch)
+            self.stdout.write(f'Проиндексировано: {total}')
+        backend.optimize()
+        self.stdout.write(self.style.SUCCESS(f'Индекс перестроен, объявлений: {total}'))
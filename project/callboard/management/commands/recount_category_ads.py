@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from callboard.models import Ad, Category
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики объявлений по категориям'
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Ad.objects.filter(category__isnull=False).order_by()
+            .values_list('category').annotate(n=Count('id'))
+        )
+        with transaction.atomic():
+            categories = list(Category.objects.select_for_update())
+            for category in categories:
+                category.ad_count = counts.get(category.pk, 0)
+            Category.objects.bulk_update(categories, ['ad_count'])
+        self.stdout.write(self.style.SUCCESS(f'Счётчики обновлены: {len(categories)} категорий'))
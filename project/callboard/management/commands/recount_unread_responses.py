@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from callboard.models import Response, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики непрочитанных откликов пользователей'
+
+    def handle(self, *args, **options):
+        counts = (
+            Response.objects.filter(is_read=False).order_by()
+            .values_list('ad__author').annotate(n=Count('id'))
+        )
+        with transaction.atomic():
+            User.objects.exclude(unread_response_count=0).update(unread_response_count=0)
+            for user_id, n in counts:
+                User.objects.filter(pk=user_id).update(unread_response_count=n)
+        self.stdout.write(self.style.SUCCESS('Счётчики непрочитанных откликов обновлены'))
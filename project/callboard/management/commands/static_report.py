@@ -0,0 +1,44 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from callboard.staticfiles import COMPRESSION_REPORT
+
+
+def _saved(row):
+    best = min(size for size in (row['size'], row.get('br'), row.get('gzip')) if size is not None)
+    return row['size'] - best
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько байт экономят сжатые копии статики (по отчёту collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Сколько файлов с наибольшей экономией показать')
+        parser.add_argument('--json', action='store_true', dest='as_json', help='Вывести отчёт целиком в JSON')
+
+    def handle(self, *args, limit, as_json, **options):
+        path = os.path.join(settings.STATIC_ROOT or '', COMPRESSION_REPORT)
+        try:
+            with open(path, encoding='utf-8') as file:
+                report = json.load(file)
+        except OSError:
+            raise CommandError(f'Нет отчёта {path}: запустите collectstatic с хранилищем CompressedManifestStaticFilesStorage')
+        if as_json:
+            self.stdout.write(json.dumps(report, indent=1))
+            return
+
+        rows = sorted(report.items(), key=lambda item: _saved(item[1]), reverse=True)
+        self.stdout.write(f'{"файл":<60} {"исходный":>10} {"gzip":>10} {"brotli":>10} {"экономия":>10}')
+        for name, row in rows[:limit]:
+            self.stdout.write(
+                f'{row["hashed"][-60:]:<60} {row["size"]:>10} {row.get("gzip") or "-":>10} '
+                f'{row.get("br") or "-":>10} {_saved(row):>10}'
+            )
+        total = sum(row['size'] for row in report.values())
+        saved = sum(_saved(row) for row in report.values())
+        share = saved / total if total else 0
+        self.stdout.write(f'Файлов: {len(report)}, исходный объём: {total}, экономия: {saved} ({share:.0%})')
+
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик (замена репликации для локальной разработки)'
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Реплики PostgreSQL настраиваются средствами самой СУБД')
+        if not settings.CALLBOARD_READ_REPLICAS:
+            self.stderr.write('Реплики не настроены: задайте DATABASE_REPLICAS')
+            return
+
+        primary.ensure_connection()
+        for alias in settings.CALLBOARD_READ_REPLICAS:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # Онлайн-копия через backup API: основная база остаётся доступной для записи
+            primary.connection.backup(replica.connection)
+            replica.close()
+            self.stdout.write(f'{alias}: скопировано в {replica.settings_dict["NAME"]}')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
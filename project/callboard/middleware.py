@@ -0,0 +1,255 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .routers import enable_replica_reads, is_pinned, replica_reads
+from .staticfiles import build_index
+
+logger = logging.getLogger('callboard.performance')
+
+_current_stats = ContextVar('callboard_request_stats', default=None)
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sql = Counter()
+        self.template_time = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            self.sql[sql] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.sql.items() if count > 1}
+
+
+def _record_query(execute, sql, params, many, context):
+    # Обёртка стоит на соединении постоянно, запрос учитывается, только если он замеряется.
+    # Под ASGI ORM работает в потоке sync_to_async со своим соединением, а ContextVar
+    # копируется в этот поток вместе с контекстом
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.sql_wrapper(execute, sql, params, many, context)
+
+
+def _instrument_connections(**kwargs):
+    # Соединения свои у каждого потока. request_started приходит в том потоке, где затем
+    # выполняются запросы ORM: под ASGI — в потоке ThreadSensitiveContext этого запроса
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_query)
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, SQL (число, время, повторы) и отрисовку TemplateResponse,
+    пишет заголовок Server-Timing и структурированную строку в лог.
+    При выключенном мониторинге Django исключает middleware из цепочки.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.PERFORMANCE_MONITORING
+        if not config.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        self.slow_request_ms = config.get('SLOW_REQUEST_MS', 500)
+        self.server_timing = config.get('SERVER_TIMING', True)
+        request_started.connect(_instrument_connections, dispatch_uid='callboard.performance')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def process_template_response(self, request, response):
+        # TemplateResponse отрисовывается после всех process_template_response, а колбэки
+        # add_post_render_callback — сразу после отрисовки: время замеряется без подмены Template.render
+        stats = _current_stats.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.template_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = stats.sql_time * 1000
+        template_ms = stats.template_time * 1000
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={total_ms:.1f}',
+                f'db;dur={sql_ms:.1f};desc="{stats.sql_count} queries"',
+                f'tpl;dur={template_ms:.1f}',
+            ])
+        self.log(request, response, stats, total_ms, sql_ms, template_ms)
+        return response
+
+    def log(self, request, response, stats, total_ms, sql_ms, template_ms):
+        slow = total_ms >= self.slow_request_ms
+        if not slow and not logger.isEnabledFor(logging.INFO):
+            return
+        duplicates = stats.duplicates
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'sql_count': stats.sql_count,
+            'sql_ms': round(sql_ms, 1),
+            'duplicate_queries': sum(count - 1 for count in duplicates.values()),
+            'template_ms': round(template_ms, 1),
+        }
+        if duplicates:
+            record['top_duplicate'] = max(duplicates, key=duplicates.get)[:200]
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Представления с атрибутом replica_reads = True читают из реплик, если пользователь
+    недавно ничего не записывал (см. routers.pin_to_primary). Отрисовка шаблона
+    тоже выполняется внутри get_response, поэтому ленивые запросы уходят туда же.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(False):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with replica_reads(False):
+            return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', view_func)
+        if getattr(view_class, 'replica_reads', False) and request.method in ('GET', 'HEAD') \
+                and not is_pinned(request):
+            enable_replica_reads()
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную статику из процесса приложения, когда перед ним нет CDN или
+    nginx: запрос не проходит сессии, аутентификацию и URLconf. Хэшированные имена
+    кэшируются на год как immutable, остальные — на STATIC_MAX_AGE с ревалидацией.
+    Сжатая копия (.br, .gz) выбирается по Accept-Encoding.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        static_url = urlsplit(settings.STATIC_URL)
+        if not settings.CALLBOARD_SERVE_STATIC or not settings.STATIC_ROOT or static_url.netloc:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = '/' + static_url.path.strip('/') + '/'
+        self.files = build_index(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        return self.serve(request, static_file) if static_file else self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        return self.serve(request, static_file) if static_file else await self.get_response(request)
+
+    def find(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        return self.files.get(request.path[len(self.prefix):])
+
+    @staticmethod
+    def serve(request, static_file):
+        if static_file.immutable:
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+        path, size, encoding = static_file.negotiate(request.headers.get('Accept-Encoding', ''))
+        # У каждой кодировки свой ETag: это разные байты
+        etag = f'{static_file.etag[:-1]}-{encoding}"' if encoding else static_file.etag
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            response.headers.pop('Content-Disposition', None)
+        if response.status_code == 200:
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Cache-Control'] = cache_control
+        response['ETag'] = etag
+        if static_file.encoded:
+            response['Vary'] = 'Accept-Encoding'
+        return response
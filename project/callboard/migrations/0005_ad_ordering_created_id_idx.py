@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0004_newslettersubscription'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ad',
+            options={'ordering': ['-created_at', '-id'], 'permissions': [('can_publish', 'Can publish ads'), ('can_mark_urgent', 'Can mark ads as urgent')]},
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['-created_at', '-id'], name='callboard_ad_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from callboard.search import get_search_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_search_backend(schema_editor.connection.vendor)
+    if backend:
+        backend.create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_search_backend(schema_editor.connection.vendor)
+    if backend:
+        backend.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0006_outboxemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+def fill_ad_count(apps, schema_editor):
+    Category = apps.get_model('callboard', 'Category')
+    Ad = apps.get_model('callboard', 'Ad')
+    counts = Ad.objects.filter(category__isnull=False).values_list('category').annotate(n=models.Count('id'))
+    for category_id, n in counts.order_by():
+        Category.objects.filter(pk=category_id).update(ad_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0007_ad_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='ad_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_ad_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='callboard_ad_cat_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+def _postgres_search_index(schema_editor, column):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS callboard_ad_search_idx")
+    schema_editor.execute(
+        "CREATE INDEX callboard_ad_search_idx ON callboard_ad USING GIN ("
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('russian', coalesce({column}, '')), 'B'))"
+    )
+
+
+def index_content_text(apps, schema_editor):
+    _postgres_search_index(schema_editor, 'content_text')
+
+
+def index_content(apps, schema_editor):
+    _postgres_search_index(schema_editor, 'content')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0009_ad_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='content_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        # Поисковый индекс PostgreSQL строится по очищенному тексту
+        migrations.RunPython(index_content_text, index_content),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+def fill_unread_response_count(apps, schema_editor):
+    User = apps.get_model('callboard', 'User')
+    Response = apps.get_model('callboard', 'Response')
+    counts = Response.objects.filter(is_read=False).order_by().values_list('ad__author').annotate(n=models.Count('id'))
+    for user_id, n in counts:
+        User.objects.filter(pk=user_id).update(unread_response_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0010_ad_rendered_content'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='response',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='is_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='unread_response_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad', '-created_at'], name='callboard_resp_ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['is_accepted'], name='callboard_resp_accepted_idx'),
+        ),
+        migrations.RunPython(fill_unread_response_count, migrations.RunPython.noop),
+    ]
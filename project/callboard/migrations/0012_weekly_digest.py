@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0011_response_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(blank=True, null=True)),
+                ('period_end', models.DateTimeField(unique=True)),
+                ('subject', models.CharField(blank=True, max_length=255)),
+                ('html_content', models.TextField(blank=True)),
+                ('text_content', models.TextField(blank=True)),
+                ('ad_count', models.PositiveIntegerField(default=0)),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+                ('chunk_count', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('metrics', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'ordering': ['-period_end'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DigestChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('first_subscription_id', models.BigIntegerField()),
+                ('last_subscription_id', models.BigIntegerField()),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='callboard.digestrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'number'), name='callboard_digest_chunk_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0014_response_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdViewDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='views',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='weekly_views',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['-weekly_views', '-id'], name='callboard_ad_popular_idx'),
+        ),
+        migrations.AddField(
+            model_name='adviewday',
+            name='ad',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_days', to='callboard.ad'),
+        ),
+        migrations.AddIndex(
+            model_name='adviewday',
+            index=models.Index(fields=['day'], name='callboard_ad_view_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='adviewday',
+            constraint=models.UniqueConstraint(fields=('ad', 'day'), name='callboard_ad_view_day_unique'),
+        ),
+    ]
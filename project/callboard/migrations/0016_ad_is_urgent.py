@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0015_ad_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='is_urgent',
+            field=models.BooleanField(default=False),
+        ),
+    ]
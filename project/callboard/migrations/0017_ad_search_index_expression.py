@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def _drop_search_index(schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS callboard_ad_search_idx")
+
+
+def build_search_index(apps, schema_editor):
+    """
+    GIN-индекс строится тем же SearchVector, что и запрос PostgresSearchBackend.search:
+    выражение в DDL совпадает с условием vector @@ query буква в букву (включая приведения
+    типов), и планировщик использует индекс. Выражение из 0010 с этим не совпадало.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    _drop_search_index(schema_editor)
+    schema_editor.add_index(apps.get_model('callboard', 'Ad'), GinIndex(
+        SearchVector('title', weight='A', config='russian')
+        + SearchVector('content_text', weight='B', config='russian'),
+        name='callboard_ad_search_idx',
+    ))
+
+
+def restore_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    _drop_search_index(schema_editor)
+    schema_editor.execute(
+        "CREATE INDEX callboard_ad_search_idx ON callboard_ad USING GIN ("
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(content_text, '')), 'B'))"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0016_ad_is_urgent'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_index, restore_search_index),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def render_content(apps, schema_editor):
+    """
+    Заполняет content_html, content_text и excerpt, добавленные 0010 пустыми.
+    Пачками по pk: большая таблица не читается в память целиком. Картинки без srcset —
+    варианты и обложки досчитает команда backfill_ad_content.
+    """
+    from callboard.sanitize import make_excerpt, sanitize_html
+    from callboard.search import get_search_backend
+
+    Ad = apps.get_model('callboard', 'Ad')
+    backend = get_search_backend()
+    queryset = Ad.objects.using(schema_editor.connection.alias).filter(content_html='').order_by('pk')
+    last_pk = 0
+    while batch := list(queryset.filter(pk__gt=last_pk).only('pk', 'title', 'content')[:BATCH_SIZE]):
+        for ad in batch:
+            ad.content_html, ad.content_text = sanitize_html(ad.content)
+            ad.excerpt = make_excerpt(ad.content_text)
+        # bulk_update не меняет updated_at: пересчёт не считается правкой объявления
+        Ad.objects.using(schema_editor.connection.alias).bulk_update(
+            batch, ['content_html', 'content_text', 'excerpt'], batch_size=BATCH_SIZE,
+        )
+        if backend:
+            # Индекс SQLite хранит текст объявления: до пересчёта он был пустым
+            backend.index(batch)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0017_ad_search_index_expression'),
+    ]
+
+    operations = [
+        migrations.RunPython(render_content, migrations.RunPython.noop),
+    ]
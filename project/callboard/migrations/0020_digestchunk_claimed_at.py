@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callboard', '0019_user_role_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='digestchunk',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,15 +1,33 @@
+import re
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Lower
 from ckeditor.fields import RichTextField
 
+from .sanitize import sanitize_html, make_excerpt
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     is_email_verified = models.BooleanField(default=False)
+    # Непрочитанные отклики на объявления пользователя — для значка в шапке
+    unread_response_count = models.PositiveIntegerField(default=0, editable=False)
+    # Увеличивается при изменении групп и прав: ключ кэша ролей включает версию (callboard.backends)
+    role_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Поиск пользователей в админке по началу имени и email без учёта регистра
+            models.Index(Lower('username'), name='callboard_user_username_ci_idx'),
+            models.Index(Lower('email'), name='callboard_user_email_ci_idx'),
+        ]
+
 
 class Category(models.Model):
     CATEGORY_CHOICES = [
@@ -25,6 +43,8 @@ class Category(models.Model):
         ('spellmaster', 'Мастера заклинаний'),
     ]
     name = models.CharField(max_length=50, choices=CATEGORY_CHOICES, unique=True)
+    # Денормализованный счётчик объявлений, поддерживается сигналами Ad
+    ad_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.get_name_display()
@@ -33,14 +53,59 @@ class Category(models.Model):
 class Ad(models.Model):
     title = models.CharField(max_length=200)
     content = RichTextField(blank=True, null=True)
+    # Производные от content, пересчитываются при сохранении
+    content_html = models.TextField(blank=True, default='', editable=False)
+    content_text = models.TextField(blank=True, default='', editable=False)
+    excerpt = models.CharField(max_length=300, blank=True, default='', editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ads')
+    # Ставится только пользователями с правом can_mark_urgent
+    is_urgent = models.BooleanField(default=False)
+    # Миниатюра первой картинки из content — для ленты
+    cover = models.CharField(max_length=200, blank=True, default='', editable=False)
+    # Просмотры пишутся пачками задачей flush_ad_views (callboard.counters), часть может теряться
+    views = models.PositiveIntegerField(default=0, editable=False)
+    weekly_views = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.title} ({self.author.username})'
 
+    @property
+    def cover_url(self):
+        return default_storage.url(self.cover) if self.cover else ''
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Категория на момент загрузки — чтобы при смене категории поправить счётчики
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    def render_content(self):
+        """
+        Очищает разметку CKEditor и обновляет content_html, content_text и excerpt.
+        Загруженные картинки, для которых уже готовы варианты, получают srcset.
+        """
+        images = AdImage.objects.referenced_in(self.content)
+        self.content_html, self.content_text = sanitize_html(
+            self.content, {sha256: image.responsive_attrs() for sha256, image in images.items()},
+        )
+        self.excerpt = make_excerpt(self.content_text)
+        self.cover = next((image.variants['thumb'][2] for image in images.values() if image.variants), '')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_html', 'content_text', 'excerpt', 'cover'}
+        # Счётчики категорий и поисковый индекс обновляются в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_category_id = self.category_id
+
     def clean(self):
         valid_categories = [choice[0] for choice in Category.CATEGORY_CHOICES]
         if self.category and self.category.name not in valid_categories:
@@ -49,22 +114,124 @@ class Ad(models.Model):
             raise ValidationError("Контент объявления не может быть пустым.")
 
     class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Стабильный порядок ленты и keyset-пагинация по (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='callboard_ad_created_id_idx'),
+            # Лента категории
+            models.Index(fields=['category', '-created_at', '-id'], name='callboard_ad_cat_created_idx'),
+            # Валидатор условных GET для ленты: max(updated_at)
+            models.Index(fields=['updated_at'], name='callboard_ad_updated_idx'),
+            # «Популярное за неделю»
+            models.Index(fields=['-weekly_views', '-id'], name='callboard_ad_popular_idx'),
+        ]
         permissions = [
             ('can_publish', 'Can publish ads'),  # Пользователь может публиковать объявления
             ('can_mark_urgent', 'Can mark ads as urgent'),  # Пользователь может отмечать объявления как срочные
         ]
 
 
+class AdViewDay(models.Model):
+    """Просмотры объявления за день — из них пересчитывается Ad.weekly_views"""
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='view_days')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ad', 'day'], name='callboard_ad_view_day_unique'),
+        ]
+        indexes = [
+            # Удаление дней, вышедших за окно популярности
+            models.Index(fields=['day'], name='callboard_ad_view_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.ad_id} {self.day}: {self.views}'
+
+
+# sha256 содержимого в имени файла — одинаковые загрузки хранятся один раз
+AD_IMAGE_DIR = 'ads/images'
+AD_IMAGE_NAME_RE = re.compile(rf'{AD_IMAGE_DIR}/[0-9a-f]{{2}}/([0-9a-f]{{64}})\.[a-z]+')
+
+
+class AdImageQuerySet(models.QuerySet):
+
+    def referenced_in(self, content):
+        """Загруженные картинки, на которые ссылается разметка, в порядке появления"""
+        hashes = list(dict.fromkeys(AD_IMAGE_NAME_RE.findall(content or '')))
+        if not hashes:
+            return {}
+        found = self.in_bulk(hashes, field_name='sha256')
+        return {sha256: found[sha256] for sha256 in hashes if sha256 in found}
+
+
+class AdImage(models.Model):
+    """
+    Картинка из объявления. Оригинал лежит по адресу, вычисленному из sha256
+    содержимого; уменьшенные копии (variants) готовит задача process_ad_image.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=200)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # {'640': [ширина, высота, имя файла], ..., 'thumb': [...]}; пусто, пока варианты не готовы
+    variants = models.JSONField(default=dict, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AdImageQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.file.name} ({self.width}×{self.height})'
+
+    def responsive_attrs(self):
+        """Атрибуты <img> для разметки объявления; None — вариантов ещё нет"""
+        widths = sorted(value for label, value in self.variants.items() if label != 'thumb')
+        if not widths:
+            return None
+        width, height, name = widths[-1]
+        return {
+            'src': default_storage.url(name),
+            'srcset': ', '.join(f'{default_storage.url(name)} {width}w' for width, _, name in widths),
+            'sizes': settings.AD_IMAGE_SIZES,
+            'width': str(width),
+            'height': str(height),
+        }
+
+
 class Response(models.Model):
     ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='responses')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='responses')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_accepted = models.BooleanField(default=False)
+    is_read = models.BooleanField(default=False)
 
     def __str__(self):
         return f'Отклик от {self.author} к "{self.ad.title}"'
 
+    def mark_read(self):
+        """Отмечает отклик прочитанным и уменьшает счётчик автора объявления"""
+        with transaction.atomic():
+            if Response.objects.filter(pk=self.pk, is_read=False).update(is_read=True):
+                User.objects.filter(pk=self.ad.author_id, unread_response_count__gt=0) \
+                    .update(unread_response_count=models.F('unread_response_count') - 1)
+        self.is_read = True
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Входящие отклики по объявлению
+            models.Index(fields=['ad', '-created_at'], name='callboard_resp_ad_created_idx'),
+            # Общий список откликов в админке
+            models.Index(fields=['-created_at', '-id'], name='callboard_resp_created_idx'),
+            models.Index(fields=['is_accepted'], name='callboard_resp_accepted_idx'),
+        ]
+
 
 class NewsletterSubscription(models.Model):
     """Модель для хранения подписок"""
@@ -73,4 +240,72 @@ class NewsletterSubscription(models.Model):
     date_subscribed = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user.username} - Subscribed: {self.subscribed}"
\ No newline at end of file
+        return f"{self.user.username} - Subscribed: {self.subscribed}"
+
+
+class OutboxEmail(models.Model):
+    """Письмо, записанное в той же транзакции, что и событие, и ожидающее отправки"""
+    dedup_key = models.CharField(max_length=100, unique=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Выборка очереди неотправленных писем
+            models.Index(fields=['sent_at', 'id'], name='callboard_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dedup_key} -> {self.recipient}"
+
+
+class DigestRun(models.Model):
+    """
+    Запуск еженедельного дайджеста. period_end последнего запуска — водяной знак:
+    следующий дайджест берёт объявления, созданные после него.
+    """
+    period_start = models.DateTimeField(null=True, blank=True)
+    period_end = models.DateTimeField(unique=True)
+    subject = models.CharField(max_length=255, blank=True)
+    # Письмо отрисовывается один раз на запуск и одинаково для всех подписчиков
+    html_content = models.TextField(blank=True)
+    text_content = models.TextField(blank=True)
+    ad_count = models.PositiveIntegerField(default=0)
+    recipient_count = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    metrics = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ['-period_end']
+
+    def __str__(self):
+        return f"Дайджест по {self.period_end:%d.%m.%Y}: {self.ad_count} объявлений"
+
+
+class DigestChunk(models.Model):
+    """Пачка подписчиков дайджеста — диапазон id подписок; отправленная пачка не повторяется"""
+    run = models.ForeignKey(DigestRun, on_delete=models.CASCADE, related_name='chunks')
+    number = models.PositiveIntegerField()
+    first_subscription_id = models.BigIntegerField()
+    last_subscription_id = models.BigIntegerField()
+    sent_count = models.PositiveIntegerField(default=0)
+    # Пачку отправляет тот воркер, который первым её занял (send_digest_chunk)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'number'], name='callboard_digest_chunk_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.run_id}/{self.number}"
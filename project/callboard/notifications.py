@@ -0,0 +1,99 @@
+from django.db import transaction
+
+from .events import publish_on_commit
+from .models import OutboxEmail
+
+
+def enqueue_email(dedup_key, recipient, subject, body):
+    """
+    Записывает письмо в outbox. Вызывается внутри транзакции, сохраняющей
+    событие: письмо появится в очереди только вместе с ним, а повторный вызов
+    с тем же ключом не создаст дубликата.
+    """
+    enqueue_emails([(dedup_key, recipient, subject, body)])
+
+
+def enqueue_emails(messages):
+    """Пачка писем (dedup_key, recipient, subject, body) — одной вставкой"""
+    emails = [
+        OutboxEmail(dedup_key=dedup_key, recipient=recipient, subject=subject, body=body)
+        for dedup_key, recipient, subject, body in messages
+        if recipient
+    ]
+    if not emails:
+        return
+    OutboxEmail.objects.bulk_create(emails, ignore_conflicts=True)
+    transaction.on_commit(_kick_delivery, robust=True)
+
+
+def _kick_delivery():
+    from .tasks import deliver_outbox
+    deliver_outbox.delay()
+
+
+def _created_email(response):
+    ad = response.ad
+    return (
+        f'response-created:{response.pk}',
+        ad.author.email,
+        'Новый отклик на ваше объявление',
+        f"Здравствуйте, {ad.author.username}!\n\n"
+        f"Пользователь {response.author.username} оставил отклик на ваше объявление \"{ad.title}\".\n\n"
+        f"Содержание отклика:\n{response.content}\n\n"
+        f"Посмотреть отклик можно в системе.",
+    )
+
+
+def notify_response_created(response):
+    enqueue_email(*_created_email(response))
+    _publish_created(response)
+
+
+def notify_responses_created(responses):
+    """Массовое создание (JSON API): письма всей пачки — одной вставкой в outbox"""
+    enqueue_emails([_created_email(response) for response in responses])
+    for response in responses:
+        _publish_created(response)
+
+
+def _publish_created(response):
+    ad = response.ad
+    publish_on_commit(ad.author_id, {
+        'type': 'response.created',
+        'response_id': response.pk,
+        'ad_id': ad.pk,
+        'ad_title': ad.title,
+    })
+
+
+def _accepted_email(response):
+    return (
+        f'response-accepted:{response.pk}',
+        response.author.email,
+        'Ваш отклик на объявление принят!',
+        f'Здравствуйте! Ваш отклик на объявление "{response.ad.title}" был принят.',
+    )
+
+
+def notify_response_accepted(response):
+    enqueue_email(*_accepted_email(response))
+    _publish_accepted(response)
+
+
+def notify_responses_accepted(responses):
+    """Массовое принятие (админка): письма всей пачки — одной вставкой в outbox"""
+    enqueue_emails([_accepted_email(response) for response in responses])
+    for response in responses:
+        _publish_accepted(response)
+
+
+def _publish_accepted(response):
+    event = {
+        'type': 'response.accepted',
+        'response_id': response.pk,
+        'ad_id': response.ad_id,
+        'ad_title': response.ad.title,
+    }
+    # Автору объявления — чтобы обновились его открытые вкладки, автору отклика — как уведомление
+    publish_on_commit(response.ad.author_id, event)
+    publish_on_commit(response.author_id, event)
@@ -0,0 +1,220 @@
+import base64
+import json
+from datetime import datetime
+from functools import partial
+
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(direction, created_at, pk):
+    """Непрозрачный токен курсора из пары (created_at, id)"""
+    payload = json.dumps([direction, created_at.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor('Некорректный курсор') from e
+
+
+class CursorPage:
+    """Страница курсорной пагинации: знает только соседей, но не общее число строк"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset-пагинация по убыванию (created_at, id).
+
+    Вместо OFFSET каждая страница начинается с условия по последней
+    показанной строке, поэтому глубокие страницы стоят столько же, сколько
+    первая, а COUNT(*) не выполняется вовсе.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    def page(self, cursor=None):
+        queryset, build = self._window(cursor)
+        return build(list(queryset))
+
+    async def apage(self, cursor=None):
+        """То же, что page(), но строки выбираются асинхронным ORM"""
+        queryset, build = self._window(cursor)
+        return build([obj async for obj in queryset])
+
+    def _window(self, cursor):
+        """Выборка per_page + 1 строк и функция, собирающая из них страницу"""
+        if not cursor:
+            return self._forward(self.queryset), partial(self._forward_page, first=True)
+        direction, created_at, pk = decode_cursor(cursor)
+        if direction == 'n':
+            queryset = self.queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+            return self._forward(queryset), partial(self._forward_page, first=False)
+        queryset = self.queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        )
+        return queryset.order_by('created_at', 'pk')[:self.per_page + 1], self._backward_page
+
+    def _forward(self, queryset):
+        return queryset.order_by('-created_at', '-pk')[:self.per_page + 1]
+
+    def _forward_page(self, rows, first):
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows and not first:
+            raise EmptyPage('Страница пуста')
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor('n', rows[-1]) if has_next else None,
+            previous_cursor=self._cursor('p', rows[0]) if rows and not first else None,
+        )
+
+    def _backward_page(self, rows):
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not rows:
+            raise EmptyPage('Страница пуста')
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor('n', rows[-1]),
+            previous_cursor=self._cursor('p', rows[0]) if has_previous else None,
+        )
+
+    @staticmethod
+    def _cursor(direction, obj):
+        # Строки бывают и словарями из values() — так их отдаёт JSON API
+        if isinstance(obj, dict):
+            return encode_cursor(direction, obj['created_at'], obj['id'])
+        return encode_cursor(direction, obj.created_at, obj.pk)
+
+
+class NoCountPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class NoCountPaginator(Paginator):
+    """
+    Постраничный пагинатор без COUNT(*).
+
+    Наличие следующей страницы определяется по одной лишней строке в выборке,
+    общее количество страниц неизвестно.
+    """
+
+    @cached_property
+    def count(self):
+        return None
+
+    @cached_property
+    def num_pages(self):
+        return None
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        return self._page(list(self._window(number)), number)
+
+    async def apage(self, number):
+        number = self.validate_number(number)
+        return self._page([obj async for obj in self._window(number)], number)
+
+    def _window(self, number):
+        bottom = (number - 1) * self.per_page
+        return self.object_list[bottom:bottom + self.per_page + 1]
+
+    def _page(self, rows, number):
+        if not rows and number > 1:
+            raise EmptyPage('Страница пуста')
+        return NoCountPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+def estimate_count(model, using):
+    """
+    Число строк таблицы по статистике планировщика — без обхода таблицы.
+    None, если статистики нет (SQLite до ANALYZE) или движок её не даёт.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]
+    elif connection.vendor == 'sqlite':
+        # Первое число stat — строки индекса (у частичных индексов меньше, чем в таблице);
+        # статистику пишут ANALYZE и PRAGMA optimize (команда optimize_database)
+        sql, params = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    estimate = max((int(str(stat).split()[0]) for stat, in rows), default=None)
+    # reltuples = -1 у ни разу не анализированной таблицы PostgreSQL
+    return estimate if estimate is not None and estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для админки: для всей большой таблицы без фильтров вместо COUNT(*)
+    берёт оценку из статистики. Отфильтрованные выборки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.CALLBOARD_ADMIN_ESTIMATED_COUNT_FROM:
+                return estimate
+        return super().count
@@ -0,0 +1,74 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_SESSION_KEY = '_db_primary_until'
+
+# Включается только на время представлений, помеченных replica_reads = True
+_use_replica = ContextVar('callboard_use_replica', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def enable_replica_reads():
+    """
+    Включает чтение из реплик до конца ближайшего replica_reads(). Нужна middleware:
+    process_view в асинхронном режиме выполняется в другом потоке, и токен
+    ContextVar оттуда нельзя сбросить в исходном контексте.
+    """
+    _use_replica.set(True)
+
+
+def pin_to_primary(request):
+    """После записи чтения пользователя идут в основную базу, пока реплика не догонит"""
+    if hasattr(request, 'session'):
+        request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+
+
+async def apin_to_primary(request):
+    if hasattr(request, 'session'):
+        await request.session.aset(PIN_SESSION_KEY, time.time() + settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись — всегда в default. Чтение — в случайную реплику из CALLBOARD_READ_REPLICAS,
+    но только внутри replica_reads(); всё остальное читает из default.
+    """
+    # Сессия нужна сразу после входа, отставание реплики здесь недопустимо
+    primary_only_apps = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.CALLBOARD_READ_REPLICAS
+        if replicas and _use_replica.get() and model._meta.app_label not in self.primary_only_apps:
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.CALLBOARD_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит из основной базы вместе с данными
+        return db not in settings.CALLBOARD_READ_REPLICAS
@@ -0,0 +1,147 @@
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+
+# Разметка, которую может выдать CKEditor и которую мы показываем как есть
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'div', 'em', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'span', 'strike', 'strong', 'sub',
+    'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+# Вырезаются вместе с содержимым
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+VOID_TAGS = {'br', 'hr', 'img'}
+BLOCK_TAGS = {
+    'blockquote', 'br', 'caption', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'p',
+    'pre', 'td', 'th', 'tr',
+}
+
+# Теги с необязательным закрывающим тегом: новый такой же тег закрывает предыдущий
+IMPLICIT_CLOSE = {'li': {'li'}, 'p': {'p'}, 'tr': {'tr'}, 'td': {'td', 'th'}, 'th': {'td', 'th'}}
+
+# sha256 в имени загруженной картинки (см. AD_IMAGE_NAME_RE)
+IMAGE_HASH_RE = re.compile(r'/([0-9a-f]{64})\.[a-z]+$')
+CONTROL_CHARS_RE = re.compile(r'[\x00-\x20\x7f]+')
+EXCERPT_WORDS = 30
+EXCERPT_MAX_LENGTH = 300
+
+
+def _is_safe_url(value):
+    return urlsplit(CONTROL_CHARS_RE.sub('', value)).scheme.lower() in ALLOWED_SCHEMES
+
+
+class _Sanitizer(HTMLParser):
+
+    def __init__(self, images=None):
+        super().__init__(convert_charrefs=True)
+        self.images = images or {}
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        if tag in DROP_CONTENT_TAGS:
+            if not self_closing:
+                self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in ALLOWED_TAGS:
+            return
+        if self.open_tags and self.open_tags[-1] in IMPLICIT_CLOSE.get(tag, ()):
+            self.html.append(f'</{self.open_tags.pop()}>')
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attrs = [
+            (name, value) for name, value in attrs
+            if name in allowed and value is not None
+            and (name not in URL_ATTRIBUTES or _is_safe_url(value))
+        ]
+        if tag == 'img' and self.images:
+            attrs = self.responsive_image(attrs)
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in attrs)
+        if tag == 'a':
+            rendered += ' rel="nofollow noopener"'
+        self.html.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS and not self_closing:
+            self.open_tags.append(tag)
+
+    def responsive_image(self, attrs):
+        """Загруженная картинка получает srcset из готовых вариантов и ленивую загрузку"""
+        src = dict(attrs).get('src', '')
+        match = IMAGE_HASH_RE.search(src)
+        responsive = match and self.images.get(match[1])
+        if not responsive:
+            return attrs
+        return [
+            *((name, value) for name, value in attrs if name not in responsive),
+            *responsive.items(),
+            ('loading', 'lazy'),
+            ('decoding', 'async'),
+        ]
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in self.open_tags:
+            return
+        # Закрываем и незакрытые вложенные теги, чтобы разметка оставалась сбалансированной
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.html.append(escape(data))
+            self.text.append(data)
+
+    def result(self):
+        self.close()
+        closing = ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+        lines = (' '.join(line.split()) for line in ''.join(self.text).splitlines())
+        return ''.join(self.html) + closing, '\n'.join(line for line in lines if line)
+
+
+def sanitize_html(value, images=None):
+    """
+    Возвращает (очищенный HTML, простой текст) для разметки из CKEditor.
+    images — {sha256: атрибуты <img>} для загруженных картинок с готовыми вариантами.
+    """
+    parser = _Sanitizer(images)
+    parser.feed(value or '')
+    return parser.result()
+
+
+def make_excerpt(text):
+    excerpt = Truncator(' '.join(text.split())).words(EXCERPT_WORDS, truncate='…')
+    return excerpt[:EXCERPT_MAX_LENGTH]
+
+
+def html_to_text(value):
+    """Текст без разметки — для разметки, не прошедшей через sanitize_html"""
+    return html.unescape(strip_tags(value or '')).strip()
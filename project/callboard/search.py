@@ -0,0 +1,171 @@
+import re
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .sanitize import html_to_text
+
+FTS_TABLE = 'callboard_ad_fts'
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Служебные символы вокруг совпадений в сниппете: заменяются на <mark> после экранирования
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+@dataclass
+class SearchHit:
+    ad_id: int
+    snippet: str
+    rank: float
+
+
+class SqliteSearchBackend:
+    """
+    Полнотекстовый индекс на SQLite FTS5, rowid таблицы индекса совпадает с Ad.id.
+    Сама таблица создаётся миграциями.
+    """
+
+    # create_index/drop_index вызывает миграция 0007
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def index(self, ads):
+        rows = [(ad.pk, ad.title, ad.content_text) for ad in ads]
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)", rows)
+
+    def remove(self, ad_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in ad_ids])
+
+    def remove_selected(self, ads):
+        """Убирает из индекса объявления выборки одним DELETE с подзапросом"""
+        sql, params = ads.order_by().values('pk').query.get_compiler(ads.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({sql})", params)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    @staticmethod
+    def build_match(query):
+        # Каждое слово — отдельный префиксный терм, операторы FTS5 из ввода пользователя не проходят
+        return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+    def search(self, query, category_id=None, limit=10, offset=0):
+        match = self.build_match(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT f.rowid, snippet({FTS_TABLE}, 1, %s, %s, '…', 16), bm25({FTS_TABLE}, 10.0, 1.0) AS rank "
+            f"FROM {FTS_TABLE} AS f "
+        )
+        params = [MARK_START, MARK_END]
+        if category_id is not None:
+            sql += "JOIN callboard_ad AS a ON a.id = f.rowid "
+        sql += f"WHERE {FTS_TABLE} MATCH %s "
+        params.append(match)
+        if category_id is not None:
+            sql += "AND a.category_id = %s "
+            params.append(category_id)
+        sql += "ORDER BY rank LIMIT %s OFFSET %s"
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [SearchHit(pk, snippet, rank) for pk, snippet, rank in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """
+    Поиск на PostgreSQL: tsvector по заголовку (вес A) и тексту (вес B).
+    GIN-индекс по тому же выражению создаётся миграциями (0017); _vector() должен
+    совпадать с ним, иначе поиск пойдёт полным просмотром таблицы.
+    """
+    config = 'russian'
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('title', weight='A', config=self.config) + \
+            SearchVector('content_text', weight='B', config=self.config)
+
+    # Исходный индекс миграции 0007 (по content); 0010 и 0017 перестраивают его
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS callboard_ad_search_idx ON callboard_ad USING GIN ("
+            f"setweight(to_tsvector('{self.config}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(content, '')), 'B'))"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute("DROP INDEX IF EXISTS callboard_ad_search_idx")
+
+    # Индекс по выражению PostgreSQL обновляет сам
+    def index(self, ads):
+        pass
+
+    def remove(self, ad_ids):
+        pass
+
+    def remove_selected(self, ads):
+        pass
+
+    def clear(self):
+        pass
+
+    def optimize(self):
+        pass
+
+    def search(self, query, category_id=None, limit=10, offset=0):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        from .models import Ad
+
+        search_query = SearchQuery(query, config=self.config, search_type='websearch')
+        # vector @@ query по тому же выражению, что и callboard_ad_search_idx, — условие
+        # идёт через GIN-индекс; ранг и сниппет считаются только для совпавших строк
+        queryset = Ad.objects.annotate(vector=self._vector()).filter(vector=search_query)
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        queryset = queryset.annotate(
+            rank=SearchRank(F('vector'), search_query),
+            snippet=SearchHeadline(
+                'content_text', search_query, config=self.config,
+                start_sel=MARK_START, stop_sel=MARK_END, max_words=16,
+            ),
+        ).order_by('-rank', '-pk')
+        rows = queryset.values_list('pk', 'snippet', 'rank')[offset:offset + limit]
+        return [SearchHit(pk, html_to_text(snippet), rank) for pk, snippet, rank in rows]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    path = getattr(settings, 'CALLBOARD_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend else None
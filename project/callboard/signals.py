@@ -0,0 +1,91 @@
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import forget_all_roles, forget_group_ids, forget_roles
+from .models import Ad, Category, Response, User
+from .search import get_search_backend
+
+
+# Поисковый индекс обновляется в той же транзакции, что и объявление
+@receiver(post_save, sender=Ad)
+def index_ad(sender, instance, raw=False, **kwargs):
+    backend = get_search_backend()
+    if backend and not raw:
+        backend.index([instance])
+
+
+@receiver(post_delete, sender=Ad)
+def unindex_ad(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend:
+        backend.remove([instance.pk])
+
+
+def _shift_ad_count(category_id, delta):
+    if category_id is not None:
+        Category.objects.filter(pk=category_id).update(ad_count=F('ad_count') + delta)
+
+
+@receiver(post_save, sender=Ad)
+def count_saved_ad(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _shift_ad_count(instance.category_id, 1)
+        return
+    old_category_id = getattr(instance, '_loaded_category_id', instance.category_id)
+    if old_category_id != instance.category_id:
+        _shift_ad_count(old_category_id, -1)
+        _shift_ad_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Ad)
+def count_deleted_ad(sender, instance, **kwargs):
+    _shift_ad_count(getattr(instance, '_loaded_category_id', instance.category_id), -1)
+
+
+@receiver(post_save, sender=Response)
+def count_new_response(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_read:
+        User.objects.filter(ads__id=instance.ad_id).update(unread_response_count=F('unread_response_count') + 1)
+
+
+@receiver(post_delete, sender=Response)
+def count_deleted_response(sender, instance, **kwargs):
+    if not instance.is_read:
+        User.objects.filter(ads__id=instance.ad_id, unread_response_count__gt=0) \
+            .update(unread_response_count=F('unread_response_count') - 1)
+
+
+# Кэш ролей: membership и собственные права пользователя
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        forget_roles([instance.pk])
+    elif pk_set:
+        forget_roles(pk_set)
+    elif action == 'post_clear':
+        forget_all_roles()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_roles(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        forget_all_roles()
+
+
+@receiver(post_delete, sender=Group)
+def forget_deleted_group(sender, instance, **kwargs):
+    forget_all_roles()
+    forget_group_ids()
+
+
+@receiver(post_save, sender=Group)
+def forget_renamed_group(sender, instance, created, **kwargs):
+    if not created:
+        forget_group_ids()
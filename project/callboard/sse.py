@@ -0,0 +1,107 @@
+import asyncio
+import json
+from functools import cached_property
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import reverse
+
+from .events import get_hub
+
+
+def session_user_id(session_key):
+    """
+    id пользователя сессии или None. Проверка та же, что у AuthenticationMiddleware
+    (бэкенд, хэш пароля в сессии); соединения потока закрываются сразу после неё.
+    """
+    try:
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(request)
+        return user.pk if user.is_authenticated and user.is_active else None
+    finally:
+        connections.close_all()
+
+
+class EventStreamApp:
+    """
+    ASGI-приложение перед Django, которое отдаёт поток Server-Sent Events об откликах
+    (путь response_events). Сессия проверяется один раз в потоке из пула, после этого
+    соединение — только подписка на хаб в цикле событий: ни ThreadSensitiveContext
+    запроса Django, ни соединения с базой оно не держит. Остальные запросы уходят в Django.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    @cached_property
+    def path(self):
+        return reverse('response_events')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].removeprefix(scope.get('root_path', '')) != self.path:
+            return await self.application(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, [(b'allow', b'GET')])
+        session_key = self.cookies(scope).get(settings.SESSION_COOKIE_NAME)
+        user_id = await sync_to_async(session_user_id, thread_sensitive=False)(session_key) if session_key else None
+        if user_id is None:
+            # Любой ответ, кроме 200, EventSource не переподключает
+            return await self.respond(send, 401)
+        await self.stream(user_id, receive, send)
+
+    @staticmethod
+    def cookies(scope):
+        cookie = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookie.load(value.decode('latin-1'))
+        return {name: morsel.value for name, morsel in cookie.items()}
+
+    @staticmethod
+    async def respond(send, status, headers=()):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-length', b'0'), *headers]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def stream(self, user_id, receive, send):
+        subscription = get_hub().subscribe(user_id)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await self.send_chunk(send, 'retry: 5000\n\n')
+            while True:
+                next_event = asyncio.ensure_future(subscription.get(timeout=settings.CALLBOARD_EVENT_HEARTBEAT))
+                await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    next_event.cancel()
+                    break
+                event = next_event.result()
+                if event is None:
+                    await self.send_chunk(send, ': ping\n\n')
+                else:
+                    await self.send_chunk(send, f'event: {event["type"]}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n')
+        except OSError:
+            # Клиент ушёл, а сервер сообщил об этом ошибкой записи, а не http.disconnect
+            pass
+        finally:
+            disconnected.cancel()
+            subscription.close()
+
+    @staticmethod
+    async def send_chunk(send, text):
+        await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
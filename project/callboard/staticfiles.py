@@ -0,0 +1,172 @@
+import gzip
+import json
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger('callboard.staticfiles')
+
+# Сжатые копии лежат рядом с файлом: name.br, name.gz (в порядке предпочтения)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Отчёт о сжатии в STATIC_ROOT, его читает команда static_report
+COMPRESSION_REPORT = 'staticfiles.compression.json'
+
+
+def brotli_compress(data):
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def gzip_compress(data):
+    # mtime=0: одинаковое содержимое даёт одинаковые байты при каждой сборке
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+COMPRESSORS = {'br': brotli_compress, 'gzip': gzip_compress}
+
+
+def is_compressible(name):
+    return os.path.splitext(name)[1].lstrip('.').lower() in settings.STATIC_COMPRESS_EXTENSIONS
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который после хэширования кладёт рядом с текстовыми
+    файлами сжатые копии .br и .gz. Сжимаются и хэшированные имена, и исходные:
+    CKEditor подгружает свои плагины по нехэшированным путям.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        report = {}
+        for name in paths:
+            if not is_compressible(name):
+                continue
+            hashed_name = self.hashed_files.get(self.hash_key(self.clean_name(name)), name)
+            self.compress(name)
+            # Клиентам с долгим кэшем уходит хэшированная копия — её размеры и в отчёт
+            report[name] = {'hashed': hashed_name, **self.compress(hashed_name)}
+        self._save_file(COMPRESSION_REPORT, json.dumps(report, indent=1, sort_keys=True).encode())
+
+    # Файла нет в манифесте — хэш считается по файлу в STATIC_ROOT
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет и на диске: ссылка без хэша лучше, чем 500 на каждой странице
+            logger.warning('Статический файл %s не найден, ссылка без хэша', name)
+            return name
+
+    def compress(self, name):
+        """Пишет сжатые копии name; возвращает размеры {'size': …, 'br': …, 'gzip': …}"""
+        size = self.size(name)
+        sizes = {'size': size}
+        data = None
+        for encoding, suffix in ENCODINGS:
+            target = name + suffix
+            if self.exists(target) and self.get_modified_time(target) >= self.get_modified_time(name):
+                sizes[encoding] = self.size(target)
+                continue
+            if data is None:
+                with self.open(name) as file:
+                    data = file.read()
+            compressed = COMPRESSORS[encoding](data)
+            # Выигрыш меньше 5% не окупает распаковку на клиенте
+            if compressed is None or len(compressed) >= size * 0.95:
+                sizes[encoding] = None
+                if self.exists(target):
+                    self.delete(target)
+                continue
+            self._save_file(target, compressed)
+            sizes[encoding] = len(compressed)
+        return sizes
+
+    def _save_file(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+
+
+@dataclass
+class StaticFile:
+    path: str
+    size: int
+    content_type: str
+    etag: str
+    immutable: bool
+    # {кодировка: (путь, размер)}
+    encoded: dict = field(default_factory=dict)
+
+    def negotiate(self, accept_encoding):
+        """Путь, размер и Content-Encoding лучшей копии, которую примет клиент"""
+        accepted, refused = accepted_encodings(accept_encoding)
+        for encoding, _suffix in ENCODINGS:
+            # «*» не разрешает кодировку, от которой клиент отказался явно (q=0)
+            if encoding in self.encoded and (encoding in accepted or ('*' in accepted and encoding not in refused)):
+                return (*self.encoded[encoding], encoding)
+        return self.path, self.size, None
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding: (принимаемые, отвергнутые с q=0)"""
+    accepted, refused = set(), set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            (accepted if quality > 0 else refused).add(coding.strip().lower())
+    return accepted, refused
+
+
+def build_index(root, manifest_name=ManifestStaticFilesStorage.manifest_name):
+    """
+    {URL-путь относительно STATIC_URL: StaticFile} по содержимому STATIC_ROOT.
+    Строится один раз при старте процесса: запрос не трогает файловую систему,
+    кроме открытия самого файла, и не может выйти за пределы каталога.
+    """
+    try:
+        with open(os.path.join(root, manifest_name), encoding='utf-8') as file:
+            hashed = set(json.load(file).get('paths', {}).values())
+    except (OSError, ValueError):
+        hashed = set()
+    suffixes = tuple(suffix for _encoding, suffix in ENCODINGS)
+    index = {}
+    for directory, _dirs, files in os.walk(root):
+        names = set(files)
+        for filename in files:
+            if filename.endswith(suffixes):
+                continue
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            url = os.path.relpath(path, root).replace(os.sep, '/')
+            static_file = StaticFile(
+                path=path,
+                size=stat.st_size,
+                content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                immutable=url in hashed,
+            )
+            for encoding, suffix in ENCODINGS:
+                if filename + suffix in names:
+                    static_file.encoded[encoding] = (path + suffix, os.path.getsize(path + suffix))
+            index[url] = static_file
+    return index
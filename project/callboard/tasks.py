@@ -1,21 +1,321 @@
+import logging
 import os
-from django.core.mail import EmailMultiAlternatives
+import smtplib
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Max, Q, Sum
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import strip_tags
-from celery import shared_task
+from celery import group, shared_task
+
+from callboard.counters import collect_views, popular_since, refresh_weekly_views, save_views
+from callboard.images import make_variants
+from callboard.models import Ad, AdImage, AdViewDay, DigestChunk, DigestRun, NewsletterSubscription, OutboxEmail
+from callboard.sanitize import html_to_text
+
+logger = logging.getLogger(__name__)
 
-from callboard.models import NewsletterSubscription
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 @shared_task
 def send_newsletter(newsletter_subject, newsletter_content_html):
-    subscribers = NewsletterSubscription.objects.filter(subscribed=True)
-    for subscriber in subscribers:
-        subject = newsletter_subject
-        text_content = strip_tags(newsletter_content_html)
-        html_content = newsletter_content_html
-        from_email = os.getenv('EMAIL_HOST_USER')
-        to = subscriber.user.email
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
\ No newline at end of file
+    """
+    Разбивает подписчиков на пачки и отправляет каждую пачку отдельной
+    подзадачей, чтобы рассылку могли параллельно обрабатывать несколько воркеров.
+    """
+    text_content = strip_tags(newsletter_content_html)
+    emails = (
+        NewsletterSubscription.objects
+        .filter(subscribed=True)
+        .order_by('pk')
+        .values_list('user__email', flat=True)
+        .iterator(chunk_size=settings.NEWSLETTER_CHUNK_SIZE)
+    )
+    chunks = [
+        send_newsletter_chunk.s(newsletter_subject, text_content, newsletter_content_html, recipients)
+        for recipients in chunked(emails, settings.NEWSLETTER_CHUNK_SIZE)
+    ]
+    if not chunks:
+        return {'group_id': None, 'chunks': 0}
+    result = group(chunks).apply_async()
+    logger.info('Рассылка "%s": поставлено %d пачек', newsletter_subject, len(chunks))
+    return {'group_id': result.id, 'chunks': len(chunks)}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_newsletter_chunk(self, subject, text_content, html_content, recipients):
+    """
+    Отправляет пачку писем через одно SMTP-соединение. При сбое повторяется
+    только для тех адресов, до которых письмо ещё не дошло.
+    """
+    from_email = os.getenv('EMAIL_HOST_USER')
+    sent = 0
+    try:
+        with get_connection() as connection:
+            for to in recipients:
+                msg = EmailMultiAlternatives(subject, text_content, from_email, [to], connection=connection)
+                msg.attach_alternative(html_content, "text/html")
+                connection.send_messages([msg])
+                sent += 1
+    except (smtplib.SMTPException, OSError) as exc:
+        logger.warning('Пачка рассылки: отправлено %d из %d, повтор', sent, len(recipients))
+        raise self.retry(exc=exc, args=(subject, text_content, html_content, recipients[sent:]))
+    logger.info('Пачка рассылки: отправлено %d писем', sent)
+    return sent
+
+
+@shared_task
+def deliver_outbox(batch_size=None):
+    """
+    Отправляет пачку писем из outbox через одно соединение. Неудачные письма
+    остаются в очереди и повторяются при следующих запусках, пока не
+    исчерпают OUTBOX_MAX_ATTEMPTS.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by('sent_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+        sent = []
+        with get_connection() as connection:
+            for email in batch:
+                email.attempts += 1
+                try:
+                    EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL,
+                                 [email.recipient], connection=connection).send()
+                except (smtplib.SMTPException, OSError) as exc:
+                    email.last_error = str(exc)
+                    logger.warning('Письмо %s не отправлено: %s', email.dedup_key, exc)
+                else:
+                    email.sent_at = timezone.now()
+                    sent.append(email)
+        OutboxEmail.objects.bulk_update(batch, ['attempts', 'last_error', 'sent_at'])
+
+    if len(batch) == batch_size:
+        deliver_outbox.delay(batch_size)
+    return len(sent)
+
+
+def _ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def collect_digest_ads(period_start, period_end):
+    """
+    Объявления за период одним запросом по диапазону created_at (индекс
+    callboard_ad_created_id_idx), сгруппированные по категориям в памяти.
+    """
+    ads = Ad.objects.filter(created_at__lte=period_end).select_related('category') \
+        .only('pk', 'title', 'excerpt', 'created_at', 'category__name').order_by('-created_at', '-id')
+    if period_start is not None:
+        ads = ads.filter(created_at__gt=period_start)
+    sections = {}
+    total = 0
+    for ad in ads.iterator(chunk_size=1000):
+        total += 1
+        name = ad.category.get_name_display() if ad.category else 'Без категории'
+        section = sections.setdefault(name, {'name': name, 'ads': [], 'count': 0})
+        section['count'] += 1
+        if len(section['ads']) < settings.DIGEST_ADS_PER_CATEGORY:
+            section['ads'].append(ad)
+    for section in sections.values():
+        section['more'] = section['count'] - len(section['ads'])
+    return sorted(sections.values(), key=lambda section: section['name']), total
+
+
+def _start_digest_run():
+    """Незавершённый запуск продолжается, иначе создаётся новый от водяного знака"""
+    with transaction.atomic():
+        pending = DigestRun.objects.select_for_update().filter(dispatched_at__isnull=True).first()
+        if pending is not None:
+            return pending
+        last_end = DigestRun.objects.aggregate(last=Max('period_end'))['last']
+        if last_end is None:
+            last_end = timezone.now() - timedelta(days=settings.DIGEST_DEFAULT_PERIOD_DAYS)
+        return DigestRun.objects.create(period_start=last_end, period_end=timezone.now())
+
+
+@shared_task
+def send_weekly_digest():
+    """
+    Собирает объявления с прошлого запуска, отрисовывает письмо один раз и
+    раздаёт подписчиков пачками параллельным подзадачам. Повторный запуск
+    после сбоя продолжает тот же DigestRun: уже отправленные пачки пропускаются.
+    """
+    run = _start_digest_run()
+    metrics = dict(run.metrics)
+
+    started = time.perf_counter()
+    sections, total = collect_digest_ads(run.period_start, run.period_end)
+    metrics['collect_ms'] = _ms(started)
+
+    if total:
+        started = time.perf_counter()
+        domain = Site.objects.get_current().domain
+        run.subject = f'Новые объявления за неделю: {total}'
+        run.html_content = render_to_string('callboard/weekly_digest_email.html', {
+            'sections': sections, 'total': total, 'run': run, 'domain': domain,
+        })
+        run.text_content = html_to_text(run.html_content)
+        metrics['render_ms'] = _ms(started)
+
+    started = time.perf_counter()
+    chunks = _plan_digest_chunks(run) if total else []
+    metrics['plan_ms'] = _ms(started)
+
+    run.ad_count = total
+    run.chunk_count = len(chunks)
+    run.recipient_count = sum(size for _, size in chunks)
+    run.metrics = metrics
+    run.dispatched_at = timezone.now()
+    if not chunks:
+        run.finished_at = run.dispatched_at
+    run.save()
+
+    pending = [chunk.pk for chunk, _ in chunks if chunk.sent_at is None]
+    if pending:
+        group(send_digest_chunk.s(pk) for pk in pending).apply_async()
+    logger.info('Дайджест %s: %d объявлений, %d пачек, метрики %s', run.pk, total, len(pending), metrics)
+    return {'run': run.pk, 'ads': total, 'chunks': len(pending)}
+
+
+def _plan_digest_chunks(run):
+    """Делит подписчиков на диапазоны id; при повторе существующие пачки сохраняются"""
+    ids = (
+        NewsletterSubscription.objects.filter(subscribed=True).order_by('pk')
+        .values_list('pk', flat=True).iterator(chunk_size=settings.NEWSLETTER_CHUNK_SIZE)
+    )
+    planned = [
+        (DigestChunk(run=run, number=number, first_subscription_id=batch[0], last_subscription_id=batch[-1]),
+         len(batch))
+        for number, batch in enumerate(chunked(ids, settings.NEWSLETTER_CHUNK_SIZE))
+    ]
+    DigestChunk.objects.bulk_create([chunk for chunk, _ in planned], ignore_conflicts=True)
+    existing = {chunk.number: chunk for chunk in run.chunks.all()}
+    return [(existing[chunk.number], size) for chunk, size in planned if chunk.number in existing]
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_digest_chunk(self, chunk_id, after_id=None, sent_before=0):
+    """
+    Отправляет дайджест одной пачке через одно SMTP-соединение. Повтор после сбоя
+    продолжает с подписки, следующей за after_id. Пачку сначала занимает один
+    UPDATE: если задачу доставили дважды, отправит только тот воркер, чей UPDATE
+    изменил строку.
+    """
+    now = timezone.now()
+    unsent = DigestChunk.objects.filter(pk=chunk_id, sent_at__isnull=True)
+    if self.request.retries:
+        # Повтор этой же задачи: пачка уже занята ею, продлеваем срок
+        claimed = unsent.update(claimed_at=now)
+    else:
+        expired = now - timedelta(seconds=settings.DIGEST_CHUNK_CLAIM_TIMEOUT)
+        claimed = unsent.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired)).update(claimed_at=now)
+    if not claimed:
+        return 0
+    chunk = DigestChunk.objects.select_related('run').get(pk=chunk_id)
+    run = chunk.run
+    recipients = (
+        NewsletterSubscription.objects
+        .filter(subscribed=True, pk__range=(chunk.first_subscription_id, chunk.last_subscription_id))
+        .order_by('pk').values_list('pk', 'user__email')
+    )
+    if after_id is not None:
+        recipients = recipients.filter(pk__gt=after_id)
+
+    started = time.perf_counter()
+    sent = 0
+    try:
+        with get_connection() as connection:
+            for subscription_id, to in recipients:
+                msg = EmailMultiAlternatives(run.subject, run.text_content, settings.DEFAULT_FROM_EMAIL, [to],
+                                             connection=connection)
+                msg.attach_alternative(run.html_content, 'text/html')
+                connection.send_messages([msg])
+                after_id = subscription_id
+                sent += 1
+    except (smtplib.SMTPException, OSError) as exc:
+        logger.warning('Дайджест %s, пачка %d: отправлено %d, повтор', run.pk, chunk.number, sent)
+        raise self.retry(exc=exc, args=(chunk_id, after_id, sent_before + sent))
+
+    DigestChunk.objects.filter(pk=chunk.pk).update(
+        sent_at=timezone.now(), sent_count=sent_before + sent,
+        duration_ms=round((time.perf_counter() - started) * 1000),
+    )
+    _finish_digest_run(run)
+    return sent
+
+
+def _finish_digest_run(run):
+    if run.chunks.filter(sent_at__isnull=True).exists():
+        return
+    totals = run.chunks.aggregate(sent=Sum('sent_count'), send_ms=Sum('duration_ms'), slowest_ms=Max('duration_ms'))
+    finished_at = timezone.now()
+    metrics = {**run.metrics, **totals, 'total_ms': round((finished_at - run.started_at).total_seconds() * 1000)}
+    # Последняя пачка может завершиться в нескольких воркерах одновременно — фиксирует итог только один
+    if DigestRun.objects.filter(pk=run.pk, finished_at__isnull=True).update(finished_at=finished_at, metrics=metrics):
+        logger.info('Дайджест %s отправлен: %s', run.pk, metrics)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def process_ad_image(self, image_id):
+    """
+    Готовит уменьшенные копии загруженной картинки и перерисовывает объявления,
+    которые сослались на неё раньше, чем варианты были готовы.
+    """
+    image = AdImage.objects.filter(pk=image_id, processed_at__isnull=True).first()
+    if image is None:
+        return 0
+    started = time.perf_counter()
+    try:
+        variants = make_variants(image)
+    except OSError as exc:
+        raise self.retry(exc=exc)
+    AdImage.objects.filter(pk=image.pk).update(variants=variants, processed_at=timezone.now())
+
+    # Новая картинка встречается в считаных объявлениях; updated_at сбрасывает кэш их фрагментов
+    for ad in Ad.objects.filter(content__contains=image.sha256):
+        ad.save(update_fields=['content', 'updated_at'])
+    logger.info('Картинка %s: %d вариантов за %d мс', image.sha256, len(variants), _ms(started))
+    return len(variants)
+
+
+@shared_task
+def flush_ad_views():
+    """Переносит накопленные в кэше просмотры в базу одной транзакцией (запускается beat)"""
+    by_day = collect_views()
+    if not by_day:
+        return 0
+    started = time.perf_counter()
+    saved = save_views(by_day)
+    logger.info('Просмотры: записано %d за %d мс', saved, _ms(started))
+    return saved
+
+
+@shared_task
+def refresh_popular_ads():
+    """
+    Раз в сутки сдвигает окно «популярного за неделю»: пересчитывает weekly_views
+    у объявлений, которые в нём были, и удаляет вышедшие из окна дни.
+    """
+    with transaction.atomic():
+        refreshed = refresh_weekly_views(Ad.objects.filter(weekly_views__gt=0))
+        expired, _ = AdViewDay.objects.filter(day__lt=popular_since()).delete()
+    return {'refreshed': refreshed, 'expired_days': expired}
@@ -0,0 +1,33 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from callboard.cache import get_or_render
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+
+    def __init__(self, nodelist, name, obj):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        return mark_safe(get_or_render(self.name.resolve(context), obj, lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    {% cachedfragment "card" ad %}...{% endcachedfragment %}
+
+    Кэширует отрисованный блок по ключу из имени, pk и updated_at объекта.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' принимает имя фрагмента и объект")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,3 +1,1920 @@
-from django.test import TestCase
+import asyncio
+from contextlib import contextmanager
+from datetime import timedelta
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.backends.signals import connection_created
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import User, Category, Ad, AdImage, AdViewDay, Response, NewsletterSubscription, OutboxEmail, DigestChunk, DigestRun
+from .backends import CachedModelBackend, group_id, role_cache
+from .events import LocalEventBackend, RedisEventBackend, get_hub
+from .sse import EventStreamApp
+from .benchmark import SCENARIOS, run_load_test, run_startup_benchmark
+from .bulk import accept_responses, delete_ads, delete_cascade, delete_responses, recategorize_ads
+from .cache import fragment_cache, fragment_stats
+from .checks import check_views_cache
+from .middleware import StaticFilesMiddleware
+from .counters import FLUSHED_KEY, LOCK_KEY, collect_views, push_views, save_views, view_counter, views_cache, ViewCounter
+from .sanitize import sanitize_html
+from .staticfiles import COMPRESSION_REPORT, accepted_encodings, brotli_compress
+from .search import get_search_backend
+from .pagination import CursorPaginator, EstimatedCountPaginator, decode_cursor, estimate_count, InvalidCursor
+from .routers import PrimaryReplicaRouter, replica_reads
+from . import routers
+from .tasks import collect_digest_ads, deliver_outbox, send_digest_chunk, send_newsletter, send_weekly_digest
+from . import tasks
+from .notifications import notify_response_accepted, notify_response_created
+from .views import AdList
+from project.celery import app as celery_app
+
+
+class BoardTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.category = Category.objects.create(name='tank')
+
+    def setUp(self):
+        fragment_cache().clear()
+        role_cache().clear()
+
+    @classmethod
+    def create_ads(cls, count, author=None, category=None):
+        return [
+            Ad.objects.create(
+                title=f'Объявление {i}',
+                content=f'<p>Текст объявления {i}</p>',
+                author=author or cls.author,
+                category=category or cls.category,
+            )
+            for i in range(count)
+        ]
+
+
+class QueryBudgetMixin:
+    """Проверки, что страница укладывается в фиксированное число SQL-запросов"""
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{executed} SQL-запросов при бюджете {budget}:\n{queries}')
+
+    def assertPageWithinBudget(self, url, budget, grow):
+        """
+        Запрашивает страницу, затем вызывает grow() для наполнения данными и
+        запрашивает её снова: число запросов не должно выйти за бюджет и не
+        должно зависеть от количества строк на странице. Первый запрос прогревает
+        кэш ролей, как это происходит на реальном сайте.
+        """
+        self.client.get(url)
+        with self.assertQueryBudget(budget) as before:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        grow()
+        with self.assertQueryBudget(budget) as after:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(
+            len(before.captured_queries), len(after.captured_queries),
+            f'Число запросов к {url} растёт вместе с данными',
+        )
+
+
+class QueryBudgetTest(QueryBudgetMixin, BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author.user_permissions.add(Permission.objects.get(codename='view_response'))
+        cls.ad = cls.create_ads(1)[0]
+
+    def create_responses(self, count, start=0, **kwargs):
+        for i in range(start, start + count):
+            user = User.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            Response.objects.create(ad=self.ad, author=user, content=f'Отклик {i}', **kwargs)
+
+    def create_other_ads(self):
+        for i in range(5):
+            user = User.objects.create_user(f'writer{i}', f'writer{i}@example.com', 'password')
+            self.create_ads(2, author=user)
+
+    def test_ad_list(self):
+        self.assertPageWithinBudget(reverse('ads'), 5, self.create_other_ads)
+
+    def test_ad_detail(self):
+        self.assertPageWithinBudget(reverse('ad_detail', args=[self.ad.pk]), 2, lambda: None)
+
+    def test_response_list(self):
+        self.create_responses(1)
+        self.client.force_login(self.author)
+        self.assertPageWithinBudget(reverse('response_list'), 4, lambda: self.create_responses(5, start=1))
+
+    def test_response_detail(self):
+        self.create_responses(1, is_read=True)
+        self.client.force_login(self.author)
+        url = reverse('response_detail', args=[Response.objects.get().pk])
+        self.assertPageWithinBudget(url, 3, lambda: None)
+
+    def test_user_profile(self):
+        self.client.force_login(self.author)
+
+        def grow():
+            self.create_ads(5)
+            for ad in self.create_ads(5, author=User.objects.create_user('other', 'other@example.com', 'password')):
+                Response.objects.create(ad=ad, author=self.author, content='Отклик')
+
+        self.assertPageWithinBudget(reverse('user_profile'), 4, grow)
+
+
+class CursorPaginationTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ads = cls.create_ads(25)
+
+    def test_pages_walk_forward_and_back(self):
+        paginator = CursorPaginator(Ad.objects.all(), 10)
+        expected = list(Ad.objects.order_by('-created_at', '-id'))
+
+        first = paginator.page()
+        self.assertEqual(first.object_list, expected[:10])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(second.object_list, expected[10:20])
+
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(third.object_list, expected[20:])
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(back.object_list, expected[10:20])
+        self.assertTrue(back.has_previous())
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    @override_settings(CALLBOARD_AD_PAGINATION='cursor')
+    def test_ad_list_cursor_mode(self):
+        response = self.client.get(reverse('ads'))
+        self.assertEqual(response.status_code, 200)
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        self.assertEqual(self.client.get(reverse('ads'), {'cursor': 'broken'}).status_code, 404)
+
+    @override_settings(CALLBOARD_AD_EXACT_COUNT=False)
+    def test_ad_list_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ads'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertEqual(self.client.get(reverse('ads'), {'page': 4}).status_code, 404)
+
+    def test_page_links_are_elided(self):
+        with mock.patch.object(AdList, 'paginate_by', 1):
+            response = self.client.get(reverse('ads'), {'page': 12})
+        links = response.context['page_range']
+        self.assertEqual(list(links), [1, '…', 10, 11, 12, 13, 14, '…', 25])
+        self.assertContains(response, 'class="page-link"', count=len(links) + 2)
+
+
+@override_settings(NEWSLETTER_CHUNK_SIZE=3)
+class NewsletterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            user = User.objects.create_user(f'reader{i}', f'reader{i}@example.com', 'password')
+            NewsletterSubscription.objects.create(user=user, subscribed=i != 0)
+
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+    def test_sends_in_chunks_without_per_subscriber_queries(self):
+        with self.assertNumQueries(1):
+            result = send_newsletter('Новости', '<p>Привет, <b>игроки</b></p>')
+        self.assertEqual(result['chunks'], 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'reader{i}@example.com' for i in range(1, 7)])
+        self.assertEqual(mail.outbox[0].body, 'Привет, игроки')
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+
+class OutboxTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ad = cls.create_ads(1)[0]
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+
+    def test_response_create_and_accept_enqueue_without_sending(self):
+        self.client.force_login(self.responder)
+        self.client.post(reverse('response_create', args=[self.ad.pk]), {'content': 'Возьмите меня'})
+        response = Response.objects.get()
+        self.client.force_login(self.author)
+        self.client.post(reverse('response_accept', args=[response.pk]))
+        self.client.post(reverse('response_accept', args=[response.pk]))
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(OutboxEmail.objects.values_list('recipient', flat=True)),
+            ['author@example.com', 'responder@example.com'],
+        )
+        self.assertEqual(deliver_outbox(), 2)
+        self.assertEqual(deliver_outbox(), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+
+
+class SearchTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.healer = Category.objects.create(name='healer')
+        cls.tank_ad = Ad.objects.create(title='Ищу танка', content='<p>Нужен <b>танк</b> в рейд</p>',
+                                        author=cls.author, category=cls.category)
+        cls.healer_ad = Ad.objects.create(title='Ищу хила', content='<p>Рейду нужен лекарь &amp; танк</p>',
+                                          author=cls.author, category=cls.healer)
+
+    def search(self, query, **kwargs):
+        return [hit.ad_id for hit in get_search_backend().search(query, **kwargs)]
+
+    def test_index_follows_save_and_delete(self):
+        self.assertEqual(set(self.search('танк')), {self.tank_ad.pk, self.healer_ad.pk})
+        self.assertEqual(self.search('танк', category_id=self.healer.pk), [self.healer_ad.pk])
+
+        self.healer_ad.content = '<p>Нужен лекарь</p>'
+        self.healer_ad.save()
+        self.assertEqual(self.search('танк'), [self.tank_ad.pk])
+
+        self.tank_ad.delete()
+        self.assertEqual(self.search('танк'), [])
+
+    def test_title_ranks_first_and_operators_are_ignored(self):
+        self.assertEqual(self.search('танк'), [self.tank_ad.pk, self.healer_ad.pk])
+        self.assertEqual(self.search('хил "'), [self.healer_ad.pk])
+        self.assertEqual(self.search('***'), [])
+
+    def test_search_view_highlights_snippet(self):
+        response = self.client.get(reverse('ad_search'), {'q': 'лекарь', 'category': 'healer'})
+        self.assertContains(response, '<mark>лекарь</mark> &amp; танк')
+
+    def test_rebuild_command(self):
+        get_search_backend().clear()
+        self.assertEqual(self.search('танк'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('танк')), 2)
+
+
+class CategoryFeedTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.healer = Category.objects.create(name='healer')
+
+    def assertCounts(self, tank, healer):
+        self.assertEqual(
+            dict(Category.objects.values_list('name', 'ad_count')),
+            {'tank': tank, 'healer': healer},
+        )
+
+    def test_counter_follows_create_move_and_delete(self):
+        ads = self.create_ads(3)
+        self.assertCounts(3, 0)
+
+        ad = Ad.objects.get(pk=ads[0].pk)
+        ad.category = self.healer
+        ad.save()
+        ad.save()
+        self.assertCounts(2, 1)
+
+        ad.delete()
+        self.assertCounts(2, 0)
+
+        self.author.delete()
+        self.assertCounts(0, 0)
+
+    def test_category_feed_without_count_query(self):
+        self.create_ads(2)
+        self.create_ads(1, category=self.healer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ads_by_category', args=['healer']))
+        self.assertEqual(len(response.context['ads']), 1)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+        self.assertContains(response, '<span class="badge bg-secondary">2</span>')
+        self.assertEqual(self.client.get(reverse('ads_by_category', args=['nobody'])).status_code, 404)
+
+    def test_recount_command(self):
+        self.create_ads(2)
+        Category.objects.update(ad_count=0)
+        call_command('recount_category_ads', stdout=StringIO())
+        self.assertCounts(2, 0)
+
+    def test_migration_fills_counter(self):
+        from importlib import import_module
+
+        migration = import_module('callboard.migrations.0008_category_ad_count')
+        self.create_ads(2)
+        self.create_ads(1, category=self.healer)
+        Category.objects.update(ad_count=0)
+        migration.fill_ad_count(apps, None)
+        self.assertCounts(2, 1)
+
+
+class FragmentCacheTest(BoardTestCase):
+
+    def test_detail_fragment_is_reused_until_ad_changes(self):
+        ad = self.create_ads(1)[0]
+        url = reverse('ad_detail', args=[ad.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(fragment_stats()['hits'], 1)
+
+        Ad.objects.filter(pk=ad.pk).update(content='<p>Обновлённый текст</p>')
+        self.assertNotContains(self.client.get(url), 'Обновлённый текст')
+
+        ad.content = '<p>Обновлённый текст</p>'
+        ad.save()
+        self.assertContains(self.client.get(url), 'Обновлённый текст')
+        self.assertEqual(fragment_stats()['misses'], 2)
+
+    def test_list_cards_are_cached(self):
+        self.create_ads(3)
+        self.client.get(reverse('ads'))
+        self.client.get(reverse('ads'))
+        self.assertEqual(fragment_stats(), {'hits': 3, 'misses': 3, 'hit_ratio': 0.5})
+
+
+class ConditionalGetTest(QueryBudgetMixin, BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ad = cls.create_ads(1)[0]
+
+    def assertRevalidates(self, url, change):
+        etag = self.client.get(url)['ETag']
+        with self.assertQueryBudget(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_ad_list(self):
+        self.assertRevalidates(reverse('ads'), lambda: self.create_ads(1))
+
+    def test_ad_list_changes_on_delete(self):
+        self.create_ads(1)
+        self.assertRevalidates(reverse('ads'), self.ad.delete)
+
+    def test_ad_detail(self):
+        def change():
+            self.ad.title = 'Новый заголовок'
+            self.ad.save()
+        self.assertRevalidates(reverse('ad_detail', args=[self.ad.pk]), change)
+
+    def test_last_modified(self):
+        url = reverse('ad_detail', args=[self.ad.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_missing_ad(self):
+        self.assertEqual(self.client.get(reverse('ad_detail', args=[0])).status_code, 404)
+
+    def test_anonymous_copy_is_not_reused_after_login(self):
+        for url in (reverse('ads'), reverse('ad_detail', args=[self.ad.pk])):
+            response = self.client.get(url)
+            etag, last_modified = response['ETag'], response['Last-Modified']
+            self.client.force_login(self.author)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'id="unread-responses"')
+            self.assertNotIn('Last-Modified', response)
+            # Новый отклик меняет счётчик в шапке — и ETag вместе с ним
+            etag = response['ETag']
+            User.objects.filter(pk=self.author.pk).update(unread_response_count=F('unread_response_count') + 1)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            self.client.logout()
+
+    def test_ad_list_pages_have_own_etags(self):
+        self.create_ads(10)
+        self.assertNotEqual(self.client.get(reverse('ads'))['ETag'],
+                            self.client.get(reverse('ads'), {'page': 2})['ETag'])
+        self.assertNotEqual(self.client.get(reverse('ads'))['ETag'],
+                            self.client.get(reverse('ads_by_category', args=[self.category.name]))['ETag'])
+
+
+class AdContentTest(BoardTestCase):
+
+    def test_sanitize_html(self):
+        cleaned, text = sanitize_html(
+            '<p onclick="evil()">Привет <b>мир</b><script>alert(1)</script></p>'
+            '<a href="javascript:alert(1)">ссылка</a><a href="https://example.com">сайт</a>'
+            '<img src="/media/a.png" style="width:10px"><ul><li>один<li>два</ul><div>не закрыт'
+        )
+        self.assertEqual(
+            cleaned,
+            '<p>Привет <b>мир</b></p><a rel="nofollow noopener">ссылка</a>'
+            '<a href="https://example.com" rel="nofollow noopener">сайт</a>'
+            '<img src="/media/a.png"><ul><li>один</li><li>два</li></ul><div>не закрыт</div>',
+        )
+        self.assertEqual(text, 'Привет мир\nссылкасайт\nодин\nдва\nне закрыт')
+
+    def test_save_renders_content_and_excerpt(self):
+        ad = self.create_ads(1)[0]
+        ad.content = '<p>' + ' '.join(f'слово{i}' for i in range(40)) + '</p><script>x</script>'
+        ad.save(update_fields=['content'])
+        ad.refresh_from_db()
+        self.assertNotIn('script', ad.content_html)
+        self.assertEqual(len(ad.excerpt.split()), 30)
+        self.assertTrue(ad.excerpt.endswith('…'))
+
+    def test_list_reads_excerpt_only(self):
+        self.create_ads(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ads'))
+        self.assertContains(response, 'Текст объявления 1')
+        ad_query = next(q['sql'] for q in queries.captured_queries if 'FROM "callboard_ad"' in q['sql']
+                        and '"callboard_ad"."title"' in q['sql'])
+        self.assertNotIn('"callboard_ad"."content"', ad_query)
+
+    def test_backfill_command(self):
+        self.create_ads(3)
+        Ad.objects.update(content_html='', content_text='', excerpt='')
+        call_command('backfill_ad_content', '--batch-size=2', stdout=StringIO())
+        self.assertEqual(
+            sorted(Ad.objects.values_list('excerpt', flat=True)),
+            [f'Текст объявления {i}' for i in range(3)],
+        )
+
+    def test_backfill_migration(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('callboard.migrations.0018_ad_rendered_content_backfill')
+        self.create_ads(3)
+        Ad.objects.update(content_html='', content_text='', excerpt='')
+        get_search_backend().clear()
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.render_content(apps, mock.Mock(connection=connection))
+        self.assertEqual(
+            sorted(Ad.objects.values_list('excerpt', flat=True)),
+            [f'Текст объявления {i}' for i in range(3)],
+        )
+        self.assertEqual(len(get_search_backend().search('объявления')), 3)
+
+
+class BoardTransferTest(BoardTestCase):
+
+    def export(self, kind, path):
+        call_command('export_board', kind, '--output', path, stderr=StringIO())
+
+    def load(self, kind, path):
+        call_command('import_board', kind, path, '--batch-size=2', stdout=StringIO(), stderr=StringIO())
+
+    def test_round_trip(self):
+        ads = self.create_ads(3)
+        Response.objects.create(ad=ads[0], author=self.author, content='Отклик, с "кавычками"\nи переводом строки',
+                                is_accepted=True)
+        before_ads = list(Ad.objects.values_list('id', 'title', 'content_html', 'category__name', 'created_at'))
+        before_responses = list(Response.objects.values_list('id', 'ad_id', 'content', 'is_accepted', 'created_at'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {
+                'categories': os.path.join(directory, 'categories.jsonl'),
+                'ads': os.path.join(directory, 'ads.csv'),
+                'responses': os.path.join(directory, 'responses.csv'),
+            }
+            for kind, path in paths.items():
+                self.export(kind, path)
+            Category.objects.all().delete()
+            Ad.objects.all().delete()
+
+            self.load('categories', paths['categories'])
+            with CaptureQueriesContext(connection) as queries:
+                self.load('ads', paths['ads'])
+            self.load('responses', paths['responses'])
+
+        # Авторы и категории разрешаются по справочникам, загруженным один раз
+        lookups = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('SELECT') and ('"callboard_user"' in q['sql'] or 'FROM "callboard_category"' in q['sql'])]
+        self.assertEqual(len(lookups), 3)
+        # Даты из файла уходят в INSERT, без второго прохода по строкам
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "callboard_ad"')])
+
+        self.assertEqual(list(Ad.objects.values_list('id', 'title', 'content_html', 'category__name', 'created_at')),
+                         before_ads)
+        self.assertEqual(list(Response.objects.values_list('id', 'ad_id', 'content', 'is_accepted', 'created_at')),
+                         before_responses)
+        self.assertEqual(Category.objects.get().ad_count, 3)
+        self.assertEqual(len(get_search_backend().search('текст')), 3)
+
+    def test_ignore_conflicts_indexes_new_ads(self):
+        ads = self.create_ads(3)
+        created_at = ads[2].created_at
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ads.jsonl')
+            self.export('ads', path)
+            Ad.objects.filter(pk=ads[2].pk).delete()
+            stdout = StringIO()
+            call_command('import_board', 'ads', path, '--ignore-conflicts', stdout=stdout, stderr=StringIO())
+
+        self.assertIn('Загружено: 1, пропущено: 2', stdout.getvalue())
+        self.assertEqual(Ad.objects.get(pk=ads[2].pk).created_at, created_at)
+        self.assertEqual([hit.ad_id for hit in get_search_backend().search('объявления 2')], [ads[2].pk])
+        # Импорт не меняет auto_now у полей модели
+        self.assertTrue(Ad._meta.get_field('updated_at').auto_now)
+        self.assertTrue(Ad._meta.get_field('created_at').auto_now_add)
+
+    def test_ignore_conflicts_skips_duplicate_unique_fields(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'categories.jsonl')
+            with open(path, 'w', encoding='utf-8') as file:
+                for pk, name in ((self.category.pk + 100, 'tank'), (None, 'healer'), (None, 'healer')):
+                    file.write(json.dumps({'id': pk, 'name': name}) + '\n')
+            stdout = StringIO()
+            call_command('import_board', 'categories', path, '--ignore-conflicts', stdout=stdout, stderr=StringIO())
+
+        self.assertIn('Загружено: 1, пропущено: 2', stdout.getvalue())
+        self.assertEqual(sorted(Category.objects.values_list('name', flat=True)), ['healer', 'tank'])
+
+
+class ResponseInboxTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author.user_permissions.add(Permission.objects.get(codename='view_response'))
+        cls.first, cls.second = cls.create_ads(2)
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+        for ad, count in ((cls.first, 3), (cls.second, 2)):
+            for i in range(count):
+                Response.objects.create(ad=ad, author=cls.responder, content=f'Отклик {i}')
+
+    def unread(self):
+        return User.objects.get(pk=self.author.pk).unread_response_count
+
+    def test_stats_and_badge(self):
+        self.assertEqual(self.unread(), 5)
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('response_list'), {'selected_ad': self.first.pk})
+        stats = {ad.pk: (ad.response_total, ad.response_unread) for ad in response.context['ads']}
+        self.assertEqual(stats, {self.first.pk: (3, 3), self.second.pk: (2, 2)})
+        self.assertEqual(len(response.context['responses']), 3)
+        self.assertContains(response, '<span id="unread-responses" class="badge bg-warning">5</span>', html=True)
+
+    def test_reading_updates_counters(self):
+        self.client.force_login(self.author)
+        response = self.first.responses.first()
+        self.client.get(reverse('response_detail', args=[response.pk]))
+        self.client.get(reverse('response_detail', args=[response.pk]))
+        self.assertEqual(self.unread(), 4)
+
+        self.client.post(reverse('response_mark_read'), {'selected_ad': self.first.pk})
+        self.assertEqual(self.unread(), 2)
+
+        self.second.responses.first().delete()
+        self.assertEqual(self.unread(), 1)
+
+        self.client.post(reverse('response_mark_read'))
+        self.assertEqual(self.unread(), 0)
+
+    def test_head_and_prefetch_do_not_mark_read(self):
+        self.client.force_login(self.author)
+        url = reverse('response_detail', args=[self.first.responses.first().pk])
+        self.assertEqual(self.client.head(url).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'Sec-Purpose': 'prefetch'}).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'Purpose': 'prefetch'}).status_code, 200)
+        self.assertEqual(self.unread(), 5)
+
+    def test_mark_read_rejects_invalid_ad(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('response_mark_read'), {'selected_ad': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.unread(), 5)
+
+    def test_responder_does_not_mark_read(self):
+        self.client.force_login(self.responder)
+        self.client.get(reverse('response_detail', args=[self.first.responses.first().pk]))
+        self.assertEqual(self.unread(), 5)
+
+    def test_pagination_without_count_query(self):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('response_list'))
+        self.assertEqual(response.context['paginator'].count, 5)
+        self.assertFalse(any('COUNT(*)' in q['sql'] for q in queries.captured_queries))
+
+
+class BenchmarkTest(TestCase):
+
+    def test_generate_and_benchmark(self):
+        call_command('generate_board_data', '--users=5', '--ads=12', '--responses=20', '--batch-size=5',
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Ad.objects.count(), 12)
+        self.assertEqual(sum(Category.objects.values_list('ad_count', flat=True)), 12)
+
+        out = StringIO()
+        call_command('benchmark_board', '--iterations=2', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['results']), set(SCENARIOS))
+        self.assertEqual(report['dataset']['ads'], 12)
+        for result in report['results'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+
+
+class PerformanceMiddlewareTest(BoardTestCase):
+
+    def test_server_timing_and_log_line(self):
+        self.create_ads(2)
+        with self.assertLogs('callboard.performance', 'INFO') as logs:
+            response = self.client.get(reverse('ads'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'ads')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['sql_count'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    async def test_counts_queries_under_asgi(self):
+        await sync_to_async(self.create_ads)(2)
+        with self.assertLogs('callboard.performance', 'INFO') as logs:
+            response = await self.async_client.get(reverse('ads'))
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['sql_count'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_slow_requests_logged_as_warning(self):
+        monitoring = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SLOW_REQUEST_MS': 0, 'SERVER_TIMING': True}
+        with self.settings(PERFORMANCE_MONITORING=monitoring), \
+                self.assertLogs('callboard.performance', 'WARNING') as logs:
+            self.client.get(reverse('ads'))
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+
+    @override_settings(PERFORMANCE_MONITORING={'ENABLED': False})
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('ads')))
+
+
+class SqliteTuningTest(TransactionTestCase):
+    writers, readers, rows_per_writer = 4, 4, 100
+
+    def _worker(self, handler, barrier, errors, action):
+        connection = handler['default']
+        try:
+            connection.ensure_connection()
+            barrier.wait()
+            action(connection)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def _write(self, connection):
+        # Чтение и запись в одной транзакции — так же, как в atomic-блоках представлений
+        with connection.cursor() as cursor:
+            for i in range(self.rows_per_writer):
+                cursor.execute(f'BEGIN {connection.transaction_mode}')
+                cursor.execute('SELECT COUNT(*) FROM stress')
+                cursor.execute('INSERT INTO stress (value) VALUES (%s)', [i])
+                cursor.execute('COMMIT')
+
+    def _read(self, connection):
+        for _ in range(self.rows_per_writer * 2):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*), MAX(value) FROM stress')
+
+    def test_concurrent_reads_and_writes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Отдельная файловая база с теми же настройками: тестовая база в памяти не использует WAL
+            handler = ConnectionHandler({
+                'default': {**settings.DATABASES['default'], 'NAME': os.path.join(directory, 'stress.sqlite3')},
+            })
+            main = handler['default']
+            with main.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                cursor.execute('CREATE TABLE stress (id INTEGER PRIMARY KEY, value INTEGER)')
+
+            errors = []
+            barrier = threading.Barrier(self.writers + self.readers)
+            threads = [
+                threading.Thread(target=self._worker, args=(handler, barrier, errors, action))
+                for action in [self._write] * self.writers + [self._read] * self.readers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            with main.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM stress')
+                self.assertEqual(cursor.fetchone()[0], self.writers * self.rows_per_writer)
+            main.close()
+
+
+class OptimizeDatabaseTest(TransactionTestCase):
+
+    def test_command(self):
+        out = StringIO()
+        call_command('optimize_database', stdout=out)
+        self.assertIn('PRAGMA optimize', out.getvalue())
+        self.assertIn('journal_mode=', out.getvalue())
+
+
+@override_settings(CALLBOARD_READ_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ad = cls.create_ads(1)[0]
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Ad), 'default')
+        with replica_reads():
+            self.assertIn(router.db_for_read(Ad), ['replica1', 'replica2'])
+            self.assertEqual(router.db_for_write(Ad), 'default')
+            self.assertEqual(router.db_for_read(Session), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'callboard'))
+        self.assertTrue(router.allow_migrate('default', 'callboard'))
+
+    def replica_flags(self, method, url, data=None):
+        """Для каждого чтения объявлений и откликов во время запроса — разрешено ли оно из реплики"""
+        flags = []
+
+        def spy(router, model, **hints):
+            if model in (Ad, Response):
+                flags.append(routers._use_replica.get())
+            return 'default'
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', spy):
+            getattr(self.client, method)(url, data)
+        return flags
+
+    def test_read_views_use_replica(self):
+        flags = self.replica_flags('get', reverse('ad_detail', args=[self.ad.pk]))
+        self.assertTrue(flags)
+        self.assertTrue(all(flags))
+        self.assertTrue(all(self.replica_flags('get', reverse('ads'))))
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.client.force_login(self.responder)
+        flags = self.replica_flags('post', reverse('response_create', args=[self.ad.pk]), {'content': 'Я готов'})
+        self.assertFalse(any(flags))
+        self.assertFalse(any(self.replica_flags('get', reverse('ads'))))
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.client.post(reverse('response_create', args=[self.ad.pk]), {'content': 'Ещё отклик'})
+        self.assertTrue(all(self.replica_flags('get', reverse('ads'))))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class RoleCacheTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = Group.objects.create(name='authors')
+        cls.authors.permissions.add(Permission.objects.get(codename='add_ad'))
+
+    def setUp(self):
+        super().setUp()
+        self.author.groups.add(self.authors)
+        self.client.force_login(self.author)
+
+    def auth_queries(self, url):
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in queries if 'auth_group' in q['sql'] or 'auth_permission' in q['sql']]
+
+    def test_permission_and_group_checks_are_cached(self):
+        self.assertEqual(self.auth_queries(reverse('ad_create')), [])
+        self.assertEqual(self.auth_queries(reverse('user_profile')), [])
+        self.assertTrue(self.client.get(reverse('user_profile')).context['is_author'])
+
+    def test_membership_change_invalidates(self):
+        self.client.get(reverse('ad_create'))
+        self.author.groups.remove(self.authors)
+        self.assertEqual(self.client.get(reverse('ad_create')).status_code, 403)
+        self.authors.user_set.add(self.author)
+        self.assertEqual(self.client.get(reverse('ad_create')).status_code, 200)
+
+    def test_invalidation_reaches_other_processes(self):
+        self.client.get(reverse('ad_create'))
+        # Состав групп меняет другой процесс со своим LocMemCache: кэш этого процесса он не видит
+        from django.core.cache.backends.locmem import LocMemCache
+        other_process = LocMemCache('other-process', {})
+        with mock.patch('callboard.backends.role_cache', return_value=other_process):
+            self.author.groups.remove(self.authors)
+        self.assertEqual(self.client.get(reverse('ad_create')).status_code, 403)
+
+    def test_group_permission_change_invalidates(self):
+        self.client.get(reverse('ad_create'))
+        self.authors.permissions.clear()
+        self.assertEqual(self.client.get(reverse('ad_create')).status_code, 403)
+
+    def signup(self, email):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('account_signup'), {
+                'email': email, 'password1': 'S3cure-password!', 'password2': 'S3cure-password!',
+            })
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "auth_group"' in q['sql']]
+
+    def test_signup_joins_basic_group(self):
+        self.client.logout()
+        basic = Group.objects.create(name='basic')
+        self.assertEqual(len(self.signup('first@example.com')), 1)
+        self.client.logout()
+        self.assertEqual(self.signup('second@example.com'), [])
+        self.assertEqual(set(basic.user_set.values_list('email', flat=True)), {'first@example.com', 'second@example.com'})
+
+        # Группу пересоздали — id берётся заново; группы нет — ошибка, а не пустая группа
+        basic.delete()
+        basic = Group.objects.create(name='basic')
+        self.assertEqual(group_id('basic'), basic.pk)
+        basic.delete()
+        with self.assertRaises(Group.DoesNotExist):
+            group_id('basic')
+
+    def test_superuser_has_all_permissions(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        expected = ModelBackend().get_all_permissions(User.objects.get(pk=admin.pk))
+        self.assertEqual(CachedModelBackend().get_all_permissions(User.objects.get(pk=admin.pk)), expected)
+        # Снятый флаг суперпользователя не оставляет закэшированных прав
+        User.objects.filter(pk=admin.pk).update(is_superuser=False)
+        self.assertEqual(CachedModelBackend().get_all_permissions(User.objects.get(pk=admin.pk)), set())
+
+
+class AsyncViewsTest(BoardTestCase):
+    """Асинхронные представления через ASGI-обработчик тестового клиента"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ad = cls.create_ads(12)[0]
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+
+    async def test_ad_list_and_detail(self):
+        response = await self.async_client.get(reverse('ads'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['ads']), 2)
+        self.assertEqual(response.context['paginator'].count, 12)
+
+        response = await self.async_client.get(reverse('ads_by_category', args=['tank']))
+        self.assertEqual(response.context['category'], self.category)
+
+        url = reverse('ad_detail', args=[self.ad.pk])
+        response = await self.async_client.get(url)
+        self.assertContains(response, self.ad.title)
+        cached = await self.async_client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual((await self.async_client.get(reverse('ad_detail', args=[0]))).status_code, 404)
+
+    async def test_response_create_and_accept(self):
+        url = reverse('response_create', args=[self.ad.pk])
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+
+        await self.async_client.aforce_login(self.responder)
+        self.assertEqual((await self.async_client.get(url)).status_code, 200)
+        response = await self.async_client.post(url, {'content': 'Возьмите меня'})
+        self.assertRedirects(response, reverse('ads'), fetch_redirect_response=False)
+        created = await Response.objects.aget()
+        self.assertEqual(created.author_id, self.responder.pk)
+
+        accept_url = reverse('response_accept', args=[created.pk])
+        await self.async_client.post(accept_url)
+        self.assertFalse((await Response.objects.aget()).is_accepted)
+
+        await self.async_client.aforce_login(self.author)
+        response = await self.async_client.post(accept_url)
+        self.assertRedirects(response, reverse('response_detail', args=[created.pk]), fetch_redirect_response=False)
+        self.assertTrue((await Response.objects.aget()).is_accepted)
+        self.assertEqual(await OutboxEmail.objects.acount(), 2)
+
+
+class LoadTestTest(TransactionTestCase):
+    # Запросы WSGI идут из пула потоков, им нужны закоммиченные данные
+
+    def test_wsgi_and_asgi(self):
+        author = User.objects.create_user('author', 'author@example.com', 'password')
+        ads = BoardTestCase.create_ads(3, author=author, category=Category.objects.create(name='tank'))
+        paths = [reverse('ads'), reverse('ad_detail', args=[ads[0].pk])]
+        for interface in ('wsgi', 'asgi'):
+            report = run_load_test(interface, paths, requests=6, concurrency=3)
+            self.assertEqual(report['errors'], 0, interface)
+            self.assertLessEqual(report['p50_ms'], report['p99_ms'])
+
+
+class RecordingEventBackend(LocalEventBackend):
+    """Замена межпроцессного backend в тестах: запоминает всё опубликованное"""
+    published = []
+
+    def publish(self, user_id, event):
+        self.published.append((user_id, event))
+        super().publish(user_id, event)
+
+
+@override_settings(CALLBOARD_EVENT_BACKEND='callboard.tests.RecordingEventBackend', CALLBOARD_EVENT_HEARTBEAT=0.05)
+class ResponseEventsTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ad = cls.create_ads(1)[0]
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+
+    def setUp(self):
+        super().setUp()
+        get_hub.cache_clear()
+        self.addCleanup(get_hub.cache_clear)
+        RecordingEventBackend.published.clear()
+
+    @mock.patch('callboard.notifications._kick_delivery')
+    def test_events_published_after_commit(self, kick_delivery):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = Response.objects.create(ad=self.ad, author=self.responder, content='Отклик')
+            notify_response_created(response)
+            self.assertEqual(RecordingEventBackend.published, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_response_accepted(response)
+        self.assertEqual(
+            [(user_id, event['type']) for user_id, event in RecordingEventBackend.published],
+            [(self.author.pk, 'response.created'), (self.author.pk, 'response.accepted'),
+             (self.responder.pk, 'response.accepted')],
+        )
+
+    async def test_hub_delivers_from_other_threads(self):
+        hub = get_hub()
+        subscription = hub.subscribe(self.author.pk)
+        other = hub.subscribe(self.responder.pk)
+        await sync_to_async(hub.publish, thread_sensitive=False)(self.author.pk, {'type': 'response.created'})
+        self.assertEqual(await subscription.get(timeout=1), {'type': 'response.created'})
+        self.assertIsNone(await other.get(timeout=0.01))
+        subscription.close()
+        other.close()
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    def test_not_streamed_under_wsgi(self):
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('response_events')).status_code, 204)
+
+
+    def test_redis_listener_reconnects(self):
+        class FakePubSub:
+            def __init__(self, messages):
+                self.messages = messages
+
+            def psubscribe(self, pattern):
+                pass
+
+            def listen(self):
+                yield from self.messages
+                raise ConnectionError('Redis недоступен')
+
+            def close(self):
+                pass
+
+        hub = get_hub()
+        backend = RedisEventBackend.__new__(RedisEventBackend)
+        backend.hub = hub
+        backend.reconnect_delay = 0
+        backend._stopped = threading.Event()
+        message = {'channel': f'{RedisEventBackend.prefix}{self.author.pk}'.encode(), 'data': b'{"type": "response.created"}'}
+        attempts = [ConnectionError('Redis недоступен'), FakePubSub([{'channel': b'bad', 'data': b''}, message])]
+
+        def pubsub(**kwargs):
+            if not attempts:
+                backend.stop()
+                raise ConnectionError('Redis недоступен')
+            attempt = attempts.pop(0)
+            if isinstance(attempt, Exception):
+                raise attempt
+            return attempt
+
+        backend.client = mock.Mock(pubsub=pubsub)
+        with mock.patch.object(hub, 'dispatch') as dispatch, self.assertLogs('callboard.events', 'WARNING') as logs:
+            backend._listen()
+        dispatch.assert_called_once_with(self.author.pk, {'type': 'response.created'})
+        self.assertEqual(sum('переподключение' in line for line in logs.output), 2)
+
+
+class AsgiConnection:
+    """Запрос к ASGI-приложению: отправленные им сообщения копятся в очереди"""
+
+    def __init__(self, application, path, cookie=''):
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.request_sent = False
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+        }
+        self.task = asyncio.ensure_future(application(scope, self.receive, self.messages.put))
+
+    async def receive(self):
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def next(self):
+        return await asyncio.wait_for(self.messages.get(), 5)
+
+    async def body(self):
+        return (await self.next())['body']
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(CALLBOARD_EVENT_BACKEND='callboard.tests.RecordingEventBackend', CALLBOARD_EVENT_HEARTBEAT=0.05)
+class EventStreamAppTest(TransactionTestCase):
+    # Сессия проверяется в потоке из пула, поэтому данные должны быть зафиксированы
+
+    def setUp(self):
+        get_hub.cache_clear()
+        self.addCleanup(get_hub.cache_clear)
+        self.user = User.objects.create_user('author', 'author@example.com', 'password')
+        self.client.force_login(self.user)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.django = mock.AsyncMock()
+        self.application = EventStreamApp(self.django)
+        self.path = reverse('response_events')
+
+    async def test_stream(self):
+        connection = AsgiConnection(self.application, self.path, self.cookie)
+        start = await connection.next()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(await connection.body(), b'retry: 5000\n\n')
+        self.assertEqual(await connection.body(), b': ping\n\n')
+
+        get_hub().publish(self.user.pk, {'type': 'response.created', 'ad_id': 1})
+        chunk = await connection.body()
+        while chunk == b': ping\n\n':
+            chunk = await connection.body()
+        self.assertTrue(chunk.decode().startswith('event: response.created\ndata: '))
+        await connection.close()
+        self.assertEqual(get_hub().subscriber_count(), 0)
+        self.django.assert_not_called()
+
+    async def test_requires_session(self):
+        for cookie in ('', f'{settings.SESSION_COOKIE_NAME}=missing'):
+            connection = AsgiConnection(self.application, self.path, cookie)
+            self.assertEqual((await connection.next())['status'], 401)
+            await connection.task
+
+    async def test_other_requests_go_to_django(self):
+        connection = AsgiConnection(self.application, reverse('ads'))
+        await connection.task
+        self.assertEqual(self.django.await_args.args[0]['path'], reverse('ads'))
+
+    async def test_open_streams_hold_no_threads_or_connections(self):
+        opened = []
+        connection_created.connect(lambda connection, **kwargs: opened.append(connection), weak=False,
+                                   dispatch_uid='event-stream-test')
+        self.addCleanup(connection_created.disconnect, dispatch_uid='event-stream-test')
+        threads = threading.active_count()
+        streams = []
+        for _ in range(50):
+            stream = AsgiConnection(self.application, self.path, self.cookie)
+            self.assertEqual((await stream.next())['status'], 200)
+            await stream.body()
+            streams.append(stream)
+
+        self.assertEqual(get_hub().subscriber_count(), 50)
+        # Сессии проверялись в общем пуле потоков: потоков и соединений не больше, чем потоков пула.
+        # Закрытие соединения не проверить: в тестах SQLite в памяти и close() его не закрывает
+        self.assertLess(threading.active_count() - threads, 5)
+        self.assertLess(len(opened), 5)
+        for stream in streams:
+            await stream.close()
+        self.assertEqual(get_hub().subscriber_count(), 0)
+
+
+@override_settings(NEWSLETTER_CHUNK_SIZE=4, DIGEST_ADS_PER_CATEGORY=2)
+class WeeklyDigestTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_ads(3)
+        cls.create_ads(1, category=Category.objects.create(name='healer'))
+        for i in range(7):
+            user = User.objects.create_user(f'reader{i}', f'reader{i}@example.com', 'password')
+            NewsletterSubscription.objects.create(user=user, subscribed=i != 0)
+
+    def setUp(self):
+        super().setUp()
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+    def test_collect_in_one_query(self):
+        with self.assertNumQueries(1):
+            sections, total = collect_digest_ads(None, timezone.now())
+        self.assertEqual(total, 4)
+        self.assertEqual([(s['name'], s['count'], len(s['ads']), s['more']) for s in sections],
+                         [('Танки', 3, 2, 1), ('Хилы', 1, 1, 0)])
+
+    def test_digest_rendered_once_and_sent_in_chunks(self):
+        with mock.patch.object(tasks, 'render_to_string', wraps=tasks.render_to_string) as render:
+            result = send_weekly_digest()
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(result['chunks'], 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'reader{i}@example.com' for i in range(1, 7)])
+        self.assertIn('Танки (3)', mail.outbox[0].alternatives[0][0])
+
+        run = DigestRun.objects.get()
+        self.assertEqual((run.ad_count, run.recipient_count, run.chunk_count), (4, 6, 2))
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.metrics['sent'], 6)
+        for key in ('collect_ms', 'render_ms', 'plan_ms', 'send_ms', 'total_ms'):
+            self.assertIn(key, run.metrics)
+
+    def test_watermark_and_redelivery_are_idempotent(self):
+        send_weekly_digest()
+        mail.outbox.clear()
+        # Повторная доставка уже отправленной пачки ничего не шлёт
+        for chunk in DigestRun.objects.get().chunks.all():
+            send_digest_chunk(chunk.pk)
+        # Следующий запуск начинается с водяного знака: новых объявлений нет — писем нет
+        self.assertEqual(send_weekly_digest()['ads'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.create_ads(1)
+        send_weekly_digest()
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(DigestRun.objects.first().ad_count, 1)
+
+    def test_chunk_claimed_by_one_worker(self):
+        with mock.patch.object(tasks.group, 'apply_async'):
+            send_weekly_digest()
+        first, second = DigestRun.objects.get().chunks.order_by('number')
+        # Первую пачку уже занял другой воркер, вторую он занял давно и упал
+        DigestChunk.objects.filter(pk=first.pk).update(claimed_at=timezone.now())
+        DigestChunk.objects.filter(pk=second.pk).update(claimed_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(send_digest_chunk(first.pk), 0)
+        self.assertEqual(send_digest_chunk(second.pk), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_beat_schedule_points_at_task(self):
+        task = celery_app.conf.beat_schedule['weekly_digest_monday_8am']['task']
+        self.assertEqual(task, send_weekly_digest.name)
+
+
+def make_png(width=1800, height=1200, color=(200, 40, 40)):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class AdImageUploadTest(BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author.user_permissions.add(Permission.objects.get(codename='add_ad'))
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.force_login(self.author)
+        self.client.get(reverse('ad_create'))
+
+    def upload(self, data, name='photo.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('ad_image_upload'), {'upload': SimpleUploadedFile(name, data)},
+                headers={'X-CSRFToken': self.client.cookies['csrftoken'].value},
+            )
+
+    def test_upload_is_content_addressed_and_processed(self):
+        data = make_png()
+        response = self.upload(data)
+        self.assertEqual(response.status_code, 200)
+        image = AdImage.objects.get()
+        self.assertEqual(response.json()['url'], image.file.url)
+        self.assertEqual(image.file.name, f'ads/images/{image.sha256[:2]}/{image.sha256}.png')
+        self.assertEqual(image.file.read(), data)
+
+        self.assertIsNotNone(image.processed_at)
+        self.assertEqual(sorted(image.variants), ['1024', '1600', '320', '640', 'thumb'])
+        self.assertEqual(image.variants['640'][:2], [640, 427])
+        self.assertEqual(image.variants['thumb'][:2], [240, 240])
+        for width, height, name in image.variants.values():
+            self.assertTrue(default_storage.exists(name))
+
+    def test_identical_upload_is_deduplicated(self):
+        data = make_png(400, 300)
+        first = self.upload(data, 'a.png').json()
+        with mock.patch('callboard.images.default_storage.save') as save:
+            second = self.upload(data, 'b.png').json()
+        save.assert_not_called()
+        self.assertEqual(first['url'], second['url'])
+        self.assertEqual(AdImage.objects.count(), 1)
+        # Оригинал уже небольшой: вариант в полную ширину и миниатюра
+        self.assertEqual(sorted(AdImage.objects.get().variants), ['320', '400', 'thumb'])
+
+    def test_rejects_non_images_and_oversized_files(self):
+        response = self.upload(b'<?php echo 1;', 'shell.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['uploaded'], 0)
+        with override_settings(AD_IMAGE_MAX_SIZE=1024):
+            response = self.upload(make_png(), 'big.png')
+        self.assertEqual(response.json()['error']['message'], 'Файл слишком большой')
+        self.assertFalse(AdImage.objects.exists())
+
+    def test_upload_requires_csrf_token(self):
+        response = self.client.post(reverse('ad_image_upload'), {'upload': SimpleUploadedFile('a.png', make_png(10, 10))})
+        self.assertEqual(response.status_code, 403)
+
+    def test_ad_content_gets_srcset_and_cover(self):
+        url = self.upload(make_png()).json()['url']
+        ad = Ad.objects.create(title='С картинкой', content=f'<p><img src="{url}" alt="меч" style="width:2000px"></p>',
+                               author=self.author, category=self.category)
+        image = AdImage.objects.get()
+        self.assertIn(f'srcset="/media/{image.variants["320"][2]} 320w, ', ad.content_html)
+        self.assertIn('sizes="(max-width: 800px) 100vw, 800px"', ad.content_html)
+        self.assertIn('width="1600" height="1067" loading="lazy"', ad.content_html)
+        self.assertIn('alt="меч"', ad.content_html)
+        self.assertNotIn(url, ad.content_html)
+        self.assertEqual(ad.cover, image.variants['thumb'][2])
+        self.assertContains(self.client.get(reverse('ads')), f'src="{ad.cover_url}"')
+
+    def test_ads_saved_before_processing_are_rerendered(self):
+        with mock.patch('callboard.tasks.process_ad_image.delay'):
+            url = self.upload(make_png(500, 500)).json()['url']
+        ad = Ad.objects.create(title='Рано', content=f'<img src="{url}">', author=self.author, category=self.category)
+        self.assertNotIn('srcset', ad.content_html)
+
+        tasks.process_ad_image(AdImage.objects.get().pk)
+        ad.refresh_from_db()
+        self.assertIn('srcset', ad.content_html)
+        self.assertTrue(ad.cover)
+
+
+class AdminTest(QueryBudgetMixin, BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+        cls.healer = Category.objects.create(name='healer')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def create_responses(self, ads, **kwargs):
+        return [Response.objects.create(ad=ad, author=self.responder, content='Возьмите меня', **kwargs) for ad in ads]
+
+    def refresh_counters(self):
+        self.category.refresh_from_db()
+        self.healer.refresh_from_db()
+        self.author.refresh_from_db()
+
+    def test_changelists_do_not_grow_with_rows(self):
+        self.create_responses(self.create_ads(2))
+        for name in ('ad', 'response', 'user'):
+            url = reverse(f'admin:callboard_{name}_changelist')
+            self.assertPageWithinBudget(url, 8, lambda: self.create_responses(self.create_ads(10)))
+
+    def test_estimated_count_replaces_count_for_whole_table(self):
+        self.create_ads(12)
+        self.assertIsNone(estimate_count(Ad, 'default'))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Ad, 'default'), 12)
+
+        with override_settings(CALLBOARD_ADMIN_ESTIMATED_COUNT_FROM=10):
+            with CaptureQueriesContext(connection) as context:
+                self.assertContains(self.client.get(reverse('admin:callboard_ad_changelist')), '12 ')
+            self.assertFalse([q for q in context.captured_queries if 'COUNT(' in q['sql']])
+            # С фильтром — точный подсчёт
+            filtered = EstimatedCountPaginator(Ad.objects.filter(category=self.category), 5)
+            self.assertEqual(filtered.count, 12)
+            with self.assertNumQueries(1):
+                self.assertEqual(EstimatedCountPaginator(Ad.objects.all(), 5).count, 12)
+
+    def test_user_search_uses_prefix_range(self):
+        url = reverse('admin:callboard_user_changelist')
+        response = self.client.get(url, {'q': 'resp'})
+        self.assertContains(response, 'responder@example.com')
+        self.assertNotContains(response, 'author@example.com')
+        self.assertEqual(self.client.get(url, {'q': 'author@'}).context['cl'].result_count, 1)
+        # Регистр не важен ни в имени, ни в email
+        self.assertEqual(self.client.get(url, {'q': 'RESP'}).context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(url, {'q': 'Author@Example'}).context['cl'].result_count, 1)
+
+    def test_bulk_delete_ads_keeps_counters(self):
+        ads = self.create_ads(3)
+        self.create_responses(ads[:2])
+        self.refresh_counters()
+        self.assertEqual((self.category.ad_count, self.author.unread_response_count), (3, 2))
+
+        with self.assertNumQueries(11):
+            self.assertEqual(delete_ads(Ad.objects.filter(pk__in=[ad.pk for ad in ads[:2]])), 2)
+        self.refresh_counters()
+        self.assertEqual((self.category.ad_count, self.author.unread_response_count), (1, 0))
+        self.assertFalse(Response.objects.exists())
+        self.assertEqual([hit.ad_id for hit in get_search_backend().search('Объявление')], [ads[2].pk])
+
+    def test_bulk_recategorize(self):
+        ads = self.create_ads(3)
+        fragment_key_before = Ad.objects.get(pk=ads[0].pk).updated_at
+        with self.assertNumQueries(6):
+            self.assertEqual(recategorize_ads(Ad.objects.all(), self.healer), 3)
+        self.refresh_counters()
+        self.assertEqual((self.category.ad_count, self.healer.ad_count), (0, 3))
+        self.assertGreater(Ad.objects.get(pk=ads[0].pk).updated_at, fragment_key_before)
+        self.assertEqual(recategorize_ads(Ad.objects.all(), self.healer), 0)
+
+    @mock.patch('callboard.notifications._kick_delivery')
+    def test_bulk_accept_and_delete_responses(self, kick):
+        responses = self.create_responses(self.create_ads(3))
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(5):
+                self.assertEqual(accept_responses(Response.objects.all()), 3)
+        self.assertEqual(Response.objects.filter(is_accepted=True).count(), 3)
+        self.assertEqual(OutboxEmail.objects.filter(recipient='responder@example.com').count(), 3)
+        self.assertEqual(accept_responses(Response.objects.all()), 0)
+
+        responses[0].mark_read()
+        self.assertEqual(delete_responses(Response.objects.all()), 3)
+        self.refresh_counters()
+        self.assertEqual(self.author.unread_response_count, 0)
+
+    def test_delete_action_confirms_then_deletes(self):
+        ads = self.create_ads(2)
+        self.create_responses(ads)
+        url = reverse('admin:callboard_ad_changelist')
+        data = {'action': 'delete_selected', '_selected_action': [ads[0].pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Будет удалено')
+        self.assertEqual(Ad.objects.count(), 2)
+
+        response = self.client.post(url, {**data, 'post': 'yes'})
+        self.assertRedirects(response, url)
+        self.assertEqual(list(Ad.objects.values_list('pk', flat=True)), [ads[1].pk])
+        self.assertEqual(
+            list(LogEntry.objects.values_list('object_id', 'object_repr', 'action_flag', 'user_id')),
+            [(None, 'ads: 1', DELETION, self.admin.pk)],
+        )
+
+    def test_delete_action_across_pages_in_batches(self):
+        responses = self.create_responses(self.create_ads(5))
+        url = reverse('admin:callboard_response_changelist')
+        data = {'action': 'delete_selected', 'select_across': '1', 'index': '0', 'post': 'yes',
+                '_selected_action': [response.pk for response in responses]}
+        with mock.patch('callboard.bulk.DELETE_BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            self.client.post(url, data)
+        self.assertFalse(Response.objects.exists())
+        self.assertEqual(list(LogEntry.objects.values_list('change_message', flat=True)), ['Массовое удаление: 5'])
+        deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "callboard_response"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertTrue(all('SELECT' in sql for sql in deletes))
+
+    def test_cascade_follows_model_relations(self):
+        ad, = self.create_ads(1)
+        AdViewDay.objects.create(ad=ad, day=timezone.localdate(), views=1)
+        image = AdImage.objects.create(sha256='0' * 64, file='x.png', format='PNG', width=1, height=1, size=1,
+                                       uploaded_by=self.responder)
+        NewsletterSubscription.objects.create(user=self.responder)
+        self.responder.groups.add(Group.objects.create(name='readers'))
+        self.create_responses([ad])
+
+        self.assertEqual(delete_cascade(User.objects.filter(pk__in=[self.author.pk, self.responder.pk])), 2)
+        self.assertFalse(Ad.objects.exists() or AdViewDay.objects.exists() or Response.objects.exists())
+        self.assertFalse(NewsletterSubscription.objects.exists())
+        self.assertFalse(User.groups.through.objects.exists())
+        image.refresh_from_db()
+        self.assertIsNone(image.uploaded_by_id)
+
+    def test_move_action_per_category(self):
+        ad, = self.create_ads(1)
+        url = reverse('admin:callboard_ad_changelist')
+        self.client.post(url, {'action': f'move_to_category_{self.healer.pk}', '_selected_action': [ad.pk]})
+        self.assertEqual(Ad.objects.get().category, self.healer)
+
+
+def flush_views():
+    """
+    Сброс, как его сделал бы beat после закрытия текущего окна. Отметка о сброшенных
+    окнах забывается, чтобы следующие просмотры в том же окне не считались опоздавшими.
+    """
+    push_views(view_counter.drain())
+    views_cache().delete(FLUSHED_KEY)
+    by_day = collect_views(now=time.time() + settings.AD_VIEWS_FLUSH_SECONDS)
+    return save_views(by_day) if by_day else 0
+
+
+class AdViewsTest(BoardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        view_counter.drain()
+
+    @override_settings(AD_VIEWS_PUSH_SIZE=3)
+    def test_counter_hands_out_batches(self):
+        counter = ViewCounter()
+        self.assertIsNone(counter.add(1))
+        self.assertIsNone(counter.add(1))
+        self.assertEqual(counter.add(2), {1: 2, 2: 1})
+        self.assertEqual(counter.drain(), {})
+
+    def test_detail_hit_does_not_write_to_ads(self):
+        ad, = self.create_ads(1)
+        url = reverse('ad_detail', args=[ad.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith('UPDATE')])
+
+        self.assertEqual(flush_views(), 2)
+        ad.refresh_from_db()
+        self.assertEqual((ad.views, ad.weekly_views), (2, 2))
+        self.assertEqual(AdViewDay.objects.get().views, 2)
+        # Повторный сброс ничего не добавляет, следующий — дописывает в ту же строку дня
+        self.assertEqual(flush_views(), 0)
+        self.client.get(url)
+        flush_views()
+        self.assertEqual(AdViewDay.objects.get().views, 3)
+
+    def test_not_modified_detail_counts_as_view(self):
+        ad, = self.create_ads(1)
+        url = reverse('ad_detail', args=[ad.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        self.client.head(url)
+        self.assertEqual(flush_views(), 2)
+
+    @override_settings(AD_VIEWS_PUSH_SIZE=100, AD_VIEWS_PUSH_SECONDS=0.05)
+    def test_idle_batch_is_pushed(self):
+        counter = ViewCounter()
+        pushed = []
+        with mock.patch('callboard.counters.push_views', side_effect=pushed.append):
+            self.assertIsNone(counter.add(1))
+            deadline = time.monotonic() + 5
+            while not any(pushed) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertIn({1: 1}, pushed)
+        self.assertEqual(counter.drain(), {})
+
+    def test_flush_pushes_pending_views(self):
+        ad, = self.create_ads(1)
+        view_counter.add(ad.pk)
+        view_counter.flush()
+        self.assertEqual(view_counter.drain(), {})
+        self.assertEqual(flush_views(), 1)
+
+    @override_settings(DEBUG=False)
+    def test_process_local_views_cache_fails_startup(self):
+        config = apps.get_app_config('callboard')
+        with self.assertRaisesMessage(ImproperlyConfigured, 'CALLBOARD_VIEWS_CACHE'):
+            config.ready()
+        self.assertEqual([warning.id for warning in check_views_cache(None)], ['callboard.W001'])
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        config.ready()
+        self.assertEqual(check_views_cache(None), [])
+
+    def test_popular_listing(self):
+        quiet, popular, unseen = self.create_ads(3)
+        save_views({timezone.localdate(): {quiet.pk: 2, popular.pk: 5}})
+        url = reverse('ads_popular')
+        response = self.client.get(url)
+        self.assertEqual([ad.pk for ad in response.context['ads']], [popular.pk, quiet.pk])
+        etag = response['ETag']
+
+        for _ in range(4):
+            view_counter.add(quiet.pk)
+        flush_views()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([ad.pk for ad in response.context['ads']], [quiet.pk, popular.pk])
+
+    def test_window_moves_and_old_days_expire(self):
+        ad, = self.create_ads(1)
+        today = timezone.localdate()
+        save_views({today - timedelta(days=10): {ad.pk: 7}, today: {ad.pk: 1}})
+        Ad.objects.filter(pk=ad.pk).update(weekly_views=8)
+        self.assertEqual(tasks.refresh_popular_ads(), {'refreshed': 1, 'expired_days': 1})
+        ad.refresh_from_db()
+        self.assertEqual((ad.views, ad.weekly_views), (8, 1))
+
+    def test_views_of_deleted_ads_and_stale_windows_are_dropped(self):
+        ad, gone = self.create_ads(2)
+        push_views({ad.pk: 1, gone.pk: 1})
+        push_views({ad.pk: 1}, now=time.time() - settings.AD_VIEWS_FLUSH_SECONDS * (settings.AD_VIEWS_MAX_LAG + 2))
+        gone.delete()
+        self.assertEqual(flush_views(), 1)
+
+    def test_concurrent_flush_is_skipped(self):
+        views_cache().add(LOCK_KEY, 1)
+        self.assertIsNone(collect_views())
+
+
+# Пачек меньше, чем MAX_ENTRIES у LocMemCache: вытеснение здесь означало бы потери
+@override_settings(AD_VIEWS_PUSH_SIZE=25)
+class AdViewsStressTest(TransactionTestCase):
+    # Запросы WSGI идут из пула потоков, им нужны закоммиченные данные
+
+    def setUp(self):
+        role_cache().clear()
+        view_counter.drain()
+
+    def test_concurrent_hits_are_counted(self):
+        author = User.objects.create_user('author', 'author@example.com', 'password')
+        ads = BoardTestCase.create_ads(3, author=author, category=Category.objects.create(name='tank'))
+        paths = [reverse('ad_detail', args=[ad.pk]) for ad in ads]
+        for interface in ('wsgi', 'asgi'):
+            report = run_load_test(interface, paths, requests=120, concurrency=8)
+            self.assertEqual(report['errors'], 0, interface)
+
+        # Параллельные пачки из потоков и сброс закрытых окон посреди них — ничего не теряется и не удваивается
+        def hammer():
+            for i in range(300):
+                push_views(view_counter.add(ads[i % 3].pk))
+
+        threads = [threading.Thread(target=hammer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        flushed = save_views(collect_views() or {})
+        for thread in threads:
+            thread.join()
+        flushed += flush_views()
+
+        self.assertEqual(flushed, 2 * 120 + 8 * 300)
+        self.assertEqual(sum(Ad.objects.values_list('views', flat=True)), flushed)
+        self.assertEqual(sum(AdViewDay.objects.values_list('views', flat=True)), flushed)
+
+
+class ApiTest(QueryBudgetMixin, BoardTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password')
+        cls.author.user_permissions.add(*Permission.objects.filter(
+            codename__in=['can_publish', 'view_response'],
+        ))
+
+    def test_ads_sparse_fields_without_content_by_default(self):
+        self.create_ads(2)
+        data = self.client.get(reverse('api_ads')).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertNotIn('content', data['results'][0])
+        self.assertEqual(data['results'][0]['category'], 'tank')
+
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(reverse('api_ads'), {'fields': 'id,title'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+        listing = context.captured_queries[-1]['sql']
+        self.assertNotIn('content_html', listing)
+        self.assertNotIn('JOIN', listing)
+
+        response = self.client.get(reverse('api_ads'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+        ad = Ad.objects.first()
+        data = self.client.get(reverse('api_ad', args=[ad.pk]), {'fields': 'content'}).json()
+        self.assertEqual(data, {'content': ad.content_html})
+
+    def test_ads_cursor_pagination(self):
+        ads = self.create_ads(5)
+        first = self.client.get(reverse('api_ads'), {'limit': 2, 'fields': 'id'}).json()
+        self.assertEqual([row['id'] for row in first['results']], [ads[4].pk, ads[3].pk])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(reverse('api_ads'), {'limit': 2, 'fields': 'id', 'cursor': first['next']}).json()
+        self.assertEqual([row['id'] for row in second['results']], [ads[2].pk, ads[1].pk])
+        back = self.client.get(reverse('api_ads'), {'limit': 2, 'fields': 'id', 'cursor': second['previous']}).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertEqual(self.client.get(reverse('api_ads'), {'cursor': 'мусор'}).status_code, 400)
+
+    def test_listing_queries_do_not_grow_with_rows(self):
+        self.create_ads(2)
+        self.assertPageWithinBudget(reverse('api_ads'), 3, lambda: self.create_ads(10))
+
+    def test_conditional_get(self):
+        ad = self.create_ads(1)[0]
+        for url in (reverse('api_ads'), reverse('api_ad', args=[ad.pk]), reverse('api_categories')):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        etag = self.client.get(reverse('api_ads'))['ETag']
+        self.create_ads(1)
+        self.assertEqual(self.client.get(reverse('api_ads'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_create_ad_requires_permissions(self):
+        payload = {'title': 'Нужен танк', 'content': '<p>Срочно</p>', 'category': 'tank'}
+        post = lambda data: self.client.post(reverse('api_ads'), data, content_type='application/json')
+        self.assertEqual(post(payload).status_code, 401)
+
+        self.client.force_login(self.responder)
+        self.assertEqual(post(payload).status_code, 403)
+
+        self.client.force_login(self.author)
+        self.assertEqual(post({**payload, 'is_urgent': True}).status_code, 403)
+        self.assertEqual(post({**payload, 'category': 'нет такой'}).status_code, 400)
+        response = post(payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'author')
+        self.assertFalse(Ad.objects.get(pk=response.json()['id']).is_urgent)
+
+        self.author.user_permissions.add(Permission.objects.get(codename='can_mark_urgent'))
+        role_cache().clear()
+        self.author = User.objects.get(pk=self.author.pk)
+        self.client.force_login(self.author)
+        self.assertTrue(post({**payload, 'is_urgent': True}).json()['is_urgent'])
+
+    def test_responses_are_private(self):
+        own, other = self.create_ads(1)[0], self.create_ads(1, author=self.responder)[0]
+        Response.objects.create(ad=own, author=self.responder, content='Возьмите меня')
+        Response.objects.create(ad=other, author=self.author, content='И меня')
+        self.assertEqual(self.client.get(reverse('api_responses')).status_code, 401)
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('api_responses'))
+        self.assertIn('private', response['Cache-Control'])
+        results = response.json()['results']
+        self.assertEqual([row['ad'] for row in results], [own.pk])
+        self.assertNotIn('content', results[0])
+        self.assertEqual(self.client.get(reverse('api_responses'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @mock.patch('callboard.notifications._kick_delivery')
+    def test_bulk_create_responses(self, kick):
+        ads = self.create_ads(3)
+        self.client.force_login(self.responder)
+        url = reverse('api_responses_bulk')
+        payload = {'responses': [{'ad': ad.pk, 'content': f'Отклик {ad.pk}'} for ad in ads]}
+
+        invalid = {'responses': [*payload['responses'], {'ad': 0, 'content': 'x'}]}
+        response = self.client.post(url, invalid, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['3'])
+        self.assertFalse(Response.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['results']), 3)
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT INTO "callboard_response"')]
+        self.assertEqual(len(inserts), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_response_count, 3)
+        self.assertEqual(OutboxEmail.objects.filter(dedup_key__startswith='response-created:').count(), 3)
+        kick.assert_called_once()
+
+        with override_settings(CALLBOARD_API_BULK_LIMIT=2):
+            self.assertEqual(self.client.post(url, payload, content_type='application/json').status_code, 400)
+
+    def test_bulk_accept_only_own_responses(self):
+        own, other = self.create_ads(1)[0], self.create_ads(1, author=self.responder)[0]
+        mine = Response.objects.create(ad=own, author=self.responder, content='Возьмите меня')
+        foreign = Response.objects.create(ad=other, author=self.author, content='И меня')
+        self.client.force_login(self.author)
+
+        data = self.client.post(
+            reverse('api_responses_accept'), {'ids': [mine.pk, foreign.pk]}, content_type='application/json',
+        ).json()
+        self.assertEqual(data, {'accepted': 1, 'not_found': [foreign.pk]})
+        mine.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual((mine.is_accepted, foreign.is_accepted), (True, False))
+
+
+class StaticFilesTest(TestCase):
+
+    def setUp(self):
+        source, root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(source.name, 'css'))
+        with open(os.path.join(source.name, 'css', 'site.css'), 'w') as file:
+            file.write('body { background: url("../logo.png"); }\n' + '.card { margin: 0 auto; }\n' * 200)
+        with open(os.path.join(source.name, 'logo.png'), 'wb') as file:
+            file.write(make_png(8, 8))
+        settings_override = override_settings(
+            # Без статики приложений (админка, CKEditor): её сжатие заняло бы минуту
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_DIRS=[source.name],
+            STATIC_ROOT=root.name,
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'callboard.staticfiles.CompressedManifestStaticFilesStorage',
+            }},
+            CALLBOARD_SERVE_STATIC=True,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.root = root.name
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('приложение'))
+        with open(os.path.join(root.name, 'staticfiles.json')) as file:
+            self.hashed_css = json.load(file)['paths']['css/site.css']
+
+    def get(self, path, method='get', **headers):
+        return self.middleware(getattr(RequestFactory(), method)(f'/static/{path}', **headers))
+
+    def test_collectstatic_writes_compressed_siblings_and_report(self):
+        # brotli — необязательная зависимость
+        suffixes = ('.gz', '.br') if brotli_compress(b'') is not None else ('.gz',)
+        for name in ('css/site.css', self.hashed_css):
+            for suffix in suffixes:
+                self.assertTrue(os.path.exists(os.path.join(self.root, name + suffix)), name + suffix)
+        # Картинка уже сжата
+        self.assertFalse([name for name in os.listdir(self.root) if name.startswith('logo') and name.endswith('.gz')])
+        with open(os.path.join(self.root, COMPRESSION_REPORT)) as file:
+            row = json.load(file)['css/site.css']
+        self.assertEqual(row['hashed'], self.hashed_css)
+        self.assertLess(row['gzip'], row['size'])
+
+        out = StringIO()
+        call_command('static_report', stdout=out)
+        self.assertIn(self.hashed_css, out.getvalue())
+        self.assertIn('Файлов: 1', out.getvalue())
+
+    def test_hashed_file_is_immutable_and_negotiated(self):
+        best = 'br' if brotli_compress(b'') is not None else 'gzip'
+        response = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], best)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        with open(os.path.join(self.root, f'{self.hashed_css}.{best.replace("gzip", "gz")}'), 'rb') as file:
+            self.assertEqual(b''.join(response.streaming_content), file.read())
+
+        self.assertEqual(self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='gzip')['Content-Encoding'], 'gzip')
+        identity = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertIn(b'url("../logo.', b''.join(identity.streaming_content))
+
+        etag = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertEqual(self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(self.hashed_css, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unhashed_and_unknown_paths(self):
+        response = self.get('css/site.css', method='head', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, b'')
+        self.assertFalse(self.get('logo.png').has_header('Vary'))
+        # Остальное уходит в приложение
+        for response in (self.get('missing.css'), self.get('css/site.css.gz'), self.get(self.hashed_css, method='post')):
+            self.assertEqual(response.content.decode(), 'приложение')
+        # Ссылка на отсутствующий файл не роняет страницу
+        with self.assertLogs('callboard.staticfiles', 'WARNING'):
+            self.assertEqual(staticfiles_storage.url('css/missing.css'), '/static/css/missing.css')
+        # Файл не из манифеста, но лежащий в STATIC_ROOT, получает хэш
+        with open(os.path.join(self.root, 'late.css'), 'w') as file:
+            file.write('body {}')
+        self.assertRegex(staticfiles_storage.url('late.css'), r'^/static/late\.[0-9a-f]{12}\.css$')
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br ;q=1.0, identity;q=0, zstd;q=x'),
+                         ({'gzip', 'br'}, {'identity', 'zstd'}))
+
+    def test_wildcard_does_not_override_refusal(self):
+        response = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='br;q=0, *')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0, *').has_header('Content-Encoding'))
+
+
+class SettingsProfileTest(TestCase):
+    PRODUCTION = {'DJANGO_ENV': 'production', 'SECRET_KEY': 'x', 'ALLOWED_HOSTS': 'board.example.com',
+                  'CACHE_URL': 'redis://cache.example.com:6379/0'}
+
+    def django_eval(self, expression, **env):
+        """Значение выражения в новом процессе с заданным окружением"""
+        completed = subprocess.run(
+            [sys.executable, '-c', f'import django; django.setup(); from django.conf import settings; print(repr(({expression})))'],
+            cwd=settings.BASE_DIR, env={**os.environ, **env}, capture_output=True, text=True,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        return completed.stdout.strip().splitlines()[-1]
+
+    def test_production_profile(self):
+        self.assertEqual(self.django_eval(
+            "settings.DEBUG, settings.TEMPLATES[0]['OPTIONS']['loaders'][0][0], settings.STORAGES['staticfiles']['BACKEND']",
+            **self.PRODUCTION,
+        ), "(False, 'django.template.loaders.cached.Loader', 'callboard.staticfiles.CompressedManifestStaticFilesStorage')")
+        # Мониторинг в production включается явно и замеряет только часть запросов
+        self.assertEqual(self.django_eval(
+            "settings.PERFORMANCE_MONITORING['ENABLED'], settings.PERFORMANCE_MONITORING['SAMPLE_RATE']",
+            **self.PRODUCTION,
+        ), '(False, 0.1)')
+        # Лента в production не считает COUNT(*) на каждый запрос
+        self.assertEqual(self.django_eval(
+            'settings.CALLBOARD_AD_PAGINATION, settings.CALLBOARD_AD_EXACT_COUNT', **self.PRODUCTION,
+        ), "('cursor', False)")
+
+    def test_asgi_closes_connections_by_default(self):
+        env = {key: value for key, value in os.environ.items() if key != 'DATABASE_CONN_MAX_AGE'}
+        completed = subprocess.run(
+            [sys.executable, '-c', 'import project.asgi; from django.conf import settings; '
+                                   "print(settings.DATABASES['default']['CONN_MAX_AGE'])"],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.split()[-1], '0')
+
+    def test_production_requires_secrets(self):
+        completed = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup()'], cwd=settings.BASE_DIR,
+            env={**os.environ, **self.PRODUCTION, 'ALLOWED_HOSTS': ''}, capture_output=True, text=True,
+        )
+        self.assertIn('ALLOWED_HOSTS', completed.stderr)
+
+    def test_production_requires_shared_cache(self):
+        completed = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup()'], cwd=settings.BASE_DIR,
+            env={**os.environ, **self.PRODUCTION, 'CACHE_URL': '', 'REDIS_URL': ''}, capture_output=True, text=True,
+        )
+        self.assertIn('CACHE_URL', completed.stderr)
+        self.assertEqual(self.django_eval(
+            "settings.CACHES['default']['BACKEND'], settings.CACHES['default']['LOCATION']",
+            **{**self.PRODUCTION, 'CACHE_URL': '', 'REDIS_URL': 'redis://redis:6379/2'},
+        ), "('django.core.cache.backends.redis.RedisCache', 'redis://redis:6379/2')")
+
+    def test_worker_skips_web_only_apps(self):
+        # Ссылки в письмах дайджеста строятся и без админки и flatpages
+        self.assertEqual(self.django_eval(
+            "[app for app in settings.WEB_ONLY_APPS if app in settings.INSTALLED_APPS], "
+            "__import__('django.urls').urls.reverse('ad_detail', args=[1])",
+            **self.PRODUCTION, DJANGO_PROCESS='worker',
+        ), "([], '/ads/1/')")
+
+    def test_startup_benchmark(self):
+        report = run_startup_benchmark(['wsgi', 'asgi'], runs=1)
+        for target in ('wsgi', 'asgi'):
+            self.assertEqual(report['results'][target]['status'], 200)
+            self.assertGreater(report['results'][target]['import_ms_p50'], 0)
+
+        web = run_startup_benchmark(['celery'], runs=1, env=self.PRODUCTION)['results']['celery']
+        worker = run_startup_benchmark(['celery'], runs=1, env={**self.PRODUCTION, 'DJANGO_PROCESS': 'worker'})
+        self.assertEqual(worker['results']['celery']['status'], 200)
+        self.assertLess(worker['results']['celery']['modules'], web['modules'])
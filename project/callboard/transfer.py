@@ -0,0 +1,193 @@
+import csv
+import json
+import sys
+from contextlib import contextmanager
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Ad, Category, Response, User
+
+FORMATS = ('jsonl', 'csv')
+
+# Для каждой модели: поля выгрузки и соответствующие им выражения values_list
+EXPORT_FIELDS = {
+    'categories': (Category, [('id', 'id'), ('name', 'name')]),
+    'ads': (Ad, [
+        ('id', 'id'), ('title', 'title'), ('content', 'content'), ('category', 'category__name'),
+        ('author', 'author__username'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ]),
+    'responses': (Response, [
+        ('id', 'id'), ('ad', 'ad_id'), ('author', 'author__username'), ('content', 'content'),
+        ('created_at', 'created_at'), ('is_accepted', 'is_accepted'), ('is_read', 'is_read'),
+    ]),
+}
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if str(path).endswith('.csv') else 'jsonl'
+
+
+def export_rows(kind, batch_size):
+    model, fields = EXPORT_FIELDS[kind]
+    names = [name for name, _ in fields]
+    rows = model.objects.order_by('pk').values_list(*[lookup for _, lookup in fields])
+    for row in rows.iterator(chunk_size=batch_size):
+        yield dict(zip(names, row))
+
+
+def write_rows(rows, stream, fmt, kind):
+    names = [name for name, _ in EXPORT_FIELDS[kind][1]]
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=names)
+        writer.writeheader()
+    count = 0
+    for row in rows:
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False, default=str))
+            stream.write('\n')
+        count += 1
+    return count
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _datetime(value):
+    if not value:
+        return timezone.now()
+    return value if not isinstance(value, str) else parse_datetime(value)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+class LookupMaps:
+    """Справочники для импорта, загружаются в память один раз вместо запроса на каждую строку"""
+
+    def __init__(self):
+        self._users = None
+        self._categories = None
+
+    @property
+    def users(self):
+        if self._users is None:
+            self._users = dict(User.objects.values_list('username', 'id').iterator())
+        return self._users
+
+    @property
+    def categories(self):
+        if self._categories is None:
+            self._categories = dict(Category.objects.values_list('name', 'id'))
+        return self._categories
+
+
+def build_category(row, lookups):
+    return Category(pk=int(row['id']) if row.get('id') else None, name=row['name'])
+
+
+def build_ad(row, lookups):
+    author_id = lookups.users.get(row['author'])
+    if author_id is None:
+        return None
+    ad = Ad(
+        pk=int(row['id']) if row.get('id') else None,
+        title=row['title'],
+        content=row.get('content') or '',
+        category_id=lookups.categories.get(row.get('category')),
+        author_id=author_id,
+        created_at=_datetime(row.get('created_at')),
+        updated_at=_datetime(row.get('updated_at')),
+    )
+    ad.render_content()
+    return ad
+
+
+def build_response(row, lookups):
+    author_id = lookups.users.get(row['author'])
+    if author_id is None:
+        return None
+    return Response(
+        pk=int(row['id']) if row.get('id') else None,
+        ad_id=int(row['ad']),
+        author_id=author_id,
+        content=row['content'],
+        created_at=_datetime(row.get('created_at')),
+        is_accepted=_bool(row.get('is_accepted')),
+        is_read=_bool(row.get('is_read')),
+    )
+
+
+BUILDERS = {
+    'categories': build_category,
+    'ads': build_ad,
+    'responses': build_response,
+}
+
+
+def timestamp_fields(model):
+    return [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+
+
+@contextmanager
+def file_timestamps(model):
+    """
+    Отключает auto_now/auto_now_add, чтобы даты из файла ушли в тот же INSERT.
+    Поля модели общие для процесса — import_board выполняется в своём процессе,
+    и флаги возвращаются сразу после вставки.
+    """
+    fields = [(field, field.auto_now, field.auto_now_add) for field in timestamp_fields(model)]
+    for field, _auto_now, _auto_now_add in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def drop_conflicts(model, objects):
+    """Отбрасывает строки, чей id или уникальное поле уже есть в базе или раньше в пачке"""
+    unique_fields = [field for field in model._meta.concrete_fields if field.unique]
+    for field in unique_fields:
+        values = {getattr(obj, field.attname) for obj in objects} - {None}
+        seen = set(model.objects.filter(**{f'{field.attname}__in': values}).values_list(field.attname, flat=True))
+        kept = []
+        for obj in objects:
+            value = getattr(obj, field.attname)
+            if value is not None:
+                if value in seen:
+                    continue
+                seen.add(value)
+            kept.append(obj)
+        objects = kept
+    return objects
+
+
+def insert_objects(model, objects, ignore_conflicts=False):
+    """
+    Вставляет объекты одним bulk_create с датами из файла и возвращает вставленные (с pk).
+    С ignore_conflicts строки, которые нарушили бы уникальность, отбрасываются до вставки.
+    """
+    if ignore_conflicts:
+        objects = drop_conflicts(model, objects)
+    if not objects:
+        return objects
+    # Без ignore_conflicts bulk_create возвращает pk вставленных строк — они нужны индексу
+    with file_timestamps(model):
+        model.objects.bulk_create(objects)
+    return objects
@@ -1,7 +1,9 @@
 from django.urls import path
+from . import api
 from .views import (
-    AdList, AdDetail, AdCreate, AdUpdate, AdDelete,
-    ResponseList, ResponseDetail, ResponseCreate, ResponseDelete, ResponseAccept,
+    AdList, AdCategoryList, AdPopularList, AdSearch, AdDetail, AdCreate, AdUpdate, AdDelete, AdImageUpload,
+    ResponseList, ResponseDetail, ResponseCreate, ResponseDelete, ResponseAccept, ResponseMarkRead,
+    ResponseEvents,
     user_profile, subscribe_newsletter, newsletter_success,
 )
 
@@ -11,6 +13,10 @@ urlpatterns = [
     path('ads/<int:pk>/update/', AdUpdate.as_view(), name='ad_update'),
     path('ads/<int:pk>/', AdDetail.as_view(), name='ad_detail'),
     path('ads/create/', AdCreate.as_view(), name='ad_create'),
+    path('ads/images/upload/', AdImageUpload.as_view(), name='ad_image_upload'),
+    path('ads/category/<str:category>/', AdCategoryList.as_view(), name='ads_by_category'),
+    path('ads/search/', AdSearch.as_view(), name='ad_search'),
+    path('ads/popular/', AdPopularList.as_view(), name='ads_popular'),
     path('ads/', AdList.as_view(), name='ads'),
 
     # Маршруты для работы с откликами (Response)
@@ -19,6 +25,16 @@ urlpatterns = [
     path('responses/create/<int:ad_id>', ResponseCreate.as_view(), name='response_create'),
     path('responses/<int:pk>/delete/', ResponseDelete.as_view(), name='response_delete'),
     path('responses/<int:pk>/accept/', ResponseAccept.as_view(), name='response_accept'),
+    path('responses/mark-read/', ResponseMarkRead.as_view(), name='response_mark_read'),
+    path('responses/events/', ResponseEvents.as_view(), name='response_events'),
+
+    # JSON API
+    path('api/ads/', api.AdCollection.as_view(), name='api_ads'),
+    path('api/ads/<int:pk>/', api.AdItem.as_view(), name='api_ad'),
+    path('api/categories/', api.CategoryCollection.as_view(), name='api_categories'),
+    path('api/responses/', api.ResponseCollection.as_view(), name='api_responses'),
+    path('api/responses/bulk/', api.ResponseBulkCreate.as_view(), name='api_responses_bulk'),
+    path('api/responses/accept/', api.ResponseBulkAccept.as_view(), name='api_responses_accept'),
 
     # Маршруты для подписки
     path('subscribe-newsletter/', subscribe_newsletter, name='subscribe_newsletter'),
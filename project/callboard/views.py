@@ -1,35 +1,339 @@
-import os
+import datetime
+from functools import wraps
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied
-from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views.generic.edit import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.core.mail import send_mail
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import HttpResponseRedirect
-
+from django.core.paginator import InvalidPage
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils.decorators import method_decorator
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .counters import FLUSHED_KEY, arecord_view, views_cache
 from .forms import AdForm, SubscriptionForm
-from .models import Ad, Response, NewsletterSubscription
+from .images import ImageSizeLimitHandler, store_upload
+from .backends import user_groups
+from .models import Ad, Category, Response, NewsletterSubscription, User
+from .notifications import notify_response_created, notify_response_accepted
+from .pagination import CursorPaginator, NoCountPaginator
+from .routers import apin_to_primary, pin_to_primary
+from .search import get_search_backend, highlight
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    Аналог django.views.decorators.http.condition для асинхронных представлений:
+    валидаторы — корутины, которые читают базу через асинхронный ORM.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            last_modified = None
+            if last_modified_func:
+                if dt := await last_modified_func(request, *args, **kwargs):
+                    if not timezone.is_aware(dt):
+                        dt = timezone.make_aware(dt, datetime.timezone.utc)
+                    last_modified = int(dt.timestamp())
+            etag = await etag_func(request, *args, **kwargs) if etag_func else None
+            etag = quote_etag(etag) if etag is not None else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+# Валидаторы для условных GET: считаются до основного запроса и отрисовки
+async def _ad_list_state(request):
+    if not hasattr(request, '_ad_list_state'):
+        # Число объявлений берём из счётчиков категорий, а не COUNT(*) по всей таблице
+        request._ad_list_state = {
+            **await Ad.objects.aaggregate(last_modified=Max('updated_at')),
+            **await Category.objects.aaggregate(total=Sum('ad_count')),
+        }
+    return request._ad_list_state
+
+
+async def _viewer(request):
+    """
+    Часть валидатора от зрителя: шапка страницы у каждого пользователя своя (меню,
+    счётчик непрочитанных откликов), и анонимная копия не должна подойти вошедшему.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return 'anon'
+    return f'user-{user.pk}-{user.unread_response_count}'
+
+
+async def ad_list_etag(request, *args, **kwargs):
+    state = await _ad_list_state(request)
+    last_modified = state['last_modified'].timestamp() if state['last_modified'] else 0
+    # Страница и курсор — из адреса: ETag не должен совпасть у разных страниц ленты
+    position = request.GET.get('cursor') or request.GET.get('page') or 1
+    category = kwargs.get('category', '')
+    return f'ads-{category}-{position}-{state["total"]}-{last_modified}-{await _viewer(request)}'
+
+
+async def ad_list_last_modified(request, *args, **kwargs):
+    # If-Modified-Since не различает пользователей: вошедшим — только ETag
+    if (await request.auser()).is_authenticated:
+        return None
+    return (await _ad_list_state(request))['last_modified']
+
+
+async def _ad_updated_at(request, pk):
+    if not hasattr(request, '_ad_updated_at'):
+        request._ad_updated_at = await Ad.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+    return request._ad_updated_at
+
+
+async def ad_detail_etag(request, pk):
+    updated_at = await _ad_updated_at(request, pk)
+    return f'ad-{pk}-{updated_at.timestamp()}-{await _viewer(request)}' if updated_at else None
+
+
+async def ad_detail_last_modified(request, pk):
+    if (await request.auser()).is_authenticated:
+        return None
+    return await _ad_updated_at(request, pk)
+
+
+# Заголовки, которыми браузеры помечают предзагрузку и пререндеринг страниц
+PREFETCH_HEADERS = ('Sec-Purpose', 'Purpose', 'X-Purpose', 'X-Moz')
+
+
+def is_prefetch(request):
+    return any('prefetch' in request.headers.get(header, '').lower() for header in PREFETCH_HEADERS)
+
+
+class AsyncLoginRequiredMixin:
+    """
+    LoginRequiredMixin для асинхронных представлений: пользователь загружается
+    через request.auser(), а не синхронным обращением к request.user.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # Шаблоны и сообщения читают request.user синхронно — отдаём уже загруженного
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
 
 
 # Объявления (Ad)
+@method_decorator(async_condition(etag_func=ad_list_etag, last_modified_func=ad_list_last_modified), name='get')
 class AdList(ListView):
+    """Лента объявлений; все запросы выполняются асинхронным ORM"""
+    replica_reads = True
     model = Ad
+    # Карточкам достаточно анонса, полные тексты объявлений не загружаем
+    queryset = Ad.objects.select_related('author', 'category').defer('content', 'content_html', 'content_text')
     template_name = 'callboard/ads.html'
     context_object_name = 'ads'
     paginate_by = 10  # Пагинация
+    # None — режим из CALLBOARD_AD_PAGINATION
+    pagination = None
+    # Ссылки на номера страниц: столько вокруг текущей и по краям, остальное — «…»
+    page_links_on_each_side = 2
+    page_links_on_ends = 1
+
+    async def get(self, request, *args, **kwargs):
+        return await self.render_list()
+
+    async def render_list(self):
+        self.object_list = await self.aget_queryset()
+        paginator, page, ads, is_paginated = await self.apaginate_queryset(self.object_list, self.paginate_by)
+        # Счётчики объявлений берутся из денормализованного поля, без GROUP BY по Ad
+        categories = [category async for category in Category.objects.all()]
+        page_range = None
+        if getattr(paginator, 'num_pages', None):
+            page_range = list(paginator.get_elided_page_range(
+                page.number, on_each_side=self.page_links_on_each_side, on_ends=self.page_links_on_ends,
+            ))
+        return self.render_to_response(self.get_context_data(
+            paginator=paginator, page_obj=page, is_paginated=is_paginated,
+            object_list=ads, categories=categories, page_range=page_range,
+        ))
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # Без точного подсчёта страниц не выполняем COUNT(*) на каждый запрос
+        if not settings.CALLBOARD_AD_EXACT_COUNT:
+            return NoCountPaginator(queryset, per_page, orphans=orphans,
+                                    allow_empty_first_page=allow_empty_first_page, **kwargs)
+        return super().get_paginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        try:
+            if (self.pagination or settings.CALLBOARD_AD_PAGINATION) == 'cursor':
+                paginator = CursorPaginator(queryset, page_size)
+                page = await paginator.apage(self.request.GET.get('cursor'))
+            else:
+                paginator = self.get_paginator(queryset, page_size)
+                page = await self.apage(paginator, self.request.GET.get(self.page_kwarg) or 1)
+        except InvalidPage as e:
+            raise Http404(f'Неверная страница: {e}')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def apage(self, paginator, number):
+        if isinstance(paginator, NoCountPaginator):
+            return await paginator.apage(number)
+        if 'count' not in paginator.__dict__:
+            paginator.count = await paginator.object_list.acount()
+        if number == 'last':
+            number = paginator.num_pages
+        page = paginator.page(number)
+        page.object_list = [ad async for ad in page.object_list]
+        return page
+
+    def get_context_data(self, **kwargs):
+        # MultipleObjectMixin.get_context_data выполнил бы пагинацию синхронно
+        kwargs.setdefault('view', self)
+        kwargs[self.get_context_object_name(self.object_list)] = kwargs['object_list']
+        if self.extra_context is not None:
+            kwargs.update(self.extra_context)
+        return kwargs
+
+
+class AdCategoryList(AdList):
+    """Лента объявлений одной категории"""
+
+    async def aget_queryset(self):
+        self.category = await aget_object_or_404(Category, name=self.kwargs['category'])
+        return self.get_queryset().filter(category=self.category)
+
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        if not isinstance(paginator, NoCountPaginator):
+            paginator.count = self.category.ad_count
+        return paginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['category'] = self.category
+        return context
+
+
+async def popular_ads_etag(request, *args, **kwargs):
+    # Порядок меняется при каждом сбросе просмотров, даже если объявления не менялись
+    flushed = await views_cache().aget(FLUSHED_KEY)
+    return f'{await ad_list_etag(request, *args, **kwargs)}-views-{flushed}'
+
+
+class AdPopularList(AdList):
+    """Популярное за неделю: порядок по Ad.weekly_views, который ведёт flush_ad_views"""
+    # Курсор ленты построен на (created_at, id) и к этому порядку не подходит
+    pagination = 'page'
+
+    @method_decorator(async_condition(etag_func=popular_ads_etag))
+    async def get(self, request, *args, **kwargs):
+        return await self.render_list()
+
+    async def aget_queryset(self):
+        return self.get_queryset().filter(weekly_views__gt=0).order_by('-weekly_views', '-id')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['popular'] = True
+        return context
+
+
+class AdSearch(View):
+    template_name = 'callboard/ad_search.html'
+    paginate_by = 10
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        category_name = request.GET.get('category')
+        category = Category.objects.filter(name=category_name).first() if category_name else None
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            raise Http404('Неверная страница')
+
+        ads = []
+        has_next = False
+        backend = get_search_backend()
+        if query and backend:
+            # Одна лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+            hits = backend.search(query, category_id=category.pk if category else None,
+                                  limit=self.paginate_by + 1, offset=(page - 1) * self.paginate_by)
+            has_next = len(hits) > self.paginate_by
+            hits = hits[:self.paginate_by]
+            found = Ad.objects.select_related('author', 'category').defer('content', 'content_html', 'content_text').in_bulk([hit.ad_id for hit in hits])
+            for hit in hits:
+                ad = found.get(hit.ad_id)
+                if ad is not None:
+                    ad.snippet = highlight(hit.snippet)
+                    ads.append(ad)
+
+        # TemplateResponse: время отрисовки попадает в замеры PerformanceMiddleware
+        return TemplateResponse(request, self.template_name, {
+            'ads': ads,
+            'query': query,
+            'category': category,
+            'categories': Category.objects.all(),
+            'page': page,
+            'has_next': has_next,
+        })
+
+
+def record_ad_view(view):
+    """
+    Учитывает просмотр объявления. Стоит снаружи async_condition: ответ 304
+    из кэша браузера — тоже просмотр, хотя до самого представления он не доходит.
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        response = await view(request, *args, **kwargs)
+        if request.method == 'GET' and response.status_code in (200, 304):
+            # Просмотр копится в памяти процесса, в базу попадёт пачкой
+            await arecord_view(kwargs['pk'])
+        return response
+    return inner
 
 
+@method_decorator([
+    record_ad_view,
+    async_condition(etag_func=ad_detail_etag, last_modified_func=ad_detail_last_modified),
+], name='get')
 class AdDetail(DetailView):
+    replica_reads = True
     model = Ad
+    queryset = Ad.objects.select_related('author', 'category').defer('content', 'content_text')
     template_name = 'callboard/ad_detail.html'
     context_object_name = 'ad'
 
+    async def get(self, request, *args, **kwargs):
+        self.object = await aget_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
+        return self.render_to_response(self.get_context_data(object=self.object))
+
 
 class AdCreate(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     model = Ad
@@ -40,6 +344,7 @@ class AdCreate(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.author = self.request.user
+        pin_to_primary(self.request)
         return super().form_valid(form)
 
 
@@ -52,7 +357,7 @@ class AdUpdate(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        if obj.author != self.request.user:
+        if obj.author_id != self.request.user.pk:
             raise PermissionDenied
         return obj
 
@@ -65,78 +370,168 @@ class AdDelete(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        if obj.author != self.request.user:
+        if obj.author_id != self.request.user.pk:
             raise PermissionDenied
         return obj
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AdImageUpload(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Приём картинок из CKEditor (плагины uploadimage и filebrowser, ответ в JSON).
+    CSRF проверяется в upload(): обработчик загрузки нужно поставить раньше, чем
+    CsrfViewMiddleware прочитает тело запроса.
+    """
+    http_method_names = ['post']
+    permission_required = 'callboard.add_ad'
+    raise_exception = True
+
+    def post(self, request):
+        limit = ImageSizeLimitHandler(request)
+        request.upload_handlers.insert(0, limit)
+        return self.upload(request, limit)
+
+    @method_decorator(csrf_protect)
+    def upload(self, request, limit):
+        upload = request.FILES.get('upload')
+        try:
+            if upload is None:
+                raise ValidationError('Файл слишком большой' if limit.exceeded else 'Файл не передан')
+            image, _ = store_upload(upload, request.user)
+        except ValidationError as exc:
+            return JsonResponse({'uploaded': 0, 'error': {'message': exc.messages[0]}}, status=400)
+        return JsonResponse({
+            'uploaded': 1,
+            'fileName': upload.name,
+            'url': image.file.url,
+            'width': image.width,
+            'height': image.height,
+        })
+
+
 # Отклики (Response)
 class ResponseList(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     model = Response
     template_name = 'callboard/response_list.html'
     context_object_name = 'responses'
     permission_required = 'callboard.view_response'  # Право для просмотра откликов
+    paginate_by = 20
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.selected_ad = int(request.GET.get('selected_ad') or 0) or None
+        except ValueError:
+            self.selected_ad = None
+        # Статистика по объявлениям автора — одним агрегирующим запросом
+        self.ads = list(
+            Ad.objects.filter(author=request.user).only('pk', 'title').annotate(
+                response_total=Count('responses'),
+                response_unread=Count('responses', filter=Q(responses__is_read=False)),
+            )
+        )
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Response.objects.filter(ad__author=self.request.user)
-        selected_ad = self.request.GET.get('selected_ad')
-        if selected_ad:
-            queryset = queryset.filter(ad_id=selected_ad)
+        queryset = Response.objects.filter(ad__author=self.request.user).select_related('ad', 'author') \
+            .only('pk', 'created_at', 'is_read', 'is_accepted', 'ad__title', 'author__username')
+        if self.selected_ad:
+            queryset = queryset.filter(ad_id=self.selected_ad)
         return queryset
 
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        # Общее число откликов уже известно из статистики — COUNT(*) по join не нужен
+        paginator.count = sum(ad.response_total for ad in self.ads
+                              if not self.selected_ad or ad.pk == self.selected_ad)
+        return paginator
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['ads'] = Ad.objects.filter(author=self.request.user)
+        context['ads'] = self.ads
+        context['selected_ad'] = self.selected_ad
         return context
 
 
 class ResponseDetail(LoginRequiredMixin, DetailView):
+    replica_reads = True
     model = Response
+    queryset = Response.objects.select_related('ad', 'author')
     template_name = 'callboard/response_detail.html'
     context_object_name = 'response'
 
+    def get_object(self, queryset=None):
+        obj = super().get_object(queryset)
+        # Отклик читает человек: HEAD и предзагрузка браузера его прочитанным не делают
+        if not obj.is_read and obj.ad.author_id == self.request.user.pk \
+                and self.request.method == 'GET' and not is_prefetch(self.request):
+            obj.mark_read()
+            pin_to_primary(self.request)
+            self.request.user.unread_response_count = max(self.request.user.unread_response_count - 1, 0)
+        return obj
+
+
+class ResponseMarkRead(LoginRequiredMixin, View):
+    """Отмечает прочитанными все входящие отклики или отклики на одно объявление"""
+
+    def post(self, request):
+        unread = Response.objects.filter(ad__author=request.user, is_read=False)
+        selected_ad = request.POST.get('selected_ad')
+        if selected_ad and not selected_ad.isdigit():
+            return HttpResponseBadRequest('selected_ad должен быть id объявления')
+        with transaction.atomic():
+            if selected_ad:
+                unread.filter(ad_id=selected_ad).update(is_read=True)
+                remaining = unread.count()
+            else:
+                unread.update(is_read=True)
+                remaining = 0
+            User.objects.filter(pk=request.user.pk).update(unread_response_count=remaining)
+        return HttpResponseRedirect(reverse_lazy('response_list'))
 
-class ResponseCreate(LoginRequiredMixin, CreateView):
+
+class ResponseCreate(AsyncLoginRequiredMixin, CreateView):
     model = Response
     fields = ['content']
     template_name = 'callboard/response_create.html'
     success_url = reverse_lazy('ads')
-
-    def form_valid(self, form):
-        form.instance.ad_id = self.kwargs['pk']
-        form.instance.author = self.request.user
-        return super().form_valid(form)
-
-        # Отправка уведомления автору объявления
-        ad = form.instance.ad
-        ad_author_email = ad.author.email
-
-        if ad_author_email:  # Проверяем, указан ли email у автора
-            send_mail(
-                subject='Новый отклик на ваше объявление',
-                message=(
-                    f"Здравствуйте, {ad.author.username}!\n\n"
-                    f"Пользователь {self.request.user.username} оставил отклик на ваше объявление \"{ad.title}\".\n\n"
-                    f"Содержание отклика:\n{form.instance.content}\n\n"
-                    f"Посмотреть отклик можно в системе."
-                ),
-                from_email= os.getenv('EMAIL_HOST_USER'),
-                recipient_list=[ad_author_email],
-                fail_silently=False,
-            )
-
+    # Синхронный put из ProcessFormView не даёт объявить представление асинхронным
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        self.object = None
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        self.object = None
+        form = self.get_form()
+        if not form.is_valid():
+            return self.form_invalid(form)
+        form.instance.ad = await aget_object_or_404(Ad.objects.select_related('author'), pk=self.kwargs['ad_id'])
+        form.instance.author = request.user
+        # Транзакция и постановка письма в outbox — в потоке, чтобы не блокировать цикл событий
+        self.object = await sync_to_async(self.save_with_notification)(form.instance)
+        await apin_to_primary(request)
+        return HttpResponseRedirect(self.get_success_url())
+
+    @staticmethod
+    def save_with_notification(response):
+        # Уведомление автору объявления попадает в outbox в той же транзакции
+        with transaction.atomic():
+            response.save()
+            notify_response_created(response)
         return response
 
 
 class ResponseDelete(LoginRequiredMixin, DeleteView):
     model = Response
+    queryset = Response.objects.select_related('ad')
     template_name = 'callboard/response_confirm_delete.html'
     success_url = reverse_lazy('response_list')
 
     # Проверка, является ли текущий пользователь автором
     def dispatch(self, request, *args, **kwargs):
         response = self.get_object()
-        if response.ad.author != request.user:
+        if response.ad.author_id != request.user.pk:
             messages.error(request, 'Вы не имеете права удалять этот отклик.')
             return HttpResponseRedirect(reverse_lazy('response_list'))
         return super().dispatch(request, *args, **kwargs)
@@ -146,32 +541,47 @@ class ResponseDelete(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class ResponseAccept(LoginRequiredMixin, View):
-    def post(self, request, pk):
-        response = get_object_or_404(Response, pk=pk)
-        if response.ad.author != request.user:
+class ResponseAccept(AsyncLoginRequiredMixin, View):
+    async def post(self, request, pk):
+        response = await aget_object_or_404(Response.objects.select_related('ad__author', 'author'), pk=pk)
+        if response.ad.author_id != request.user.pk:
             messages.error(request, 'Вы не имеете права принять этот отклик.')
             return HttpResponseRedirect(reverse_lazy('response_list'))
 
-        response.is_accepted = True
-        response.save()
-
-        # Отправка уведомления пользователю
-        subject = 'Ваш отклик на объявление принят!'
-        message = f'Здравствуйте! Ваш отклик на объявление "{response.ad.title}" был принят.'
-        from_email = 'noreply@yourdomain.com'
-        recipient_list = [response.author.email]
-        send_mail(subject, message, from_email, recipient_list)
+        await sync_to_async(self.accept)(response)
+        await apin_to_primary(request)
 
         messages.success(request, f'Отклик на объявление {response.ad} принят!')
         return HttpResponseRedirect(reverse_lazy('response_detail', args=[pk]))
 
+    @staticmethod
+    def accept(response):
+        with transaction.atomic():
+            response.is_accepted = True
+            response.save(update_fields=['is_accepted'])
+            # Уведомление пользователю отправит deliver_outbox
+            notify_response_accepted(response)
+
+
+class ResponseEvents(View):
+    """
+    Адрес потока Server-Sent Events об откликах. Под ASGI его обслуживает
+    callboard.sse.EventStreamApp до Django; сюда запрос доходит только под WSGI,
+    где поток занял бы рабочий поток сервера. 204 останавливает EventSource.
+    """
+
+    def get(self, request):
+        return HttpResponse(status=204)
+
 
 @login_required
 def user_profile(request):
-    is_author = request.user.groups.filter(name='authors').exists()
+    is_author = 'authors' in user_groups(request.user)
     return render(request, 'account/user_profile.html', {
         'is_author': is_author,
+        'user_ads': Ad.objects.filter(author=request.user).only('pk', 'title', 'created_at'),
+        'user_responses': Response.objects.filter(author=request.user)
+                                          .select_related('ad').only('content', 'created_at', 'ad__title'),
     })
 
 
@@ -12,5 +12,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+# Под ASGI запросы ORM идут из разных потоков sync_to_async, и постоянное соединение
+# держится на каждый поток, а не на воркер. По умолчанию соединение закрывается после
+# запроса; DATABASE_CONN_MAX_AGE в окружении по-прежнему задаёт другое значение
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Поток событий об откликах обслуживается до Django: открытое соединение
+# не занимает поток и соединение с базой (см. callboard.sse)
+from callboard.sse import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(django_application)
@@ -9,8 +9,20 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.conf.timezone = 'Europe/Moscow'
 app.autodiscover_tasks()
 app.conf.beat_schedule = {
-    'send_mail_monday_8am': {
-        'task': 'board.tasks.send_mail_monday_8am',
+    'weekly_digest_monday_8am': {
+        'task': 'callboard.tasks.send_weekly_digest',
         'schedule': crontab(hour=8, minute=0, day_of_week='monday'),
     },
+    'flush_ad_views_every_minute': {
+        'task': 'callboard.tasks.flush_ad_views',
+        'schedule': crontab(),
+    },
+    'refresh_popular_ads_daily': {
+        'task': 'callboard.tasks.refresh_popular_ads',
+        'schedule': crontab(hour=0, minute=10),
+    },
+    'deliver_outbox_every_minute': {
+        'task': 'callboard.tasks.deliver_outbox',
+        'schedule': crontab(),
+    },
 }
\ No newline at end of file
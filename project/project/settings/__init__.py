@@ -0,0 +1,23 @@
+"""
+Профиль настроек выбирается переменной окружения DJANGO_ENV:
+development (по умолчанию) или production.
+"""
+import os
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+# .env читается по известному пути (рядом с manage.py), а не поиском вверх по каталогам
+_env_file = Path(os.getenv('DJANGO_ENV_FILE', Path(__file__).resolve().parent.parent.parent / '.env'))
+if _env_file.is_file():
+    from dotenv import load_dotenv
+
+    load_dotenv(_env_file)
+
+_profile = os.getenv('DJANGO_ENV', 'development')
+if _profile == 'production':
+    from .production import *  # noqa: F401,F403
+elif _profile == 'development':
+    from .development import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Неизвестный DJANGO_ENV: {_profile}')
@@ -0,0 +1,364 @@
+"""
+Общие настройки всех окружений. Профиль выбирается переменной DJANGO_ENV
+в project/settings/__init__.py: development.py или production.py поверх этого модуля.
+"""
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.getenv('SECRET_KEY')
+
+# Включается только профилем development
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.sites',
+    'django.contrib.flatpages',
+
+    'callboard',
+    'sign',
+    'protect',
+    'ckeditor',
+
+    'allauth',
+    'allauth.account',
+    'allauth.socialaccount',
+    'allauth.socialaccount.providers.yandex',
+]
+
+# Нужны только веб-процессу: в воркере Celery профиль production их не загружает
+# (провайдер Яндекса тянет requests, админка — admin.py всех приложений)
+WEB_ONLY_APPS = [
+    'django.contrib.admin',
+    'django.contrib.flatpages',
+    'ckeditor',
+    'allauth.socialaccount',
+    'allauth.socialaccount.providers.yandex',
+]
+
+
+LOGIN_URL = '/accounts/login/'
+LOGIN_REDIRECT_URL = '/profile/'
+
+
+SITE_ID = 1
+
+MIDDLEWARE = [
+    'callboard.middleware.PerformanceMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'callboard.middleware.StaticFilesMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'callboard.middleware.ReplicaRoutingMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware',
+    'allauth.account.middleware.AccountMiddleware',
+]
+
+ROOT_URLCONF = 'project.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+
+AUTHENTICATION_BACKENDS = [
+    'callboard.backends.CachedModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend',
+]
+
+WSGI_APPLICATION = 'project.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+# PRAGMA выполняются на каждом новом соединении. WAL позволяет читать во время записи,
+# synchronous=NORMAL в режиме WAL безопасен для целостности и заметно быстрее FULL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),  # отрицательное значение — в КиБ
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Транзакция сразу берёт блокировку записи: писатель ждёт busy_timeout,
+            # а не получает "database is locked" при попытке повысить блокировку
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Реплики для чтения: пути к файлам через запятую. Локально их наполняет sync_replicas.
+for number, name in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'NAME': name.strip(), 'TEST': {'MIRROR': 'default'}}
+
+CALLBOARD_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+DATABASE_ROUTERS = ['callboard.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# Фрагменты объявлений по умолчанию кэшируются в памяти процесса;
+# FRAGMENT_CACHE_DIR включает общий для всех процессов файловый кэш.
+
+FRAGMENT_CACHE_DIR = os.getenv('FRAGMENT_CACHE_DIR')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': ('django.core.cache.backends.filebased.FileBasedCache' if FRAGMENT_CACHE_DIR
+                    else 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': FRAGMENT_CACHE_DIR or 'fragments',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+        # Увеличивать при изменении шаблонов кэшируемых фрагментов
+        'VERSION': 2,
+    },
+}
+
+CALLBOARD_FRAGMENT_CACHE = 'fragments'
+
+# Server-Sent Events об откликах. LocalEventBackend рассылает события внутри процесса;
+# при нескольких процессах ASGI-сервера нужен RedisEventBackend.
+CALLBOARD_EVENT_BACKEND = os.getenv('CALLBOARD_EVENT_BACKEND', 'callboard.events.LocalEventBackend')
+CALLBOARD_EVENT_REDIS_URL = os.getenv('CALLBOARD_EVENT_REDIS_URL', 'redis://localhost:6379/1')
+CALLBOARD_EVENT_QUEUE_SIZE = 100
+CALLBOARD_EVENT_HEARTBEAT = 20  # секунды между комментариями, удерживающими соединение
+
+# Просмотры объявлений (callboard.counters). Кэш должен быть общим для веб-процессов
+# и воркера Celery (Redis, Memcached); с LocMemCache процесс без DEBUG не запускается
+# (callboard.checks), если задачи Celery не выполняются на месте (task_always_eager).
+CALLBOARD_VIEWS_CACHE = 'default'
+# Окно сброса в базу — совпадает с расписанием flush_ad_views
+AD_VIEWS_FLUSH_SECONDS = 60
+# Процесс отправляет накопленное в кэш раз в столько секунд или просмотров
+AD_VIEWS_PUSH_SECONDS = 5
+AD_VIEWS_PUSH_SIZE = 100
+# Окна старше этого числа не сбрасываются — их просмотры считаются потерянными
+AD_VIEWS_MAX_LAG = 30
+AD_POPULAR_DAYS = 7
+
+# Группы и права пользователя. Сбрасываются сигналами m2m_changed через User.role_version,
+# поэтому подходит и кэш, свой у каждого процесса
+CALLBOARD_ROLE_CACHE = 'default'
+ROLE_CACHE_TIMEOUT = 60 * 5
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Загрузки крупнее этого пишутся во временный файл на диске кусками, а не держатся в памяти
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+
+# Картинки объявлений (callboard.images)
+AD_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+AD_IMAGE_MAX_PIXELS = 40_000_000
+AD_IMAGE_CHUNK_SIZE = 256 * 1024
+# Ширины вариантов для srcset; оригинал шире последней в разметку не попадает
+AD_IMAGE_WIDTHS = (320, 640, 1024, 1600)
+AD_IMAGE_THUMBNAIL_SIZE = (240, 240)
+AD_IMAGE_QUALITY = 80
+AD_IMAGE_SIZES = '(max-width: 800px) 100vw, 800px'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+STATICFILES_DIRS = [BASE_DIR / "static"]
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # collectstatic создаёт имена с хэшем содержимого и сжатые копии .br/.gz (callboard.staticfiles)
+    'staticfiles': {'BACKEND': 'callboard.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Что сжимать: картинки и шрифты woff2 уже сжаты
+STATIC_COMPRESS_EXTENSIONS = ('css', 'js', 'mjs', 'map', 'json', 'html', 'txt', 'xml', 'svg', 'ico', 'ttf', 'otf', 'eot')
+# Отдавать STATIC_ROOT из процесса приложения (StaticFilesMiddleware), если перед ним нет CDN или nginx
+CALLBOARD_SERVE_STATIC = os.getenv('CALLBOARD_SERVE_STATIC', '1') == '1'
+# Кэш для файлов без хэша в имени (плагины CKEditor и т. п.), секунды
+STATIC_MAX_AGE = 60 * 60
+
+AUTH_USER_MODEL = 'callboard.User'
+
+
+ACCOUNT_EMAIL_REQUIRED = True
+ACCOUNT_UNIQUE_EMAIL = True
+ACCOUNT_USERNAME_REQUIRED = False
+ACCOUNT_CONFIRM_EMAIL_ON_GET = True
+ACCOUNT_AUTHENTICATION_METHOD = 'email'
+ACCOUNT_EMAIL_VERIFICATION = 'mandatory'
+
+
+ACCOUNT_FORMS = {'signup': 'callboard.forms.BasicSignupForm'}
+
+
+# ckeditor
+CKEDITOR_CONFIGS = {
+    'default': {
+        'toolbar': 'full',
+        'height': 300,
+        'width': '100%',
+        'extraPlugins': ','.join([
+            'uploadimage',  # поддержка загрузки изображений
+        ]),
+        # Вставка/перетаскивание и вкладка «Загрузить» идут в callboard.views.AdImageUpload
+        'uploadUrl': '/ads/images/upload/',
+        'filebrowserUploadUrl': '/ads/images/upload/',
+        'filebrowserUploadMethod': 'xhr',
+    },
+}
+
+
+# Лента объявлений
+# 'page' — нумерованные страницы, 'cursor' — курсоры по (created_at, id) без OFFSET и COUNT(*)
+CALLBOARD_AD_PAGINATION = 'page'
+# False — постраничный режим без COUNT(*): только ссылки «назад»/«вперёд»
+CALLBOARD_AD_EXACT_COUNT = True
+# Админка: таблицы больше этого числа строк пагинируются по оценке из статистики, без COUNT(*)
+CALLBOARD_ADMIN_ESTIMATED_COUNT_FROM = 10_000
+# Полнотекстовый поиск: None — выбор по движку БД (SQLite FTS5 / PostgreSQL tsvector)
+CALLBOARD_SEARCH_BACKEND = None
+
+# JSON API (/api/): размер страницы по умолчанию, потолок для ?limit= и размер пачки в bulk-запросах
+CALLBOARD_API_PAGE_SIZE = 20
+CALLBOARD_API_MAX_PAGE_SIZE = 100
+CALLBOARD_API_BULK_LIMIT = 100
+
+
+# Отправка писем
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = 'smtp.gmail.com'
+EMAIL_PORT = 465
+EMAIL_USE_SSL = True
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+EMAIL_SUBJECT_PREFIX = '[Callboard]'
+
+# Рассылка: число адресатов в одной подзадаче (и на одно SMTP-соединение)
+NEWSLETTER_CHUNK_SIZE = 500
+
+# Еженедельный дайджест: сколько свежих объявлений показывать в каждой категории
+DIGEST_ADS_PER_CATEGORY = 10
+# Первый дайджест без водяного знака охватывает столько дней
+DIGEST_DEFAULT_PERIOD_DAYS = 7
+# Занятая пачка без отметки об отправке через столько секунд снова доступна воркерам
+# (воркер упал посреди отправки)
+DIGEST_CHUNK_CLAIM_TIMEOUT = 60 * 60
+
+# Outbox уведомлений об откликах
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+
+
+# Мониторинг производительности запросов (callboard.middleware.PerformanceMiddleware)
+PERFORMANCE_MONITORING = {
+    'ENABLED': os.getenv('PERFORMANCE_MONITORING', '1') == '1',
+    'SAMPLE_RATE': float(os.getenv('PERFORMANCE_SAMPLE_RATE', '1.0')),  # доля замеряемых запросов
+    'SLOW_REQUEST_MS': 500,  # медленные запросы пишутся в лог с уровнем WARNING
+    'SERVER_TIMING': True,
+}
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        # INFO — строка на каждый замеренный запрос, WARNING — только медленные
+        'callboard.performance': {
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
@@ -0,0 +1,11 @@
+"""Локальная разработка: runserver, отладочные страницы, статика без сборки"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import STORAGES
+
+DEBUG = True
+
+# runserver отдаёт статику из STATICFILES_DIRS как есть, collectstatic не нужен
+STORAGES = {**STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+CALLBOARD_SERVE_STATIC = os.getenv('CALLBOARD_SERVE_STATIC', '0') == '1'
@@ -0,0 +1,85 @@
+"""
+Боевой профиль (DJANGO_ENV=production). Обязательны SECRET_KEY, ALLOWED_HOSTS
+(через запятую) и CACHE_URL (redis://, rediss:// или memcached://; можно REDIS_URL).
+DJANGO_PROCESS=worker — процесс воркера Celery: без WEB_ONLY_APPS он быстрее
+стартует и занимает меньше памяти.
+"""
+import os
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import CACHES, INSTALLED_APPS, MIDDLEWARE, PERFORMANCE_MONITORING, SECRET_KEY, TEMPLATES, WEB_ONLY_APPS
+
+DEBUG = False
+
+if not SECRET_KEY:
+    raise ImproperlyConfigured('SECRET_KEY обязателен в профиле production')
+
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host.strip()]
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured('ALLOWED_HOSTS обязателен в профиле production')
+
+# Кэш по умолчанию общий для всех процессов: через него просмотры объявлений доходят
+# до воркера Celery (callboard.counters), на нём же лимиты попыток входа allauth
+CACHE_URL = os.getenv('CACHE_URL') or os.getenv('REDIS_URL')
+if not CACHE_URL:
+    raise ImproperlyConfigured('CACHE_URL (или REDIS_URL) обязателен в профиле production')
+CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+_cache_url = urlsplit(CACHE_URL)
+if _cache_url.scheme not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f'Неподдерживаемая схема CACHE_URL: {_cache_url.scheme}')
+CACHES = {
+    **CACHES,
+    'default': {
+        'BACKEND': CACHE_BACKENDS[_cache_url.scheme],
+        # Memcached принимает host:port, Redis — URL целиком
+        'LOCATION': _cache_url.netloc if _cache_url.scheme == 'memcached' else CACHE_URL,
+    },
+}
+
+# Шаблоны компилируются один раз на процесс; context processor debug без DEBUG ничего не даёт
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [
+            processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+            if processor != 'django.template.context_processors.debug'
+        ],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# Лента без COUNT(*) на каждый запрос: курсоры, а где нужны номера страниц
+# (популярное) — только «назад»/«вперёд»
+CALLBOARD_AD_PAGINATION = 'cursor'
+CALLBOARD_AD_EXACT_COUNT = False
+
+# Мониторинг включается явно и замеряет только часть запросов
+PERFORMANCE_MONITORING = {
+    **PERFORMANCE_MONITORING,
+    'ENABLED': os.getenv('PERFORMANCE_MONITORING', '0') == '1',
+    'SAMPLE_RATE': float(os.getenv('PERFORMANCE_SAMPLE_RATE', '0.1')),
+}
+
+DJANGO_PROCESS = os.getenv('DJANGO_PROCESS', 'web')
+if DJANGO_PROCESS not in ('web', 'worker'):
+    raise ImproperlyConfigured(f'Неизвестный DJANGO_PROCESS: {DJANGO_PROCESS}')
+if DJANGO_PROCESS == 'worker':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+    MIDDLEWARE = [
+        middleware for middleware in MIDDLEWARE
+        if middleware != 'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware'
+    ]
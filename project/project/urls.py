@@ -1,15 +1,24 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from django.conf import settings
 from django.views.generic.base import TemplateView
 from django.conf.urls.static import static
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
+# Воркер Celery в профиле production загружается без админки и flatpages (WEB_ONLY_APPS),
+# но {% url %} в письмах всё равно читает этот модуль
+urlpatterns = []
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
+urlpatterns.append(
     path('', TemplateView.as_view(template_name="account/index.html"), name='home'),  # Стартовая страница
-    path('pages/', include('django.contrib.flatpages.urls')),
+)
+if apps.is_installed('django.contrib.flatpages'):
+    urlpatterns.append(path('pages/', include('django.contrib.flatpages.urls')))
+urlpatterns += [
     path('', include('callboard.urls')),
     path('protect/', include('protect.urls')),
     path('sign/', include('sign.urls')),
     path('accounts/', include('allauth.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)